@@ -0,0 +1,483 @@
+"""
+Analytics module for the Task Manager application.
+
+This module defines ColumnarView, a column-oriented copy of the task
+fields that reports aggregate over. Each field is one array with a row
+per task: priority, completion status, creation time and due date (as
+timestamps, see task.to_timestamp). Categories are dictionary-encoded:
+every distinct category gets a code and a column of flags marking the
+rows that have it. Counts, group-bys and histograms then work on whole
+columns at once instead of visiting the Task objects one by one.
+
+The columns are stdlib arrays. When NumPy is installed the operations
+view them as NumPy arrays, without copying. Otherwise the flag columns
+(one byte of 0 or 1 per row) are read as one large integer each, so
+combining filters is a bitwise ``&`` and counting the matching rows is
+a bit count, and the other columns go through the C-implemented map,
+itertools.compress and collections.Counter: slower than NumPy, but no
+Python code runs for every task.
+
+The view is refreshed incrementally: TaskManager reports every task that
+is added, changed or removed, and only the rows of those tasks are
+rewritten before the next read. The rows of removed tasks are reused.
+"""
+
+import threading
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+from functools import partial
+from itertools import compress
+from task import to_timestamp
+
+try:
+    import numpy
+except ImportError:  # Optional, the stdlib code paths are used instead
+    numpy = None
+
+# Due column value of tasks without a due date. It is later than any real
+# date, so such tasks are never overdue.
+NO_DUE_DATE = (1 << 63) - 1
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+# Keys of a ``where`` filter
+FILTERS = ('priority', 'completed', 'category')
+
+# bytes.translate tables turning a flag column into a mask of the rows
+# holding 0 or 1
+_EQUAL_TABLES = {value: bytes(int(byte == value) for byte in range(256)) for value in (0, 1)}
+
+
+# Counts the bits set in a non-negative integer (int.bit_count is new in 3.10)
+_bit_count = getattr(int, 'bit_count', lambda number: bin(number).count("1"))
+
+
+class ColumnarView:
+    """
+    Column-oriented view of the tasks for counts, group-bys and histograms.
+    
+    Every method takes an optional ``where`` dictionary that narrows the
+    rows down, e.g. ``{'completed': False, 'category': 'work'}``; its keys
+    are 'priority', 'completed' and 'category', and all of them must match.
+    
+    Get one from TaskManager.analytics, which refreshes it first.
+    
+    Attributes:
+        uses_numpy (bool): True if the operations run on NumPy
+    """
+    
+    def __init__(self, tasks=None):
+        """
+        Initialize a new ColumnarView.
+        
+        Args:
+            tasks (dict, optional): Task ID -> Task to load. Defaults to none.
+        """
+        self.uses_numpy = numpy is not None
+        self._live = bytearray()  # 1 for rows holding a task
+        self._priority = array('q')
+        self._completed = bytearray()
+        self._created = array('q')
+        self._due = array('q')
+        self._categories = []  # Code -> category
+        self._codes = {}  # Category -> code
+        self._members = []  # Code -> flag column of the rows with the category
+        self._row_codes = []  # Row -> tuple of category codes, to clear them
+        self._rows = {}  # Task ID -> row
+        self._free = []  # Rows of removed tasks, reused first
+        self._pending = {}  # IDs of the tasks changed since the last refresh
+        self._lock = threading.RLock()
+        
+        if tasks:
+            self._load(tasks)
+    
+    def __len__(self):
+        """Return the number of tasks."""
+        return len(self._rows)
+    
+    def touch(self, task_id):
+        """
+        Note that a task was added, changed or removed.
+        
+        Args:
+            task_id (str): The ID of the task
+        """
+        self._pending[task_id] = None
+    
+    def refresh(self, tasks):
+        """
+        Rewrite the rows of the tasks changed since the last refresh.
+        
+        Args:
+            tasks (dict): Task ID -> Task, the current tasks
+        
+        Returns:
+            int: Number of rows rewritten
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for task_id in pending:
+                task = tasks.get(task_id)
+                row = self._rows.get(task_id)
+                if task is not None:
+                    self._write(row if row is not None else self._allocate(task_id), task)
+                elif row is not None:
+                    self._clear(row)
+                    del self._rows[task_id]
+                    self._free.append(row)
+            return len(pending)
+    
+    def count(self, where=None):
+        """
+        Count tasks.
+        
+        Args:
+            where (dict, optional): Filter on the rows. Defaults to all tasks.
+        
+        Returns:
+            int: Number of matching tasks
+        """
+        with self._lock:
+            return self._count(self._mask(where))
+    
+    def group_count(self, by, where=None):
+        """
+        Count tasks per priority, status or category.
+        
+        Args:
+            by (str): 'priority', 'status' ('open' and 'completed') or
+                'category' (a task counts once for each of its categories)
+            where (dict, optional): Filter on the rows. Defaults to all tasks.
+        
+        Returns:
+            dict: Group -> number of tasks, sorted by group, without empty groups
+        
+        Raises:
+            ValueError: If the tasks cannot be grouped by ``by``
+        """
+        with self._lock:
+            return self._group(by, self._mask(where))
+    
+    def overdue_count(self, by=None, where=None, now=None):
+        """
+        Count the open tasks whose due date has passed.
+        
+        Args:
+            by (str, optional): Group as in group_count. Defaults to no grouping.
+            where (dict, optional): Filter on the rows. Defaults to all tasks.
+            now (datetime, optional): The current time. Defaults to datetime.now().
+        
+        Returns:
+            int or dict: Number of overdue tasks, per group if ``by`` is given
+        """
+        with self._lock:
+            mask = self._overdue(self._mask(where), now)
+            return self._count(mask) if by is None else self._group(by, mask)
+    
+    def overdue_rate(self, by=None, where=None, now=None):
+        """
+        Get the share of open tasks that are overdue.
+        
+        Args:
+            by (str, optional): Group as in group_count. Defaults to no grouping.
+            where (dict, optional): Filter on the rows. Defaults to all tasks.
+            now (datetime, optional): The current time. Defaults to datetime.now().
+        
+        Returns:
+            float or dict: Overdue tasks / open tasks (0.0 without open
+                tasks), per group if ``by`` is given
+        """
+        with self._lock:
+            open_mask = self._mask(where) & self._equal(self._completed, 0)
+            overdue_mask = self._overdue(open_mask, now)
+            if by is None:
+                total = self._count(open_mask)
+                return self._count(overdue_mask) / total if total else 0.0
+            
+            overdue = self._group(by, overdue_mask)
+            return {group: overdue.get(group, 0) / total
+                    for group, total in self._group(by, open_mask).items()}
+    
+    def histogram(self, column, edges, where=None, now=None):
+        """
+        Count tasks per range of age or of time left until the due date.
+        
+        For the age of completed tasks ("completion ages"), pass
+        ``where={'completed': True}``.
+        
+        Args:
+            column (str): 'age' (days since the task was created) or
+                'due_in' (days until it is due, negative if overdue; tasks
+                without a due date are left out)
+            edges (list): Increasing bucket boundaries in days
+            where (dict, optional): Filter on the rows. Defaults to all tasks.
+            now (datetime, optional): The current time. Defaults to datetime.now().
+        
+        Returns:
+            list: len(edges) + 1 counts: below the first edge, between each
+                pair of edges (the lower one included), and from the last
+                edge up
+        
+        Raises:
+            ValueError: If the column is unknown or the edges are not increasing
+        """
+        if any(low >= high for low, high in zip(edges, edges[1:])):
+            raise ValueError("Histogram edges must be increasing")
+        now_ts = to_timestamp(now or datetime.now())
+        limits = [round(edge * MICROSECONDS_PER_DAY) for edge in edges]
+        
+        with self._lock:
+            mask = self._mask(where)
+            if column == 'due_in':
+                mask &= self._not_equal(self._due, NO_DUE_DATE)
+            elif column != 'age':
+                raise ValueError(f"No histogram over {column!r}; expected 'age' or 'due_in'")
+            
+            if self.uses_numpy:
+                if column == 'age':
+                    values = now_ts - self._view(self._created, numpy.int64)[mask]
+                else:
+                    values = self._view(self._due, numpy.int64)[mask] - now_ts
+                buckets = numpy.searchsorted(numpy.array(limits, dtype=numpy.int64), values,
+                                             side='right')
+                return numpy.bincount(buckets, minlength=len(edges) + 1).tolist()
+            
+            selector = self._selector(mask)
+            if column == 'age':
+                values = map(now_ts.__sub__, compress(self._created, selector))
+            else:
+                values = map(now_ts.__rsub__, compress(self._due, selector))
+            counts = Counter(map(partial(bisect_right, limits), values))
+            return [counts[bucket] for bucket in range(len(edges) + 1)]
+    
+    def _load(self, tasks):
+        """
+        Fill the columns of a new view, a column at a time.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        """
+        tasks = list(tasks.values())
+        count = len(tasks)
+        self._live = bytearray(b"\x01" * count)
+        self._priority = array('q', [task.priority for task in tasks])
+        self._completed = bytearray([1 if task.completed else 0 for task in tasks])
+        self._created = array('q', [task.created_timestamp for task in tasks])
+        self._due = array('q', [NO_DUE_DATE if task.due_timestamp is None else task.due_timestamp
+                                for task in tasks])
+        self._rows = {task.id: row for row, task in enumerate(tasks)}
+        
+        code = self._code
+        self._row_codes = [tuple({code(category) for category in task.categories})
+                           for task in tasks]
+        members = self._members
+        for row, codes in enumerate(self._row_codes):
+            for category_code in codes:
+                members[category_code][row] = 1
+    
+    def _allocate(self, task_id):
+        """
+        Get a row for a new task, reusing a free one if there is any.
+        
+        Args:
+            task_id (str): The ID of the task
+        
+        Returns:
+            int: The row
+        """
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = len(self._live)
+            self._live.append(0)
+            self._priority.append(0)
+            self._completed.append(0)
+            self._created.append(0)
+            self._due.append(NO_DUE_DATE)
+            self._row_codes.append(())
+            for member in self._members:
+                member.append(0)
+        self._rows[task_id] = row
+        return row
+    
+    def _write(self, row, task):
+        """
+        Copy the fields of a task into a row.
+        
+        Args:
+            row (int): The row
+            task (Task): The task
+        """
+        due_ts = task.due_timestamp
+        self._live[row] = 1
+        self._priority[row] = task.priority
+        self._completed[row] = 1 if task.completed else 0
+        self._created[row] = task.created_timestamp
+        self._due[row] = NO_DUE_DATE if due_ts is None else due_ts
+        
+        for code in self._row_codes[row]:
+            self._members[code][row] = 0
+        codes = tuple({self._code(category) for category in task.categories})
+        for code in codes:
+            self._members[code][row] = 1
+        self._row_codes[row] = codes
+    
+    def _clear(self, row):
+        """
+        Empty the row of a removed task.
+        
+        Args:
+            row (int): The row
+        """
+        self._live[row] = 0
+        self._completed[row] = 0
+        for code in self._row_codes[row]:
+            self._members[code][row] = 0
+        self._row_codes[row] = ()
+    
+    def _code(self, category):
+        """
+        Get the code of a category, adding a column for a new one.
+        
+        Args:
+            category (str): The category
+        
+        Returns:
+            int: The code
+        """
+        code = self._codes.get(category)
+        if code is None:
+            code = self._codes[category] = len(self._categories)
+            self._categories.append(category)
+            self._members.append(bytearray(len(self._live)))
+        return code
+    
+    def _view(self, column, dtype):
+        """
+        View a column as a NumPy array, without copying.
+        
+        The view must not outlive the operation: a column cannot grow while
+        it is being viewed.
+        
+        Args:
+            column (array or bytearray): The column
+            dtype: NumPy type of the items
+        
+        Returns:
+            numpy.ndarray: The view
+        """
+        return numpy.frombuffer(column, dtype=dtype)
+    
+    def _flags(self, column):
+        """Return a flag column as a mask."""
+        if self.uses_numpy:
+            return self._view(column, numpy.uint8).astype(bool)
+        return int.from_bytes(column, 'little')
+    
+    def _equal(self, column, value):
+        """Return the mask of the rows whose value in a column equals value."""
+        if self.uses_numpy:
+            dtype = numpy.uint8 if isinstance(column, bytearray) else numpy.int64
+            return self._view(column, dtype) == value
+        if isinstance(column, bytearray):
+            return int.from_bytes(column.translate(_EQUAL_TABLES[value]), 'little')
+        return int.from_bytes(bytearray(map(value.__eq__, column)), 'little')
+    
+    def _not_equal(self, column, value):
+        """Return the mask of the rows whose value in a column differs from value."""
+        if self.uses_numpy:
+            return ~self._equal(column, value)
+        return int.from_bytes(bytearray(map(value.__ne__, column)), 'little')
+    
+    def _count(self, mask):
+        """Return the number of rows set in a mask."""
+        if self.uses_numpy:
+            return int(numpy.count_nonzero(mask))
+        return _bit_count(mask)  # Every row is a byte of 0 or 1
+    
+    def _selector(self, mask):
+        """Return a mask as an iterable of flags for itertools.compress (stdlib only)."""
+        return mask.to_bytes(len(self._live), 'little')
+    
+    def _mask(self, where):
+        """
+        Get the rows holding tasks that match a filter.
+        
+        Args:
+            where (dict): Filter on the rows, or None
+        
+        Returns:
+            The mask: a bool NumPy array, or (without NumPy) an integer
+                holding the flags of the rows as little-endian bytes
+        
+        Raises:
+            ValueError: If the filter has an unknown key
+        """
+        mask = self._flags(self._live)
+        for key, value in (where or {}).items():
+            if key == 'priority':
+                other = self._equal(self._priority, int(value))
+            elif key == 'completed':
+                other = self._equal(self._completed, 1 if value else 0)
+            elif key == 'category':
+                code = self._codes.get(value.lower())
+                if code is None:
+                    # No task has the category
+                    if self.uses_numpy:
+                        return numpy.zeros(len(self._live), dtype=bool)
+                    return 0
+                other = self._flags(self._members[code])
+            else:
+                raise ValueError(f"Cannot filter on {key!r}; expected one of {', '.join(FILTERS)}")
+            mask = mask & other
+        return mask
+    
+    def _overdue(self, mask, now):
+        """
+        Narrow a mask down to the open tasks whose due date has passed.
+        
+        Args:
+            mask: The mask to narrow down
+            now (datetime): The current time, or None for datetime.now()
+        
+        Returns:
+            The narrowed mask
+        """
+        now_ts = to_timestamp(now or datetime.now())
+        mask = mask & self._equal(self._completed, 0)
+        if self.uses_numpy:
+            return mask & (self._view(self._due, numpy.int64) < now_ts)
+        return mask & int.from_bytes(bytearray(map(now_ts.__gt__, self._due)), 'little')
+    
+    def _group(self, by, mask):
+        """
+        Count the rows of a mask per group.
+        
+        Args:
+            by (str): 'priority', 'status' or 'category'
+            mask: The rows to count
+        
+        Returns:
+            dict: Group -> count, sorted by group, without empty groups
+        
+        Raises:
+            ValueError: If the tasks cannot be grouped by ``by``
+        """
+        if by == 'priority':
+            if self.uses_numpy:
+                values, counts = numpy.unique(self._view(self._priority, numpy.int64)[mask],
+                                              return_counts=True)
+                return dict(zip(values.tolist(), counts.tolist()))
+            return dict(sorted(Counter(compress(self._priority, self._selector(mask))).items()))
+        
+        if by == 'status':
+            completed = self._count(mask & self._flags(self._completed))
+            groups = {'open': self._count(mask) - completed, 'completed': completed}
+        elif by == 'category':
+            groups = {category: self._count(mask & self._flags(member))
+                      for category, member in sorted(zip(self._categories, self._members))}
+        else:
+            raise ValueError(f"Cannot group by {by!r}; expected 'priority', 'status' or 'category'")
+        return {group: count for group, count in groups.items() if count}
@@ -0,0 +1,468 @@
+"""
+Async task manager module for the Task Manager application.
+
+This module defines AsyncTaskManager, an asyncio front end to TaskManager
+for services that run on an event loop. Tasks are changed in memory on
+the loop, while all disk I/O runs on a background thread and the writes
+of many concurrent coroutines are grouped into a few storage writes.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from loader import LazyTasks
+from storage import FileStorage, TaskStorage
+from task_manager import TaskManager
+
+
+class AsyncTaskManager:
+    """
+    An asyncio interface to a TaskManager.
+    
+    Every method is a coroutine. Reads and in-memory changes use the same
+    TaskManager, indexes and search engine as the synchronous API and run
+    directly on the event loop; they never touch the disk. Mutations queue
+    their journal records, and a single writer task hands everything queued
+    so far to the storage in one write on a background thread (group
+    commit): while one write is in progress, the records of every coroutine
+    that changes something pile up and go out together in the next one.
+    
+    By default a mutation returns once its change is on disk. With
+    ``wait_for_writes=False`` it returns as soon as the change is made in
+    memory, and ``flush`` waits for the writes. If a write fails, the
+    waiting mutations raise the error; their changes stay in memory and
+    are written with the next write.
+    
+    The manager must only be used from one event loop.
+    
+    Example:
+        manager = AsyncTaskManager("tasks.json")
+        await manager.load_tasks()
+        task_id = await manager.add_task("Title", "Description")
+        await manager.close()
+    
+    Attributes:
+        manager (TaskManager): The synchronous manager holding the tasks
+        write_count (int): Number of storage writes made so far
+    """
+    
+    def __init__(self, storage_file="tasks.json", journal=True, compact_threshold=1000,
+                 search_engine=False, storage=None, snapshot_format="json",
+                 wait_for_writes=True):
+        """
+        Initialize a new AsyncTaskManager.
+        
+        Args:
+            storage_file (str, optional): File path to store tasks. Defaults to "tasks.json".
+            journal (bool, optional): Record mutations in an append-only journal.
+                Defaults to True.
+            compact_threshold (int, optional): Number of journal records after which
+                the journal is compacted into the storage file. Defaults to 1000.
+            search_engine (bool, optional): Answer searches from an inverted index.
+                Defaults to False.
+            storage (TaskStorage, optional): Storage backend to use instead of a
+                FileStorage on storage_file. Defaults to None.
+            snapshot_format (str, optional): Format of the storage file, "json" or
+                "binary". Defaults to "json".
+            wait_for_writes (bool, optional): Make mutations wait until their change
+                is written. Defaults to True.
+        
+        Raises:
+            ValueError: If the storage is queryable (its connection cannot be
+                used from the I/O thread)
+        """
+        if storage is None:
+            storage = FileStorage(storage_file, journal, compact_threshold, snapshot_format)
+        if storage.queryable:
+            raise ValueError("AsyncTaskManager needs a storage that keeps tasks in memory")
+        
+        self.storage = storage
+        self.wait_for_writes = wait_for_writes
+        self.write_count = 0
+        
+        self._queue = _WriteQueue(storage, self._schedule_write)
+        self.manager = TaskManager(storage=self._queue, search_engine=search_engine)
+        
+        # One thread, so storage writes happen one at a time and in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-io")
+        self._done = None  # Future resolved when the queued records are written
+        self._writer = None  # The writer task, while it runs
+    
+    async def load_tasks(self, mode="eager"):
+        """
+        Load tasks from storage on the I/O thread.
+        
+        Args:
+            mode (str, optional): "eager", "stream" or "lazy" (see
+                TaskManager.load_tasks). In lazy mode the file is still read
+                up front, but Task objects are only created when used.
+                Defaults to "eager".
+        """
+        loaded = await self._run(self.storage.load, mode)
+        if isinstance(loaded, LazyTasks):
+            await self._run(len, loaded)  # Read the file off the loop
+        self.manager.adopt_tasks(loaded)
+    
+    async def save_tasks(self):
+        """Write a snapshot of all tasks (for the file storage: rewrite the snapshot file)."""
+        await self.flush()
+        
+        # The copy-on-write snapshot does not change while it is encoded,
+        # so coroutines can keep changing tasks in the meantime
+        snapshot = self.manager.snapshot()
+        await self._run(self.storage.save, snapshot)
+        self.write_count += 1
+    
+    async def flush(self):
+        """
+        Wait until every change made so far has been written.
+        
+        Raises:
+            Exception: Whatever the storage raised; the changes stay queued
+        """
+        while self._queue.pending or self._writer is not None:
+            if self._writer is None:
+                self._schedule_write()
+            error = await asyncio.shield(self._writer)
+            if error is not None:
+                raise error
+    
+    async def close(self):
+        """Write every pending change and stop the I/O thread."""
+        await self.flush()
+        await self._run(self.storage.close)
+        self._executor.shutdown()
+    
+    async def add_task(self, title, description, priority=3, due_date=None, categories=None):
+        """
+        Add a new task.
+        
+        Args:
+            title (str): The title of the task
+            description (str): The description of the task
+            priority (int, optional): Priority level (1-5). Defaults to 3.
+            due_date (str, optional): Due date in YYYY-MM-DD format. Defaults to None.
+            categories (list, optional): List of category strings. Defaults to None.
+        
+        Returns:
+            str: The ID of the new task
+        """
+        task_id = self.manager.add_task(title, description, priority, due_date, categories)
+        await self._written()
+        return task_id
+    
+    async def add_tasks(self, task_specs):
+        """
+        Add several tasks at once (see TaskManager.add_tasks).
+        
+        Args:
+            task_specs (iterable): Dictionaries with the keyword arguments of add_task
+        
+        Returns:
+            list: The IDs of the new tasks, in input order
+        """
+        task_ids = self.manager.add_tasks(task_specs)
+        await self._written()
+        return task_ids
+    
+    async def get_task(self, task_id):
+        """
+        Get a task by its ID.
+        
+        Args:
+            task_id (str): The ID of the task to retrieve
+        
+        Returns:
+            Task: The task object if found, None otherwise
+        """
+        return self.manager.get_task(task_id)
+    
+    async def get_all_tasks(self):
+        """
+        Get all tasks, open tasks first, then by priority.
+        
+        Returns:
+            list: List of all Task objects
+        """
+        return self.manager.get_all_tasks()
+    
+    async def get_tasks_by_priority(self, priority):
+        """
+        Get tasks with the specified priority.
+        
+        Args:
+            priority (int): Priority level to filter by
+        
+        Returns:
+            list: List of Task objects with the specified priority
+        """
+        return self.manager.get_tasks_by_priority(priority)
+    
+    async def get_tasks_by_category(self, category):
+        """
+        Get tasks with the specified category.
+        
+        Args:
+            category (str): Category to filter by (case insensitive)
+        
+        Returns:
+            list: List of Task objects with the specified category
+        """
+        return self.manager.get_tasks_by_category(category)
+    
+    async def get_all_categories(self):
+        """
+        Get all unique categories used across all tasks.
+        
+        Returns:
+            list: Sorted list of unique category strings
+        """
+        return self.manager.get_all_categories()
+    
+    async def search_tasks(self, query, limit=None):
+        """
+        Search for tasks containing the query in title, description, or categories.
+        
+        Args:
+            query (str): The search query
+            limit (int, optional): Return at most this many results. Defaults to None.
+        
+        Returns:
+            list: List of matching Task objects
+        """
+        return self.manager.search_tasks(query, limit)
+    
+    async def add_category_to_task(self, task_id, category):
+        """
+        Add a category to a task.
+        
+        Args:
+            task_id (str): The ID of the task
+            category (str): The category to add
+        
+        Returns:
+            bool: True if successful, False if task not found or category already exists
+        """
+        return await self._mutate(self.manager.add_category_to_task, task_id, category)
+    
+    async def remove_category_from_task(self, task_id, category):
+        """
+        Remove a category from a task.
+        
+        Args:
+            task_id (str): The ID of the task
+            category (str): The category to remove
+        
+        Returns:
+            bool: True if successful, False if task not found or category not found
+        """
+        return await self._mutate(self.manager.remove_category_from_task, task_id, category)
+    
+    async def mark_task_completed(self, task_id):
+        """
+        Mark a task as completed.
+        
+        Args:
+            task_id (str): The ID of the task to mark as completed
+        
+        Returns:
+            bool: True if the task was found and marked, False otherwise
+        """
+        return await self._mutate(self.manager.mark_task_completed, task_id)
+    
+    async def delete_task(self, task_id):
+        """
+        Delete a task.
+        
+        Args:
+            task_id (str): The ID of the task to delete
+        
+        Returns:
+            bool: True if the task was found and deleted, False otherwise
+        """
+        return await self._mutate(self.manager.delete_task, task_id)
+    
+    async def complete_tasks(self, task_ids):
+        """
+        Mark several tasks as completed at once (see TaskManager.complete_tasks).
+        
+        Args:
+            task_ids (iterable): The IDs of the tasks to mark as completed
+        
+        Returns:
+            int: Number of tasks marked as completed
+        """
+        return await self._mutate(self.manager.complete_tasks, task_ids)
+    
+    async def delete_tasks(self, task_ids):
+        """
+        Delete several tasks at once (see TaskManager.delete_tasks).
+        
+        Args:
+            task_ids (iterable): The IDs of the tasks to delete
+        
+        Returns:
+            int: Number of tasks deleted
+        """
+        return await self._mutate(self.manager.delete_tasks, task_ids)
+    
+    async def _mutate(self, method, *args):
+        """
+        Run a TaskManager mutation and wait for its records to be written.
+        
+        Args:
+            method (callable): The TaskManager method
+            *args: Its arguments
+        
+        Returns:
+            The method's return value
+        """
+        result = method(*args)
+        await self._written()
+        return result
+    
+    async def _written(self):
+        """Wait for the queued records to be written, if configured to."""
+        if self.wait_for_writes and self._done is not None:
+            if self._writer is None:
+                self._schedule_write()  # Retry after a failed write
+            await asyncio.shield(self._done)
+    
+    def _schedule_write(self):
+        """Start the writer task unless it is already running; called for every queued write."""
+        if self._done is None:
+            self._done = asyncio.get_running_loop().create_future()
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write_queued())
+    
+    async def _write_queued(self):
+        """
+        Writer task: write everything queued, then whatever was queued meanwhile.
+        
+        Returns:
+            Exception: The error that stopped the writes, or None
+        """
+        try:
+            while self._queue.pending:
+                records, done = self._queue.take(), self._done
+                self._done = None
+                
+                # A journal write only needs the records; a compaction needs
+                # a stable copy of all tasks
+                tasks = self.manager.snapshot() if self._queue.needs_tasks(len(records)) else None
+                try:
+                    await self._run(self.storage.write, records, tasks)
+                    self.write_count += 1
+                except Exception as e:
+                    # Keep the records, they are retried with the next write
+                    self._queue.requeue(records)
+                    if self._done is None:
+                        self._done = asyncio.get_running_loop().create_future()
+                    if not done.done():
+                        done.set_exception(e)
+                        done.exception()  # Do not warn when nobody waits
+                    return e
+                if not done.done():
+                    done.set_result(None)
+            return None
+        finally:
+            self._writer = None
+    
+    async def _run(self, function, *args):
+        """
+        Run a blocking function on the I/O thread.
+        
+        Args:
+            function (callable): The function
+            *args: Its arguments
+        
+        Returns:
+            The function's return value
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+
+class _WriteQueue(TaskStorage):
+    """
+    The storage seen by the TaskManager of an AsyncTaskManager.
+    
+    Writes are queued in memory and announced to the AsyncTaskManager,
+    which passes them on to the real storage.
+    """
+    
+    def __init__(self, storage, on_write):
+        """
+        Initialize a new _WriteQueue.
+        
+        Args:
+            storage (TaskStorage): The real storage
+            on_write (callable): Called whenever records are queued
+        """
+        self.storage = storage
+        self.pending = []
+        self._on_write = on_write
+        self._buffer = None  # Records of the open transaction
+    
+    def load(self, mode="eager"):
+        """Load every task from the real storage."""
+        return self.storage.load(mode)
+    
+    def save(self, tasks):
+        """Refuse to block the loop; AsyncTaskManager.save_tasks saves on the I/O thread."""
+        raise RuntimeError("Use AsyncTaskManager.save_tasks()")
+    
+    def write(self, records, tasks):
+        """Queue mutation records and announce them."""
+        if self._buffer is not None:
+            self._buffer.extend(records)
+            return
+        
+        if records:
+            self.pending.extend(records)
+            self._on_write()
+    
+    def begin(self):
+        """Start buffering writes."""
+        self._buffer = []
+    
+    def commit(self, tasks):
+        """Queue the buffered records together."""
+        records, self._buffer = self._buffer, None
+        self.write(records, tasks)
+    
+    def rollback(self):
+        """Drop the buffered records."""
+        self._buffer = None
+    
+    def take(self):
+        """
+        Remove and return every queued record.
+        
+        Returns:
+            list: The records, oldest first
+        """
+        records, self.pending = self.pending, []
+        return records
+    
+    def requeue(self, records):
+        """
+        Put records that could not be written back at the front of the queue.
+        
+        Args:
+            records (list): The records
+        """
+        self.pending[:0] = records
+    
+    def needs_tasks(self, count):
+        """
+        Check whether writing some records makes the storage rewrite its snapshot.
+        
+        Args:
+            count (int): Number of records about to be written
+        
+        Returns:
+            bool: True if the storage needs all tasks for the write
+        """
+        journal = getattr(self.storage, 'journal', None)
+        if journal is None:
+            return True
+        return journal.count + count >= getattr(self.storage, 'compact_threshold', 0)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Async clients benchmark.
+
+Starts thousands of concurrent coroutine clients that each add a task and
+complete it through an AsyncTaskManager, and reports the throughput, the
+client latency, the number of storage writes the changes were grouped
+into and the longest time the event loop was blocked. The same work done
+through the synchronous TaskManager is shown for comparison (with at most
+--sync-clients clients, since every synchronous change without a journal
+rewrites the whole file).
+
+Usage:
+    python benchmarks/async_clients.py [--clients N] [--tasks N]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_task_manager import AsyncTaskManager  # noqa: E402
+from task_manager import TaskManager  # noqa: E402
+
+
+async def client(manager, n, latencies):
+    """
+    Add a task and complete it.
+    
+    Args:
+        manager (AsyncTaskManager): The shared manager
+        n (int): Client number
+        latencies (list): The client's total time is appended here
+    """
+    start = time.perf_counter()
+    task_id = await manager.add_task(f"Client {n}", "Added by a coroutine", n % 5 + 1)
+    await manager.mark_task_completed(task_id)
+    latencies.append(time.perf_counter() - start)
+
+
+async def watch_loop(stop, lags):
+    """
+    Measure how late the event loop wakes up a sleeping coroutine.
+    
+    Args:
+        stop (asyncio.Event): Set when the measurement should end
+        lags (list): Every measured delay is appended here
+    """
+    interval = 0.001
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_async(path, clients, tasks, **options):
+    """
+    Run the clients against an AsyncTaskManager.
+    
+    Returns:
+        tuple: (seconds, sorted latencies, storage writes, longest loop lag)
+    """
+    manager = AsyncTaskManager(path, **options)
+    await manager.add_tasks({'title': f"Task {i}", 'description': ""} for i in range(tasks))
+    await manager.save_tasks()
+    writes_before = manager.write_count
+    
+    stop, lags, latencies = asyncio.Event(), [], []
+    watcher = asyncio.ensure_future(watch_loop(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(client(manager, n, latencies) for n in range(clients)))
+    await manager.flush()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+    
+    writes = manager.write_count - writes_before
+    await manager.close()
+    return elapsed, sorted(latencies), writes, max(lags, default=0)
+
+
+def run_sync(path, clients, tasks, **options):
+    """
+    Do the same work one client after the other with a TaskManager.
+    
+    Returns:
+        float: Seconds taken
+    """
+    manager = TaskManager(path, **options)
+    manager.add_tasks({'title': f"Task {i}", 'description': ""} for i in range(tasks))
+    manager.save_tasks()
+    
+    start = time.perf_counter()
+    for n in range(clients):
+        task_id = manager.add_task(f"Client {n}", "Added synchronously", n % 5 + 1)
+        manager.mark_task_completed(task_id)
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Async clients benchmark.")
+    parser.add_argument("--clients", type=int, default=5000, help="concurrent clients")
+    parser.add_argument("--tasks", type=int, default=10_000, help="tasks in the store")
+    parser.add_argument("--sync-clients", type=int, default=200,
+                        help="clients in the synchronous comparison")
+    args = parser.parse_args()
+    
+    print(f"Clients: {args.clients}, tasks in store: {args.tasks}")
+    print(f"{'mode':<22}{'ops/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'writes':>8}{'max lag (ms)':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for journal in (True, False):
+            name = "journal" if journal else "snapshot"
+            sync_clients = min(args.clients, args.sync_clients)
+            elapsed = run_sync(os.path.join(directory, f"sync-{name}.json"), sync_clients,
+                               args.tasks, journal=journal)
+            ops = 2 * sync_clients / elapsed
+            print(f"{'sync ' + name:<22}{ops:>10.0f}{'':>10}{'':>10}{2 * sync_clients:>8}{'':>14}")
+            
+            elapsed, latencies, writes, lag = asyncio.run(run_async(
+                os.path.join(directory, f"async-{name}.json"), args.clients, args.tasks,
+                journal=journal))
+            ops = 2 * args.clients / elapsed
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            print(f"{'async ' + name:<22}{ops:>10.0f}{p50:>10.1f}{p99:>10.1f}{writes:>8}{lag * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
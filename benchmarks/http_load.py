@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+HTTP API load test.
+
+Starts the task server of server.py on a free localhost port (or uses
+the one given with --url) and runs several client threads against it.
+Each client sends a mix of list requests (revalidated with
+If-None-Match, so unchanged lists come back as 304), lookups, searches,
+batched adds and completions. The run is repeated with keep-alive
+connections and with a new connection per request, and the requests per
+second and latency percentiles of both are reported.
+
+Usage:
+    python benchmarks/http_load.py [--tasks N] [--clients C] [--seconds S]
+                                   [--write-ratio R] [--url URL]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server import TaskServer  # noqa: E402
+from task_manager import TaskManager  # noqa: E402
+
+CATEGORIES = ["work", "home", "urgent", "errands", "finance", "health", "later"]
+WORDS = ["report", "meeting", "invoice", "groceries", "review", "backup"]
+
+
+class Client:
+    """
+    One simulated API client.
+    
+    Attributes:
+        latencies (list): Seconds taken by every request
+        not_modified (int): Number of 304 responses
+    """
+    
+    def __init__(self, host, port, keep_alive):
+        """
+        Initialize a new Client.
+        
+        Args:
+            host (str): Server host
+            port (int): Server port
+            keep_alive (bool): Reuse one connection for every request
+        """
+        self.host, self.port = host, port
+        self.keep_alive = keep_alive
+        self.connection = None
+        self.etags = {}  # URL -> last ETag seen
+        self.latencies = []
+        self.not_modified = 0
+    
+    def request(self, method, path, body=None):
+        """
+        Send a request and read the response.
+        
+        Args:
+            method (str): HTTP method
+            path (str): Path and query string
+            body (optional): JSON-serializable request body
+        
+        Returns:
+            The decoded response body, or None for a 304 response
+        """
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = "application/json"
+        if method == "GET" and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        
+        start = time.perf_counter()
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port)
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        if not self.keep_alive:
+            self.connection.close()
+            self.connection = None
+        self.latencies.append(time.perf_counter() - start)
+        
+        if response.status == 304:
+            self.not_modified += 1
+            return None
+        if response.status >= 400:
+            raise RuntimeError(f"{method} {path} failed with {response.status}: {data!r}")
+        if response.getheader("ETag"):
+            self.etags[path] = response.getheader("ETag")
+        return json.loads(data)
+    
+    def run(self, ids, seconds, write_ratio, seed):
+        """
+        Send random requests until the time is up.
+        
+        Args:
+            ids (list): Task IDs to operate on
+            seconds (float): How long to run
+            write_ratio (float): Fraction of requests that change tasks
+            seed (int): Random seed
+        """
+        rng = random.Random(seed)
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            roll = rng.random()
+            if roll < write_ratio / 2:
+                self.request("POST", "/tasks", [
+                    {'title': f"{rng.choice(WORDS)} {n}", 'priority': rng.randint(1, 5),
+                     'categories': [rng.choice(CATEGORIES)]}
+                    for n in range(10)
+                ])
+            elif roll < write_ratio:
+                self.request("POST", f"/tasks/{rng.choice(ids)}/complete")
+            elif roll < 0.5:
+                self.request("GET", f"/tasks?category={rng.choice(CATEGORIES)}&status=open"
+                                    f"&limit=20")
+            elif roll < 0.8:
+                self.request("GET", f"/tasks/{rng.choice(ids)}")
+            else:
+                self.request("GET", f"/search?q={rng.choice(WORDS)}&limit=10")
+        
+        if self.connection is not None:
+            self.connection.close()
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of numbers.
+    
+    Args:
+        values (list): The numbers (not empty)
+        fraction (float): Percentile as a fraction, e.g. 0.99
+    
+    Returns:
+        float: The value below which that fraction of the numbers falls
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_clients(host, port, ids, args, keep_alive):
+    """
+    Run the clients once and print a result line.
+    
+    Args:
+        host (str): Server host
+        port (int): Server port
+        ids (list): Task IDs to operate on
+        args (argparse.Namespace): Command-line arguments
+        keep_alive (bool): Reuse connections
+    """
+    clients = [Client(host, port, keep_alive) for _ in range(args.clients)]
+    threads = [threading.Thread(target=client.run, args=(ids, args.seconds, args.write_ratio, n))
+               for n, client in enumerate(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    latencies = [latency for client in clients for latency in client.latencies]
+    not_modified = sum(client.not_modified for client in clients)
+    print(f"{'yes' if keep_alive else 'no':>11}{len(latencies) / args.seconds:>12.0f}"
+          f"{percentile(latencies, 0.5) * 1000:>10.2f}{percentile(latencies, 0.99) * 1000:>10.2f}"
+          f"{not_modified / len(latencies):>8.0%}")
+
+
+def main():
+    """Run the load test and print the results."""
+    parser = argparse.ArgumentParser(description="HTTP API load test.")
+    parser.add_argument("--tasks", type=int, default=10_000, help="number of tasks to create")
+    parser.add_argument("--clients", type=int, default=8, help="number of client threads")
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration per run")
+    parser.add_argument("--write-ratio", type=float, default=0.05, help="fraction of writes")
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        server = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            manager = TaskManager(os.path.join(directory, "tasks.json"), thread_safe=True,
+                                  write_behind=True)
+            server = TaskServer(("127.0.0.1", 0), manager)
+            host, port = server.server_address[:2]
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        
+        # Fill the store through the batch endpoint
+        loader = Client(host, port, keep_alive=True)
+        rng = random.Random(0)
+        ids = []
+        for start in range(0, args.tasks, 1000):
+            ids.extend(loader.request("POST", "/tasks", [
+                {'title': f"{rng.choice(WORDS)} {n}", 'description': rng.choice(WORDS),
+                 'priority': rng.randint(1, 5), 'categories': rng.sample(CATEGORIES, 2)}
+                for n in range(start, min(start + 1000, args.tasks))
+            ])['ids'])
+        
+        print(f"Server: {host}:{port}, tasks: {args.tasks}, clients: {args.clients}, "
+              f"writes: {args.write_ratio:.0%}")
+        print(f"{'keep-alive':>11}{'req/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'304':>8}")
+        for keep_alive in (True, False):
+            run_clients(host, port, ids, args, keep_alive)
+        
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            manager.close()
+
+
+if __name__ == "__main__":
+    main()
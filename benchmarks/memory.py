@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the Task class.
+
+Measures how many bytes each loaded task keeps in memory, comparing the
+current slotted Task against the layout Task used to have: a per-instance
+__dict__, two datetime objects and a private copy of every category
+string.
+
+Usage:
+    python benchmarks/memory.py [--tasks N]
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task import Task  # noqa: E402
+
+CATEGORIES = ["work", "home", "urgent", "errands", "finance", "health", "later"]
+
+
+class DictTask:
+    """The previous Task layout, kept here only as a point of comparison."""
+    
+    @classmethod
+    def from_dict(cls, data):
+        task = cls()
+        task.id = data['id']
+        task.title = data['title']
+        task.description = data['description']
+        task.priority = data['priority']
+        task.completed = data['completed']
+        task.categories = data['categories']
+        task.created_at = datetime.fromisoformat(data['created_at'])
+        task.due_date = datetime.fromisoformat(data['due_date']) if data['due_date'] else None
+        return task
+
+
+def make_snapshot(count, seed=1):
+    """
+    Generate a JSON snapshot of synthetic tasks.
+    
+    Args:
+        count (int): Number of tasks
+        seed (int, optional): Random seed. Defaults to 1.
+    
+    Returns:
+        str: JSON list of task dictionaries
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    tasks = []
+    for i in range(count):
+        due_date = now + timedelta(days=rng.randint(1, 60)) if rng.random() < 0.5 else None
+        tasks.append({
+            'id': f"{i:08x}",
+            'title': f"Task {i}",
+            'description': f"Description of task {i}",
+            'priority': rng.randint(1, 5),
+            'created_at': (now - timedelta(seconds=i)).isoformat(),
+            'due_date': due_date.isoformat() if due_date else None,
+            'completed': rng.random() < 0.3,
+            'categories': rng.sample(CATEGORIES, rng.randint(1, 3)),
+        })
+    return json.dumps(tasks)
+
+
+def measure(task_class, snapshot):
+    """
+    Measure the memory kept by tasks loaded from a snapshot.
+    
+    Everything the tasks keep alive (strings, datetimes, lists) is counted;
+    the parsed JSON itself is freed before measuring.
+    
+    Args:
+        task_class (type): Class providing from_dict
+        snapshot (str): JSON list of task dictionaries
+    
+    Returns:
+        float: Bytes per task
+    """
+    gc.collect()
+    tracemalloc.start()
+    tasks = [task_class.from_dict(data) for data in json.loads(snapshot)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    
+    count = len(tasks)
+    del tasks
+    return used / count
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Memory benchmark for the Task class.")
+    parser.add_argument("--tasks", type=int, default=100_000, help="number of tasks")
+    args = parser.parse_args()
+    
+    snapshot = make_snapshot(args.tasks)
+    old = measure(DictTask, snapshot)
+    new = measure(Task, snapshot)
+    
+    print(f"Tasks:           {args.tasks}")
+    print(f"Previous layout: {old:8.1f} bytes/task")
+    print(f"Slotted Task:    {new:8.1f} bytes/task")
+    print(f"Saved:           {old - new:8.1f} bytes/task ({(1 - new / old) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the memory-mapped snapshot.
+
+For several store sizes, starts a fresh Python process that opens the
+store, looks up one task by ID, filters by priority and exits, once on
+the JSON file and once on a mapped snapshot of the same tasks (see
+mmap_snapshot.py). Reports the time to open the store and look up the
+task, the time of the first priority filter, and the resident memory of
+the process after each. With the mapped snapshot the time and memory to
+open stay nearly flat as the store grows. The first filter still builds
+the indexes from every record (see task_index.py), but reads the
+records from pages shared with other readers.
+
+Reads the resident memory from /proc (Linux).
+
+Usage:
+    python benchmarks/mmap_snapshot.py [--sizes 10000,100000,1000000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mmap_snapshot import build_snapshot  # noqa: E402
+from run import generate_store  # noqa: E402
+
+# Run in a fresh interpreter per measurement, so nothing is warm but the page cache
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        return int(next(line for line in f if line.startswith("VmRSS:")).split()[1])
+
+start = time.perf_counter()
+from mmap_snapshot import MappedStorage
+from task_manager import TaskManager
+if {mapped!r}:
+    manager = TaskManager(storage=MappedStorage({path!r}))
+else:
+    manager = TaskManager({path!r})
+manager.load_tasks()
+manager.get_task({task_id!r}).render()
+opened = time.perf_counter() - start
+opened_rss = rss_kb()
+start = time.perf_counter()
+manager.get_tasks_by_priority(1)
+filtered = time.perf_counter() - start
+print(json.dumps({{
+    'open_ms': opened * 1000,
+    'filter_ms': filtered * 1000,
+    'open_rss_kb': opened_rss,
+    'filter_rss_kb': rss_kb(),
+}}))
+"""
+
+
+def measure(path, mapped, task_id):
+    """
+    Open a store in a new process.
+    
+    Args:
+        path (str): Store file
+        mapped (bool): Open it as a mapped snapshot
+        task_id (str): ID of the task to look up
+    
+    Returns:
+        dict: open_ms, filter_ms, open_rss_kb and filter_rss_kb of the process
+    """
+    code = CHILD.format(root=ROOT, mapped=mapped, path=path, task_id=task_id)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Cold start benchmark for the mapped snapshot.")
+    parser.add_argument("--sizes", default="10000,100000",
+                        help="comma-separated store sizes (default: 10000,100000)")
+    args = parser.parse_args()
+    
+    print(f"{'tasks':>9} {'store':<8}{'open ms':>10}{'RSS KB':>10}{'filter ms':>11}{'RSS KB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(size) for size in args.sizes.split(",")):
+            json_path = os.path.join(directory, "tasks.json")
+            mapped_path = os.path.join(directory, "tasks.tmm")
+            generate_store(json_path, size)
+            build_snapshot(json_path, mapped_path)
+            task_id = f"{size // 2:08x}"  # generate_store numbers the tasks
+            
+            for name, path, mapped in (("json", json_path, False), ("mmap", mapped_path, True)):
+                # Read once so both stores start from a warm page cache
+                with open(path, 'rb') as f:
+                    while f.read(1 << 20):
+                        pass
+                result = measure(path, mapped, task_id)
+                print(f"{size:>9} {name:<8}{result['open_ms']:>10.1f}{result['open_rss_kb']:>10,}"
+                      f"{result['filter_ms']:>11.1f}{result['filter_rss_kb']:>10,}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Parallel scan benchmark.
+
+Times full-scan searches (see TaskManager.search_tasks) on a synthetic
+store, serially and on 1, 2, 4, ... worker processes up to the number of
+CPUs (see parallel.py), and prints the speedup over the serial scan.
+Starting the workers and handing them their shards is timed separately,
+as it is paid once. A second table times a small store serially and in
+parallel, to check where parallel.SERIAL_THRESHOLD should lie.
+
+Usage:
+    python benchmarks/parallel_scan.py [--tasks N] [--workers 1,2,4] [--runs N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import WORDS, generate_store  # noqa: E402
+from task_manager import TaskManager  # noqa: E402
+
+
+def time_searches(manager, runs):
+    """
+    Time searches for every benchmark word.
+    
+    Args:
+        manager (TaskManager): Manager holding the store
+        runs (int): Searches per word
+    
+    Returns:
+        float: Median seconds per search
+    """
+    times = []
+    for _ in range(runs):
+        for word in WORDS:
+            start = time.perf_counter()
+            manager.search_tasks(word[:4])
+            times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def measure(path, workers, runs):
+    """
+    Load a store and time its searches.
+    
+    Args:
+        path (str): Store file
+        workers (int): Worker processes, or 0 for a serial scan
+        runs (int): Searches per word
+    
+    Returns:
+        tuple: (seconds to start the workers, median seconds per search)
+    """
+    manager = TaskManager(path, parallel=workers or False, parallel_threshold=0)
+    manager.load_tasks()
+    try:
+        start = time.perf_counter()
+        manager.search_tasks(WORDS[0])  # Starts the workers
+        startup = time.perf_counter() - start
+        return startup, time_searches(manager, runs)
+    finally:
+        manager.close()
+
+
+def main():
+    """Run the benchmark and print the results."""
+    cpus = os.cpu_count() or 1
+    default_workers = []
+    workers = 1
+    while workers <= cpus:
+        default_workers.append(workers)
+        workers *= 2
+    
+    parser = argparse.ArgumentParser(description="Parallel scan benchmark.")
+    parser.add_argument("--tasks", type=int, default=200_000, help="number of tasks")
+    parser.add_argument("--small", type=int, default=5_000,
+                        help="number of tasks of the small store (default: 5000)")
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)),
+                        help="comma-separated worker counts (default: powers of two up to "
+                             "the number of CPUs)")
+    parser.add_argument("--runs", type=int, default=3, help="searches per word")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (args.tasks, args.small):
+            path = os.path.join(directory, f"tasks-{size}.json")
+            generate_store(path, size)
+            print(f"Tasks: {size} ({cpus} CPUs)")
+            print(f"{'workers':>8}{'start (ms)':>12}{'search (ms)':>13}{'speedup':>9}")
+            _, serial = measure(path, 0, args.runs)
+            print(f"{'serial':>8}{'':>12}{serial * 1000:>13.2f}{1:>9.2f}", flush=True)
+            for workers in (int(count) for count in args.workers.split(",")):
+                startup, search = measure(path, workers, args.runs)
+                print(f"{workers:>8}{startup * 1000:>12.1f}{search * 1000:>13.2f}"
+                      f"{serial / search:>9.2f}", flush=True)
+            print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the TaskManager hot paths.
+
+Generates synthetic task stores of the requested sizes (1k to 1M tasks)
+from a fixed seed and times the main operations on each: loading,
+listing, filtering, searching, rendering, adding and saving. For every
+operation the latency percentiles, the throughput and the peak memory
+allocated by one call are reported and written to a JSON file.
+
+Given a baseline (a results file from an earlier run), every result is
+compared against it and the run fails (exit status 1) if an operation
+got slower, or allocates more memory, than the configured thresholds
+allow. Timings depend on the machine, so compare against a baseline
+recorded on the same machine.
+
+Usage:
+    python benchmarks/run.py [--sizes 1000,10000,100000] [--ops N] [--repeat N]
+                             [--output results.json] [--baseline baseline.json]
+                             [--threshold 0.2] [--memory-threshold 0.1]
+                             [--threshold-for NAME=FRACTION ...]
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import FileStorage  # noqa: E402
+from task import Task  # noqa: E402
+from task_manager import TaskManager  # noqa: E402
+
+CATEGORIES = ["work", "home", "urgent", "errands", "finance", "health", "later", "someday"]
+WORDS = ["report", "meeting", "invoice", "groceries", "review", "backup", "budget", "email",
+         "plan", "call", "design", "deploy", "refactor", "taxes", "dentist", "garden"]
+
+# Fixed reference time, so generated stores are identical on every run
+EPOCH = datetime(2024, 1, 1)
+
+
+class Store:
+    """
+    The state shared by the benchmarks of one store size.
+    
+    Attributes:
+        path (str): Path of the generated task file
+        size (int): Number of tasks in the store
+        manager (TaskManager): Manager holding the loaded store
+        rng (random.Random): Seeded random generator for the operation inputs
+        tasks (list): Loaded tasks for the rendering benchmark
+    """
+    
+    def __init__(self, path, size, seed):
+        """
+        Initialize a new Store.
+        
+        Args:
+            path (str): Path of the generated task file
+            size (int): Number of tasks in the store
+            seed (int): Random seed of the operation inputs
+        """
+        self.path = path
+        self.size = size
+        self.manager = None
+        self.rng = random.Random(seed)
+        self.tasks = []  # Sample of loaded tasks to render
+
+
+def generate_store(path, count, seed=1):
+    """
+    Write a synthetic task file.
+    
+    Args:
+        path (str): File to write
+        count (int): Number of tasks
+        seed (int, optional): Random seed. Defaults to 1.
+    """
+    rng = random.Random(seed)
+    tasks = {}
+    for i in range(count):
+        task = Task.from_fields(
+            f"{i:08x}",
+            f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+            f"Remember to {rng.choice(WORDS)} before the {rng.choice(WORDS)}",
+            rng.randint(1, 5),
+            0,
+            None,
+            rng.random() < 0.3,
+            rng.sample(CATEGORIES, rng.randint(0, 3)),
+        )
+        task.created_at = EPOCH - timedelta(minutes=i)
+        if rng.random() < 0.5:
+            task.due_date = EPOCH + timedelta(days=rng.randint(-30, 60))
+        tasks[task.id] = task
+    FileStorage(path).save(tasks)
+
+
+def bench_load(store, i):
+    """Load the store into a new TaskManager."""
+    store.manager = TaskManager(store.path)
+    store.manager.load_tasks()
+
+
+def bench_get_all_tasks(store, i):
+    """List every task."""
+    store.manager.get_all_tasks()
+
+
+def bench_category(store, i):
+    """Filter by a random category."""
+    store.manager.get_tasks_by_category(store.rng.choice(CATEGORIES))
+
+
+def bench_priority(store, i):
+    """Filter by a random priority."""
+    store.manager.get_tasks_by_priority(store.rng.randint(1, 5))
+
+
+def bench_search(store, i):
+    """Search for a random word prefix."""
+    store.manager.search_tasks(store.rng.choice(WORDS)[:4], limit=20)
+
+
+def bench_render(store, i):
+    """Render one task as text."""
+    str(store.tasks[i % len(store.tasks)])
+
+
+def bench_add(store, i):
+    """Add a random task."""
+    store.manager.add_task(f"{store.rng.choice(WORDS)} new {i}", "Added by the benchmark",
+                           store.rng.randint(1, 5), categories=[store.rng.choice(CATEGORIES)])
+
+
+def bench_save(store, i):
+    """Save the whole store."""
+    store.manager.save_tasks()
+
+
+# (name, operation, whether it touches every task) in the order they run.
+# Operations that touch every task run --repeat times, the others --ops
+# times. Reads run before the writes change the store.
+BENCHMARKS = [
+    ("load_tasks", bench_load, True),
+    ("get_all_tasks", bench_get_all_tasks, True),
+    ("get_tasks_by_category", bench_category, False),
+    ("get_tasks_by_priority", bench_priority, False),
+    ("search_tasks", bench_search, False),
+    ("task_str", bench_render, False),
+    ("add_task", bench_add, False),
+    ("save_tasks", bench_save, True),
+]
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of numbers (nearest rank).
+    
+    Args:
+        values (list): Sorted numbers (not empty)
+        fraction (float): Percentile as a fraction, e.g. 0.99
+    
+    Returns:
+        float: The value below which that fraction of the numbers falls
+    """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_benchmark(store, operation, calls, items_per_call):
+    """
+    Measure the peak memory of one call of an operation, then time it.
+    
+    The garbage collector is paused while timing, as timeit does, so a
+    collection triggered by an earlier benchmark does not land in this one.
+    
+    Args:
+        store (Store): The store to run on
+        operation (callable): Called with (store, call number)
+        calls (int): Number of timed calls
+        items_per_call (int): Tasks handled by one call, for the throughput
+    
+    Returns:
+        dict: Timing and memory results
+    """
+    # Memory is measured in an untimed first call, as tracing slows every
+    # allocation down. It also warms up caches before the timed calls.
+    gc.collect()
+    tracemalloc.start()
+    operation(store, calls)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    
+    latencies = []
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(calls):
+            start = time.perf_counter()
+            operation(store, i)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'calls': calls,
+        'mean_ms': total / calls * 1000,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'throughput': calls * items_per_call / total if total else float("inf"),
+        'peak_kb': peak / 1024,
+    }
+
+
+def run_size(directory, size, args):
+    """
+    Generate a store and run every benchmark on it.
+    
+    Args:
+        directory (str): Directory for the task file
+        size (int): Number of tasks
+        args (argparse.Namespace): Command-line arguments
+    
+    Returns:
+        dict: Benchmark name -> results
+    """
+    path = os.path.join(directory, f"tasks-{size}.json")
+    generate_store(path, size)
+    store = Store(path, size, seed=size)
+    
+    results = {}
+    for name, operation, whole_store in BENCHMARKS:
+        if store.manager is not None and not store.tasks:
+            store.tasks = store.manager.get_all_tasks()[:args.ops + 1]
+        calls = args.repeat if whole_store else args.ops
+        results[name] = run_benchmark(store, operation, calls, size if whole_store else 1)
+        print_result(size, name, results[name])
+    
+    store.manager.close()
+    for leftover in os.listdir(directory):
+        os.remove(os.path.join(directory, leftover))
+    return results
+
+
+def print_result(size, name, result):
+    """Print one result line."""
+    print(f"{size:>9} {name:<23}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}"
+          f"{result['p99_ms']:>10.3f}{result['throughput']:>14,.0f}{result['peak_kb']:>12,.0f}",
+          flush=True)
+
+
+def compare(results, baseline, args):
+    """
+    Compare results against a baseline.
+    
+    An operation regresses if its median latency grew by more than its
+    threshold, or its peak memory by more than the memory threshold.
+    
+    Args:
+        results (dict): Size -> benchmark name -> results of this run
+        baseline (dict): The same structure from the baseline file
+        args (argparse.Namespace): Command-line arguments with the thresholds
+    
+    Returns:
+        list: Descriptions of the regressions (empty if there are none)
+    """
+    thresholds = dict(args.threshold_for)
+    regressions = []
+    print(f"\n{'size':>9} {'benchmark':<23}{'p50':>10}{'memory':>10}  status")
+    for size, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            
+            time_change = result['p50_ms'] / base['p50_ms'] - 1 if base['p50_ms'] else 0.0
+            memory_change = result['peak_kb'] / base['peak_kb'] - 1 if base['peak_kb'] else 0.0
+            problems = []
+            if time_change > thresholds.get(name, args.threshold):
+                problems.append(f"p50 {time_change:+.0%}")
+            if memory_change > args.memory_threshold:
+                problems.append(f"memory {memory_change:+.0%}")
+            if problems:
+                regressions.append(f"{name} at {size} tasks: {', '.join(problems)}")
+            
+            status = "REGRESSION" if problems else "ok"
+            print(f"{size:>9} {name:<23}{time_change:>+10.0%}{memory_change:>+10.0%}  {status}")
+    return regressions
+
+
+def parse_threshold(text):
+    """
+    Parse a NAME=FRACTION option.
+    
+    Args:
+        text (str): The option value
+    
+    Returns:
+        tuple: (benchmark name, fraction)
+    """
+    name, _, fraction = text.partition("=")
+    if name not in {benchmark[0] for benchmark in BENCHMARKS}:
+        raise argparse.ArgumentTypeError(f"unknown benchmark {name!r}")
+    return name, float(fraction)
+
+
+def main():
+    """Run the benchmarks, write the results and compare them with the baseline."""
+    parser = argparse.ArgumentParser(description="Benchmark suite for the TaskManager hot paths.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated store sizes (default: 1000,10000,100000; "
+                             "add 1000000 for the full suite)")
+    parser.add_argument("--ops", type=int, default=1000,
+                        help="timed calls of the per-task operations (default: 1000)")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timed calls of the whole-store operations (default: 5)")
+    parser.add_argument("--output", default="benchmark-results.json",
+                        help="file to write the results to (default: benchmark-results.json)")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed growth of the median latency (default: 0.2 = 20%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.1,
+                        help="allowed growth of the peak memory (default: 0.1 = 10%%)")
+    parser.add_argument("--threshold-for", type=parse_threshold, action="append", default=[],
+                        metavar="NAME=FRACTION", help="latency threshold of one benchmark")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    
+    print(f"{'size':>9} {'benchmark':<23}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'tasks/s':>14}{'peak KB':>12}")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            results[str(size)] = run_size(directory, size, args)
+    
+    with open(args.output, "w") as f:
+        json.dump({
+            'meta': {
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'platform': platform.platform(),
+                'date': datetime.now().isoformat(timespec="seconds"),
+                'ops': args.ops,
+                'repeat': args.repeat,
+            },
+            'results': results,
+        }, f, indent=4)
+    print(f"\nResults written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
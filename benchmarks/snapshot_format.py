@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Snapshot format benchmark.
+
+Compares the indented JSON snapshot with the binary snapshot (plain and
+zlib-compressed) on file size, save time and load time.
+
+Usage:
+    python benchmarks/snapshot_format.py [--tasks N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import FileStorage  # noqa: E402
+from task import Task  # noqa: E402
+
+CATEGORIES = ["work", "home", "urgent", "errands", "finance", "health", "later"]
+
+
+def make_tasks(count, seed=1):
+    """
+    Generate synthetic tasks.
+    
+    Args:
+        count (int): Number of tasks
+        seed (int, optional): Random seed. Defaults to 1.
+    
+    Returns:
+        dict: Task ID -> Task
+    """
+    rng = random.Random(seed)
+    tasks = {}
+    for i in range(count):
+        due_date = f"2030-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}" if rng.random() < 0.5 else None
+        task = Task(f"Task {i}", f"Description of task number {i}", rng.randint(1, 5),
+                    due_date, rng.sample(CATEGORIES, rng.randint(0, 3)))
+        task.id = f"{i:08x}"
+        task.completed = rng.random() < 0.3
+        tasks[task.id] = task
+    return tasks
+
+
+def best_of(runs, func):
+    """Return the fastest of several timed runs, in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Snapshot format benchmark.")
+    parser.add_argument("--tasks", type=int, default=100_000, help="number of tasks")
+    parser.add_argument("--runs", type=int, default=3, help="runs per measurement")
+    args = parser.parse_args()
+    
+    tasks = make_tasks(args.tasks)
+    formats = [
+        ("json (indent=4)", dict(snapshot_format="json")),
+        ("binary", dict(snapshot_format="binary")),
+        ("binary + zlib", dict(snapshot_format="binary", compress=True)),
+    ]
+    
+    print(f"Tasks: {args.tasks}")
+    print(f"{'format':<18}{'size (KiB)':>12}{'save (ms)':>12}{'load (ms)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in formats:
+            storage = FileStorage(os.path.join(directory, "tasks"), journal=False, **options)
+            save = best_of(args.runs, lambda: storage.save(tasks))
+            load = best_of(args.runs, storage.load)
+            size = os.path.getsize(storage.path) / 1024
+            print(f"{name:<18}{size:>12.0f}{save * 1000:>12.0f}{load * 1000:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
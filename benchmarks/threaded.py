@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Threaded throughput benchmark.
+
+Runs a mix of reads (lookups, category filters, snapshots) and writes
+(adds, completions) from several threads against a thread-safe
+TaskManager and reports the operations per second, for a growing number
+of threads. A save is started every so often to show that it does not
+stall the other threads.
+
+Usage:
+    python benchmarks/threaded.py [--tasks N] [--seconds S] [--write-ratio R]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_manager import TaskManager  # noqa: E402
+
+CATEGORIES = ["work", "home", "urgent", "errands", "finance", "health", "later"]
+
+
+def worker(manager, ids, seconds, write_ratio, seed, results):
+    """
+    Run random operations until the time is up.
+    
+    Args:
+        manager (TaskManager): The shared manager
+        ids (list): Task IDs to operate on
+        seconds (float): How long to run
+        write_ratio (float): Fraction of operations that are writes
+        seed (int): Random seed
+        results (list): The operation count is appended here
+    """
+    rng = random.Random(seed)
+    operations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        roll = rng.random()
+        if roll < write_ratio / 2:
+            manager.add_task("New task", "Added by the benchmark", rng.randint(1, 5),
+                             categories=[rng.choice(CATEGORIES)])
+        elif roll < write_ratio:
+            manager.mark_task_completed(rng.choice(ids))
+        elif roll < 0.5 + write_ratio / 2:
+            manager.get_task(rng.choice(ids))
+        elif roll < 0.999:
+            manager.get_tasks_by_category(rng.choice(CATEGORIES))
+        else:
+            manager.snapshot()
+        operations += 1
+    results.append(operations)
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Threaded throughput benchmark.")
+    parser.add_argument("--tasks", type=int, default=10_000, help="number of tasks")
+    parser.add_argument("--seconds", type=float, default=2.0, help="duration per run")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="fraction of writes")
+    args = parser.parse_args()
+    
+    print(f"Tasks: {args.tasks}, writes: {args.write_ratio:.0%}")
+    print(f"{'threads':>8}{'ops/s':>12}{'saves':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for threads in (1, 2, 4, 8):
+            manager = TaskManager(os.path.join(directory, f"tasks-{threads}.json"),
+                                  thread_safe=True)
+            rng = random.Random(threads)
+            ids = manager.add_tasks(
+                {'title': f"Task {i}", 'description': "", 'priority': rng.randint(1, 5),
+                 'categories': rng.sample(CATEGORIES, 2)}
+                for i in range(args.tasks)
+            )
+            
+            # Save in the background the whole time
+            stop = threading.Event()
+            saves = []
+            
+            def saver():
+                while not stop.is_set():
+                    manager.save_tasks()
+                    saves.append(1)
+            
+            results = []
+            pool = [threading.Thread(target=worker, args=(manager, ids, args.seconds,
+                                                          args.write_ratio, n, results))
+                    for n in range(threads)]
+            saving = threading.Thread(target=saver)
+            saving.start()
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            stop.set()
+            saving.join()
+            
+            print(f"{threads:>8}{sum(results) / args.seconds:>12.0f}{len(saves):>8}")
+            assert manager.check_indexes() == []
+
+
+if __name__ == "__main__":
+    main()
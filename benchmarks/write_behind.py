@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Write-behind benchmark.
+
+Measures the latency of single mutations when every change is written
+synchronously and when writes are left to the write-behind thread, with
+and without a journal.
+
+Usage:
+    python benchmarks/write_behind.py [--tasks N] [--mutations N]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import FileStorage, WriteBehindStorage  # noqa: E402
+from task_manager import TaskManager  # noqa: E402
+
+
+def measure(storage, tasks, mutations):
+    """
+    Time single add_task calls on a manager that already holds some tasks.
+    
+    Args:
+        storage (TaskStorage): The storage to use
+        tasks (int): Number of tasks added before measuring
+        mutations (int): Number of timed add_task calls
+    
+    Returns:
+        tuple: (median latency, 99th percentile latency, time to flush), in seconds
+    """
+    manager = TaskManager(storage=storage)
+    manager.add_tasks({'title': f"Task {i}", 'description': "Existing"} for i in range(tasks))
+    manager.flush()
+    
+    latencies = []
+    for i in range(mutations):
+        start = time.perf_counter()
+        manager.add_task(f"New {i}", "Timed")
+        latencies.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    manager.close()
+    flush = time.perf_counter() - start
+    
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99)], flush
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description="Write-behind benchmark.")
+    parser.add_argument("--tasks", type=int, default=10_000, help="tasks in the store")
+    parser.add_argument("--mutations", type=int, default=500, help="timed mutations")
+    args = parser.parse_args()
+    
+    print(f"Tasks: {args.tasks}, mutations: {args.mutations}")
+    print(f"{'mode':<28}{'p50 (us)':>10}{'p99 (us)':>10}{'flush (ms)':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for journal in (True, False):
+            for write_behind in (False, True):
+                path = os.path.join(directory, f"tasks-{journal}-{write_behind}.json")
+                storage = FileStorage(path, journal=journal)
+                if write_behind:
+                    storage = WriteBehindStorage(storage)
+                p50, p99, flush = measure(storage, args.tasks, args.mutations)
+                
+                name = ("journal" if journal else "snapshot") + (" + write-behind" if write_behind else "")
+                print(f"{name:<28}{p50 * 1e6:>10.0f}{p99 * 1e6:>10.0f}{flush * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Binary snapshot module for the Task Manager application.
+
+This module defines a compact binary file format for task snapshots, as
+an alternative to the indented JSON file. It is smaller and faster to
+read and write, and can optionally be zlib-compressed.
+
+Layout (all integers little-endian):
+
+    header      magic b"TMSNAP", version (u8), flags (u8)
+    body        zlib-compressed if flags has FLAG_ZLIB set:
+      strings   count (u32), then per string: length (u32) + UTF-8 bytes
+      tasks     count (u32), then per task: length (u32) + record
+    record      id, title, description (each length (u32) + UTF-8 bytes),
+                priority (i8), completed (u8), created_at (i64),
+                due_date (i64, NO_DUE_DATE if unset),
+                category count (u16), category indexes into strings (u32 each)
+
+Timestamps are microseconds since 1970-01-01 (see task.to_timestamp).
+
+Usage:
+    python binary_format.py to-binary tasks.json tasks.bin [--compress]
+    python binary_format.py to-json tasks.bin tasks.json
+"""
+
+import argparse
+import json
+import struct
+import sys
+import zlib
+from array import array
+from task import Task
+
+MAGIC = b"TMSNAP"
+VERSION = 1
+FLAG_ZLIB = 0x01
+
+NO_DUE_DATE = -(1 << 63)
+
+HEADER = struct.Struct("<6sBB")
+LENGTH = struct.Struct("<I")
+FIELDS = struct.Struct("<bBqqH")
+
+# array type code holding 4-byte unsigned integers
+INDEX_TYPE = 'I' if array('I').itemsize == 4 else 'L'
+
+
+class SnapshotFormatError(ValueError):
+    """Raised when a binary snapshot is truncated, corrupt or of an unknown version."""
+
+
+def encode_tasks(tasks, compress=False):
+    """
+    Encode tasks into a binary snapshot.
+    
+    Args:
+        tasks (iterable): The Task objects to encode
+        compress (bool, optional): zlib-compress the body. Defaults to False.
+    
+    Returns:
+        bytes: The snapshot
+    """
+    strings = {}  # Category -> index in the string table
+    records = []
+    
+    for task in tasks:
+        indexes = array(INDEX_TYPE, [strings.setdefault(c, len(strings)) for c in task.categories])
+        due = task.due_timestamp
+        record = b"".join((
+            _encode_string(task.id),
+            _encode_string(task.title),
+            _encode_string(task.description),
+            FIELDS.pack(task.priority, task.completed, task.created_timestamp,
+                        NO_DUE_DATE if due is None else due, len(indexes)),
+            indexes.tobytes() if sys.byteorder == "little" else _swapped(indexes),
+        ))
+        records.append(LENGTH.pack(len(record)))
+        records.append(record)
+    
+    body = b"".join(
+        [LENGTH.pack(len(strings))]
+        + [_encode_string(s) for s in strings]
+        + [LENGTH.pack(len(records) // 2)]
+        + records
+    )
+    
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= FLAG_ZLIB
+    
+    return HEADER.pack(MAGIC, VERSION, flags) + body
+
+
+def decode_tasks(data):
+    """
+    Decode a binary snapshot.
+    
+    Args:
+        data (bytes): The snapshot
+    
+    Returns:
+        dict: Task ID -> Task, in snapshot order
+    
+    Raises:
+        SnapshotFormatError: If the snapshot is invalid
+    """
+    try:
+        magic, version, flags = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise SnapshotFormatError("Not a task snapshot")
+        if version != VERSION:
+            raise SnapshotFormatError(f"Unsupported snapshot version {version}")
+        
+        body = bytes(data[HEADER.size:])
+        if flags & FLAG_ZLIB:
+            body = zlib.decompress(body)
+        
+        strings, offset = _decode_string_table(body)
+        return _decode_records(body, offset, strings)
+    
+    except (struct.error, zlib.error, UnicodeDecodeError, IndexError) as e:
+        raise SnapshotFormatError(f"Corrupt task snapshot: {e}") from e
+
+
+def dump(tasks, path, compress=False):
+    """
+    Write tasks to a binary snapshot file.
+    
+    Args:
+        tasks (iterable): The Task objects to write
+        path (str): Destination file path
+        compress (bool, optional): zlib-compress the body. Defaults to False.
+    """
+    data = encode_tasks(tasks, compress)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def load(path):
+    """
+    Read a binary snapshot file.
+    
+    Args:
+        path (str): Source file path
+    
+    Returns:
+        dict: Task ID -> Task
+    
+    Raises:
+        SnapshotFormatError: If the file is not a valid snapshot
+    """
+    with open(path, 'rb') as f:
+        return decode_tasks(f.read())
+
+
+def is_binary_snapshot(path):
+    """
+    Check whether a file starts with the binary snapshot magic.
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        bool: True if the file looks like a binary snapshot
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def json_to_binary(json_path, binary_path, compress=False):
+    """
+    Convert a JSON task file into a binary snapshot.
+    
+    Args:
+        json_path (str): Source JSON file
+        binary_path (str): Destination binary file
+        compress (bool, optional): zlib-compress the body. Defaults to False.
+    
+    Returns:
+        int: Number of tasks converted
+    """
+    with open(json_path, 'r') as f:
+        tasks = [Task.from_dict(data) for data in json.load(f).values()]
+    dump(tasks, binary_path, compress)
+    return len(tasks)
+
+
+def binary_to_json(binary_path, json_path):
+    """
+    Convert a binary snapshot back into a JSON task file.
+    
+    The output is written exactly like TaskManager writes its JSON file.
+    
+    Args:
+        binary_path (str): Source binary file
+        json_path (str): Destination JSON file
+    
+    Returns:
+        int: Number of tasks converted
+    """
+    tasks = load(binary_path)
+    with open(json_path, 'w') as f:
+        json.dump({task_id: task.to_dict() for task_id, task in tasks.items()}, f, indent=4)
+    return len(tasks)
+
+
+def _encode_string(value):
+    """Encode a string as its UTF-8 length followed by its bytes."""
+    encoded = value.encode('utf-8')
+    return LENGTH.pack(len(encoded)) + encoded
+
+
+def _swapped(indexes):
+    """Return little-endian bytes of an index array on big-endian machines."""
+    indexes = array(INDEX_TYPE, indexes)
+    indexes.byteswap()
+    return indexes.tobytes()
+
+
+def _decode_string(body, offset):
+    """
+    Decode a length-prefixed string.
+    
+    Args:
+        body (bytes): Snapshot body
+        offset (int): Position of the length prefix
+    
+    Returns:
+        tuple: (string, offset after the string)
+    """
+    (length,) = LENGTH.unpack_from(body, offset)
+    start = offset + LENGTH.size
+    end = start + length
+    if end > len(body):
+        raise SnapshotFormatError("Truncated string")
+    return body[start:end].decode('utf-8'), end
+
+
+def _decode_string_table(body):
+    """
+    Decode the string table at the start of the body.
+    
+    Args:
+        body (bytes): Snapshot body
+    
+    Returns:
+        tuple: (list of strings, offset after the table)
+    """
+    (count,) = LENGTH.unpack_from(body, 0)
+    offset = LENGTH.size
+    strings = []
+    for _ in range(count):
+        value, offset = _decode_string(body, offset)
+        strings.append(sys.intern(value))
+    return strings, offset
+
+
+def _decode_records(body, offset, strings):
+    """
+    Decode every task record.
+    
+    Args:
+        body (bytes): Snapshot body
+        offset (int): Position of the task count
+        strings (list): The string table
+    
+    Returns:
+        dict: Task ID -> Task
+    """
+    (count,) = LENGTH.unpack_from(body, offset)
+    offset += LENGTH.size
+    
+    # Hot loop: the three strings are decoded inline rather than through
+    # _decode_string to save the function calls
+    unpack_length = LENGTH.unpack_from
+    unpack_fields = FIELDS.unpack_from
+    size = len(body)
+    
+    tasks = {}
+    for _ in range(count):
+        (length,) = unpack_length(body, offset)
+        offset += 4
+        end = offset + length
+        if end > size:
+            raise SnapshotFormatError("Truncated task record")
+        
+        (n,) = unpack_length(body, offset)
+        task_id = body[offset + 4:offset + 4 + n].decode('utf-8')
+        pos = offset + 4 + n
+        (n,) = unpack_length(body, pos)
+        title = body[pos + 4:pos + 4 + n].decode('utf-8')
+        pos += 4 + n
+        (n,) = unpack_length(body, pos)
+        description = body[pos + 4:pos + 4 + n].decode('utf-8')
+        pos += 4 + n
+        
+        priority, completed, created_ts, due_ts, category_count = unpack_fields(body, pos)
+        pos += FIELDS.size
+        if pos + 4 * category_count != end:
+            raise SnapshotFormatError("Malformed task record")
+        indexes = struct.unpack_from(f"<{category_count}I", body, pos) if category_count else ()
+        
+        tasks[task_id] = Task.from_fields(
+            task_id, title, description, priority, created_ts,
+            None if due_ts == NO_DUE_DATE else due_ts, bool(completed),
+            [strings[i] for i in indexes],
+        )
+        offset = end
+    
+    return tasks
+
+
+def main():
+    """Convert between the JSON and binary task file formats."""
+    parser = argparse.ArgumentParser(description="Convert task files between JSON and binary.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    to_binary = subparsers.add_parser("to-binary", help="convert a JSON file to binary")
+    to_binary.add_argument("source")
+    to_binary.add_argument("destination")
+    to_binary.add_argument("--compress", action="store_true", help="zlib-compress the snapshot")
+    
+    to_json = subparsers.add_parser("to-json", help="convert a binary file to JSON")
+    to_json.add_argument("source")
+    to_json.add_argument("destination")
+    
+    args = parser.parse_args()
+    if args.command == "to-binary":
+        count = json_to_binary(args.source, args.destination, args.compress)
+    else:
+        count = binary_to_json(args.source, args.destination)
+    print(f"Converted {count} tasks to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Command-line interface module for the Task Manager application.
+
+This module implements the non-interactive subcommands of main.py
+(add, list, complete, delete, search, stats, import and export), meant for
+scripts and shell loops, and the serve command that starts the HTTP
+server of server.py. Output is machine-readable: task listings are
+written as NDJSON (one JSON object per line, in the format of
+Task.to_dict) or CSV, IDs are printed one per line, and errors go to
+stderr with a non-zero exit status.
+
+Usage:
+    python main.py add "Write report" -p 1 --due 2024-01-31 -c work
+    python main.py list --open --category work --limit 20
+    python main.py stats
+    python main.py export tasks.csv
+    python main.py import tasks.ndjson
+    python main.py serve --port 8080
+    python main.py --metrics prometheus list > /dev/null
+    python main.py --file tasks.tmm list --category work
+"""
+
+import argparse
+import csv
+import json
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from instrumentation import capture
+from mmap_snapshot import MappedStorage, is_mapped_snapshot
+from query import SORT_KEYS, filters
+from task import Task
+from task_manager import TaskManager
+
+# Columns of the CSV format. Categories are joined with CATEGORY_SEPARATOR.
+CSV_FIELDS = ['id', 'title', 'description', 'priority', 'created_at', 'due_date',
+              'completed', 'categories']
+CATEGORY_SEPARATOR = ";"
+
+FORMATS = ('ndjson', 'csv')
+
+# Edges in days of the age buckets printed by stats
+AGE_BUCKETS = (1, 7, 30, 90)
+
+# Exit status of a command that failed
+EXIT_FAILURE = 1
+
+
+def build_parser():
+    """
+    Build the argument parser of the subcommands.
+    
+    Returns:
+        argparse.ArgumentParser: The parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Manage tasks from the command line. Run without arguments "
+                    "for the interactive menu."
+    )
+    parser.add_argument("--file", default="tasks.json",
+                        help="task storage file (default: tasks.json); a memory-mapped "
+                             "snapshot (see mmap_snapshot.py) is opened read-only")
+    parser.add_argument("--metrics", choices=("json", "prometheus"),
+                        help="print call counts, latencies and bytes read and written to "
+                             "stderr when the command ends (serve also answers GET /metrics)")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write cProfile statistics of the command to PATH "
+                             "(view them with python -m pstats PATH)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="add the peak memory and the top allocation sites to --metrics")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    
+    add = commands.add_parser("add", help="add a task and print its ID")
+    add.add_argument("title")
+    add.add_argument("-d", "--description", default="")
+    add.add_argument("-p", "--priority", type=int, default=3, help="1 (highest) to 5")
+    add.add_argument("--due", help="due date in YYYY-MM-DD format")
+    add.add_argument("-c", "--category", action="append", default=[],
+                     help="category; may be given several times")
+    
+    listing = commands.add_parser("list", help="list tasks")
+    listing.add_argument("-p", "--priority", type=int)
+    listing.add_argument("-c", "--category")
+    status = listing.add_mutually_exclusive_group()
+    status.add_argument("--open", action="store_true", help="only tasks that are not completed")
+    status.add_argument("--completed", action="store_true", help="only completed tasks")
+    listing.add_argument("--due-start", help="only open tasks due on or after this date")
+    listing.add_argument("--due-end", help="only open tasks due on or before this date")
+    listing.add_argument("--order", default="status", choices=list(SORT_KEYS),
+                         help="sort order (default: open tasks first, then by priority)")
+    listing.add_argument("--offset", type=int, default=0)
+    listing.add_argument("--limit", type=int)
+    add_output_format(listing)
+    
+    complete = commands.add_parser("complete", help="mark tasks as completed")
+    complete.add_argument("ids", nargs="+", metavar="ID", help="task ID or a unique prefix of it")
+    
+    delete = commands.add_parser("delete", help="delete tasks")
+    delete.add_argument("ids", nargs="+", metavar="ID", help="task ID or a unique prefix of it")
+    
+    search = commands.add_parser("search", help="search titles, descriptions and categories")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int)
+    add_output_format(search)
+    
+    commands.add_parser("stats", help="print task counts, overdue rates and ages as JSON")
+    
+    importing = commands.add_parser("import", help="add tasks from an NDJSON or CSV file")
+    importing.add_argument("path", nargs="?", default="-", help="file to read (default: stdin)")
+    importing.add_argument("--format", choices=FORMATS,
+                           help="file format (default: csv for .csv files, else ndjson)")
+    
+    exporting = commands.add_parser("export", help="write all tasks as NDJSON or CSV")
+    exporting.add_argument("path", nargs="?", default="-", help="file to write (default: stdout)")
+    exporting.add_argument("--format", choices=FORMATS,
+                           help="file format (default: csv for .csv files, else ndjson)")
+    
+    serving = commands.add_parser("serve", help="serve the tasks as a JSON API over HTTP")
+    serving.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    serving.add_argument("--port", type=int, default=8080, help="port to listen on")
+    serving.add_argument("--shared", action="store_true",
+                         help="coordinate with other processes using the same file")
+    serving.add_argument("--write-behind", action="store_true",
+                         help="write changes from a background thread in groups")
+    serving.add_argument("--verbose", action="store_true", help="log every request")
+    
+    return parser
+
+
+def add_output_format(parser):
+    """
+    Add the --format option of the commands that print tasks.
+    
+    Args:
+        parser (argparse.ArgumentParser): The subcommand parser
+    """
+    parser.add_argument("--format", default="ndjson", choices=[*FORMATS, "text"],
+                        help="output format (default: ndjson)")
+
+
+def run(argv=None):
+    """
+    Run one subcommand.
+    
+    Args:
+        argv (list, optional): Command-line arguments without the program
+            name. Defaults to sys.argv[1:].
+    
+    Returns:
+        int: Exit status
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.trace_memory and not args.metrics:
+        parser.error("--trace-memory needs --metrics")
+    if args.command == "serve":
+        return command_serve(args)
+    
+    storage = MappedStorage(args.file) if is_mapped_snapshot(args.file) else None
+    task_manager = TaskManager(args.file, storage=storage, instrument=bool(args.metrics))
+    try:
+        with capture(args.profile, args.trace_memory, task_manager.metrics):
+            # Only read what the command needs; entries become Task objects on use
+            task_manager.load_tasks(mode="lazy")
+            try:
+                return COMMANDS[args.command](task_manager, args) or 0
+            finally:
+                task_manager.close()
+    except (KeyError, ValueError, OSError) as e:
+        message = e.args[0] if isinstance(e, KeyError) and e.args else e
+        print(f"error: {message}", file=sys.stderr)
+        return EXIT_FAILURE
+    finally:
+        if args.metrics:
+            write_metrics(sys.stderr, task_manager.metrics, args.metrics)
+
+
+def command_add(task_manager, args):
+    """Add a task and print its ID."""
+    if args.due:
+        datetime.strptime(args.due, "%Y-%m-%d")  # Reject bad dates instead of dropping them
+    categories = [Task.normalize_category(category) for category in args.category]
+    print(task_manager.add_task(args.title, args.description, args.priority, args.due,
+                                categories))
+
+
+def command_list(task_manager, args):
+    """Print a page of the tasks matching the filters."""
+    completed = True if args.completed else False if args.open else None
+    where = filters(args.priority, args.category, completed, args.due_start, args.due_end)
+    tasks = task_manager.iter_tasks(args.order, args.offset, args.limit, where)
+    write_tasks(sys.stdout, tasks, args.format)
+
+
+def command_complete(task_manager, args):
+    """Mark tasks as completed; fails without changes if any ID is unknown."""
+    task_manager.complete_tasks([task_manager.resolve_id(prefix) for prefix in args.ids])
+
+
+def command_delete(task_manager, args):
+    """Delete tasks; fails without changes if any ID is unknown."""
+    task_manager.delete_tasks([task_manager.resolve_id(prefix) for prefix in args.ids])
+
+
+def command_search(task_manager, args):
+    """Print the tasks matching a search."""
+    write_tasks(sys.stdout, task_manager.search_tasks(args.query, args.limit), args.format)
+
+
+def command_stats(task_manager, args):
+    """Print the counts a dashboard needs, computed from the columnar view."""
+    view = task_manager.analytics()
+    now = datetime.now()
+    edges = list(AGE_BUCKETS)
+    labels = [f"<{edges[0]}"] + [f"{low}-{high}" for low, high in zip(edges, edges[1:])] + \
+        [f"{edges[-1]}+"]
+    json.dump({
+        'tasks': view.count(),
+        'by_status': view.group_count("status"),
+        'by_priority': view.group_count("priority"),
+        'by_category': view.group_count("category"),
+        'overdue': view.overdue_count(now=now),
+        'overdue_rate': view.overdue_rate(now=now),
+        'open_age_days': dict(zip(labels, view.histogram("age", edges, {'completed': False}, now))),
+        'completed_age_days': dict(zip(labels, view.histogram("age", edges, {'completed': True},
+                                                              now))),
+    }, sys.stdout, indent=4)
+    print()
+
+
+def command_import(task_manager, args):
+    """Add the tasks of a file in one write and print how many there were."""
+    file_format = args.format or guess_format(args.path)
+    with open_file(args.path, "r") as f:
+        print(task_manager.import_tasks(read_entries(f, file_format)))
+
+
+def command_export(task_manager, args):
+    """Write every task to a file."""
+    file_format = args.format or guess_format(args.path)
+    tasks = task_manager.tasks
+    if hasattr(tasks, 'iter_dicts'):
+        entries = (entry for _, entry in tasks.iter_dicts())  # No Task objects needed
+    else:
+        entries = (task.to_dict() for task in tasks.values())
+    with open_file(args.path, "w") as f:
+        write_entries(f, entries, file_format)
+
+
+def command_serve(args):
+    """Serve the tasks over HTTP until interrupted."""
+    # Imported here so the other commands do not pay for the HTTP modules
+    import server
+    
+    task_manager = TaskManager(args.file, write_behind=args.write_behind, shared=args.shared,
+                               thread_safe=True, instrument=bool(args.metrics))
+    with capture(args.profile, args.trace_memory, task_manager.metrics):
+        task_manager.load_tasks()
+        server.serve(task_manager, args.host, args.port, args.verbose)
+    if args.metrics:
+        write_metrics(sys.stderr, task_manager.metrics, args.metrics)
+    return 0
+
+
+COMMANDS = {
+    'add': command_add,
+    'list': command_list,
+    'complete': command_complete,
+    'delete': command_delete,
+    'search': command_search,
+    'stats': command_stats,
+    'import': command_import,
+    'export': command_export,
+}
+
+
+def write_metrics(f, metrics, output_format):
+    """
+    Write the metrics of an instrumented manager.
+    
+    Args:
+        f (file): Text file to write to
+        metrics (instrumentation.Metrics): The metrics
+        output_format (str): "json" or "prometheus"
+    """
+    f.write(metrics.to_json() + "\n" if output_format == "json" else metrics.to_prometheus())
+
+
+def guess_format(path):
+    """
+    Pick a file format from a file name.
+    
+    Args:
+        path (str): File path, or "-" for stdin/stdout
+    
+    Returns:
+        str: "csv" for .csv files, "ndjson" otherwise
+    """
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def open_file(path, mode):
+    """
+    Open a file for import or export, with "-" standing for stdin/stdout.
+    
+    Args:
+        path (str): File path or "-"
+        mode (str): "r" or "w"
+    
+    Returns:
+        file: A text file to use in a with statement
+    """
+    if path == "-":
+        return nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def write_tasks(f, tasks, output_format):
+    """
+    Print tasks in an output format.
+    
+    Args:
+        f (file): Text file to write to
+        tasks (iterable): The Task objects
+        output_format (str): "ndjson", "csv" or "text"
+    """
+    if output_format == "text":
+        now = datetime.now()  # One clock reading for the whole listing
+        for task in tasks:
+            f.write(task.render(now) + "\n")
+    else:
+        write_entries(f, (task.to_dict() for task in tasks), output_format)
+
+
+def write_entries(f, entries, file_format):
+    """
+    Write task dictionaries one at a time.
+    
+    Args:
+        f (file): Text file to write to
+        entries (iterable): Dictionaries in the format of Task.to_dict
+        file_format (str): "ndjson" or "csv"
+    """
+    if file_format == "csv":
+        writer = csv.DictWriter(f, CSV_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        for entry in entries:
+            row = dict(entry)
+            row['completed'] = "true" if entry['completed'] else "false"
+            row['categories'] = CATEGORY_SEPARATOR.join(entry['categories'])
+            writer.writerow(row)
+    else:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def read_entries(f, file_format):
+    """
+    Read task dictionaries one at a time.
+    
+    CSV files need a header row; every column but 'title' is optional.
+    
+    Args:
+        f (file): Text file to read from
+        file_format (str): "ndjson" or "csv"
+    
+    Yields:
+        dict: Task fields in the format of Task.to_dict
+    
+    Raises:
+        ValueError: If a line or row cannot be parsed
+    """
+    if file_format == "csv":
+        for line_number, row in enumerate(csv.DictReader(f), 2):
+            try:
+                yield parse_csv_row(row)
+            except ValueError as e:
+                raise ValueError(f"line {line_number}: {e}") from None
+        return
+    
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line_number}: {e}") from None
+        if not isinstance(entry, dict):
+            raise ValueError(f"line {line_number}: expected a JSON object")
+        yield entry
+
+
+def parse_csv_row(row):
+    """
+    Convert a CSV row to a task dictionary.
+    
+    Args:
+        row (dict): Column name -> text; empty cells count as missing
+    
+    Returns:
+        dict: Task fields in the format of Task.to_dict
+    
+    Raises:
+        ValueError: If the priority is not a number
+    """
+    entry = {key: value for key, value in row.items() if key in CSV_FIELDS and value}
+    if 'priority' in entry:
+        entry['priority'] = int(entry['priority'])
+    if 'completed' in entry:
+        entry['completed'] = entry['completed'].strip().lower() in ("true", "1", "yes")
+    if 'categories' in entry:
+        entry['categories'] = [
+            category for category in entry['categories'].split(CATEGORY_SEPARATOR) if category
+        ]
+    return entry
@@ -0,0 +1,98 @@
+"""
+File lock module for the Task Manager application.
+
+This module defines the FileLock class, an advisory lock on a file that
+several processes use to take turns reading and writing the same task
+storage.
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class FileLock:
+    """
+    An advisory, reentrant inter-process lock based on ``fcntl.flock``.
+    
+    Shared locks can be held by several processes at once and are used for
+    reading; an exclusive lock is held by one process at a time and is used
+    for writing. Acquiring the lock again while it is held only increments
+    a counter, and asking for an exclusive lock while holding a shared one
+    upgrades it.
+    
+    Where fcntl is not available (Windows) the lock does nothing.
+    
+    Attributes:
+        path (str): File path of the lock file
+    """
+    
+    def __init__(self, path):
+        """
+        Initialize a new FileLock.
+        
+        Args:
+            path (str): File path of the lock file (created if needed)
+        """
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+    
+    @property
+    def held(self):
+        """bool: True while this process holds the lock."""
+        return self._depth > 0
+    
+    def acquire(self, shared=False):
+        """
+        Block until the lock is acquired.
+        
+        Args:
+            shared (bool, optional): Take a shared (read) lock instead of an
+                exclusive (write) lock. Defaults to False.
+        """
+        if fcntl is None:
+            self._depth += 1
+            return
+        
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._exclusive = not shared
+        elif not shared and not self._exclusive:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)  # Upgrade
+            self._exclusive = True
+        self._depth += 1
+    
+    def release(self):
+        """Release one level of the lock, unlocking the file at the outermost level."""
+        if self._depth == 0:
+            raise RuntimeError("Lock is not held")
+        
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+            self._exclusive = False
+    
+    @contextmanager
+    def locked(self, shared=False):
+        """
+        Hold the lock for the duration of a with block.
+        
+        Args:
+            shared (bool, optional): Take a shared (read) lock. Defaults to False.
+        """
+        self.acquire(shared)
+        try:
+            yield self
+        finally:
+            self.release()
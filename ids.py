@@ -0,0 +1,129 @@
+"""
+Task ID module for the Task Manager application.
+
+This module generates task IDs. An ID is 16 characters of lowercase
+Crockford base32: 10 characters for the creation time in milliseconds
+followed by 6 characters (30 bits) of randomness, like a shortened ULID.
+Because the time comes first and every character has the same width,
+IDs sort in the order they were created, so new IDs are appended at the
+end of sorted ID lists. IDs generated in the same millisecond by one
+process count up from the random part instead of drawing again, so they
+keep increasing and never repeat.
+
+The random part only guards against other processes creating a task in
+the same millisecond; TaskManager still checks every new ID against the
+stored tasks. Tasks created before this scheme have 8-character
+hexadecimal IDs, which keep working unchanged.
+"""
+
+import os
+import secrets
+import threading
+import time
+
+# Crockford's base32 alphabet (no i, l, o or u), in ASCII order so that
+# encoded numbers sort like the numbers
+ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+
+TIME_LENGTH = 10  # 50 bits, enough for milliseconds until the year 37000
+RANDOM_LENGTH = 6  # 30 bits
+ID_LENGTH = TIME_LENGTH + RANDOM_LENGTH
+
+_RANDOM_LIMIT = len(ALPHABET) ** RANDOM_LENGTH
+
+
+class IdGenerator:
+    """
+    Generates increasing, time-sortable task IDs.
+    
+    Safe to use from several threads.
+    """
+    
+    def __init__(self):
+        """Initialize a new IdGenerator."""
+        self._lock = threading.Lock()
+        self._last_time = -1  # Millisecond of the last ID
+        self._last_random = 0  # Random part of the last ID
+    
+    def new_id(self):
+        """
+        Generate an ID greater than every ID this generator returned before.
+        
+        Returns:
+            str: The new ID
+        """
+        now = time.time_ns() // 1_000_000
+        with self._lock:
+            if now > self._last_time:
+                self._last_time = now
+                self._last_random = secrets.randbits(5 * RANDOM_LENGTH)
+            else:
+                # Same millisecond, or the clock went back: count up
+                self._last_random += 1
+                if self._last_random == _RANDOM_LIMIT:
+                    self._last_time += 1
+                    self._last_random = 0
+            return encode(self._last_time, TIME_LENGTH) + encode(self._last_random, RANDOM_LENGTH)
+    
+    def reset(self):
+        """Draw a new random part for the next ID, e.g. in a forked child process."""
+        with self._lock:
+            self._last_time = -1
+
+
+def encode(number, length):
+    """
+    Encode a number in base32 with a fixed number of characters.
+    
+    Args:
+        number (int): Non-negative number below 32 ** length
+        length (int): Number of characters
+    
+    Returns:
+        str: The encoded number, padded with leading zeros
+    """
+    chars = []
+    for _ in range(length):
+        number, digit = divmod(number, 32)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def id_time(task_id):
+    """
+    Get the creation time encoded in an ID.
+    
+    Args:
+        task_id (str): A task ID
+    
+    Returns:
+        int: Milliseconds since the epoch, or None for legacy and foreign IDs
+    """
+    if len(task_id) != ID_LENGTH:
+        return None
+    
+    value = 0
+    for char in task_id[:TIME_LENGTH]:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        value = value * 32 + digit
+    return value
+
+
+_generator = IdGenerator()
+
+# A forked child would continue the parent's sequence and could repeat its IDs
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_generator.reset)
+
+
+def new_id():
+    """
+    Generate a new task ID.
+    
+    Returns:
+        str: A 16-character ID that sorts after every ID generated before
+            by this process
+    """
+    return _generator.new_id()
@@ -0,0 +1,510 @@
+"""
+Instrumentation module for the Task Manager application.
+
+This module records where a TaskManager spends its time: how often each
+public method is called, how long the calls take (as a latency
+histogram), how many of them fail and how many bytes they read from and
+write to disk. The storage backend and its journal are instrumented as
+well, so the time of a save splits into encoding (``FileStorage.encode``)
+and writing, and a slow read can be told apart from a slow scan.
+
+Instrumentation is opt-in (``TaskManager(instrument=True)`` or
+``instrument(task_manager)``). It replaces the methods of that one
+instance with timed wrappers, so a manager without instrumentation runs
+the original methods and pays nothing; the only code that stays in the
+I/O paths is one thread-local lookup per file read or write.
+
+The recorded data can be exported as JSON (``Metrics.to_dict``) or in
+the Prometheus text format (``Metrics.to_prometheus``), for example with
+``python main.py --metrics prometheus list``. ``capture`` adds a cProfile
+dump and tracemalloc's peak memory and top allocation sites on top.
+
+Bytes are counted for the file storage and its journal. SQLite does its
+own I/O, so SQLiteStorage calls are timed but have no byte counts.
+"""
+
+import bisect
+import cProfile
+import functools
+import inspect
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Methods of the storage backends and the journal that are timed, where present
+STORAGE_METHODS = ('load', 'load_entries', 'save', 'encode', 'install', 'write', 'commit',
+                   'flush', 'get', 'find', 'find_due', 'ordered', 'search', 'categories',
+                   'ids_with_prefix')
+JOURNAL_METHODS = ('append_many', 'read_from')
+
+# Public TaskManager methods that are not timed: batch only returns a
+# context manager, the time is spent in the calls made inside it
+UNTIMED_METHODS = frozenset({'batch'})
+
+# The operations running on each thread, innermost last
+_local = threading.local()
+
+
+class OperationStats:
+    """
+    What was recorded for one operation.
+    
+    Attributes:
+        calls (int): Number of calls
+        errors (int): Number of calls that raised an exception
+        total_seconds (float): Time spent in all calls
+        bucket_counts (list): Calls per latency bucket, the last one for
+            calls slower than every bucket bound
+        bytes_read (int): Bytes read from disk during the calls
+        bytes_written (int): Bytes written to disk during the calls
+    """
+    
+    __slots__ = ('metrics', 'calls', 'errors', 'total_seconds', 'bucket_counts',
+                 'bytes_read', 'bytes_written')
+    
+    def __init__(self, metrics):
+        """
+        Initialize new OperationStats.
+        
+        Args:
+            metrics (Metrics): The metrics the operation belongs to
+        """
+        self.metrics = metrics
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.bucket_counts = [0] * (len(metrics.buckets) + 1)
+        self.bytes_read = 0
+        self.bytes_written = 0
+    
+    def observe(self, seconds, failed):
+        """
+        Record one call.
+        
+        Args:
+            seconds (float): How long the call took
+            failed (bool): Whether it raised an exception
+        """
+        bucket = bisect.bisect_left(self.metrics.buckets, seconds)
+        with self.metrics.lock:
+            self.calls += 1
+            self.errors += failed
+            self.total_seconds += seconds
+            self.bucket_counts[bucket] += 1
+    
+    def quantile(self, fraction):
+        """
+        Estimate a latency percentile from the histogram.
+        
+        Interpolates linearly inside the bucket the percentile falls in,
+        like Prometheus' histogram_quantile.
+        
+        Args:
+            fraction (float): Percentile as a fraction, e.g. 0.99
+        
+        Returns:
+            float: Estimated latency in seconds, 0.0 if there were no calls
+        """
+        if not self.calls:
+            return 0.0
+        
+        buckets = self.metrics.buckets
+        rank = fraction * self.calls
+        seen = 0
+        for index, count in enumerate(self.bucket_counts):
+            if count and seen + count >= rank:
+                if index == len(buckets):
+                    return buckets[-1]  # Slower than the largest bound
+                lower = buckets[index - 1] if index else 0.0
+                return lower + (buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return buckets[-1]
+    
+    def to_dict(self):
+        """
+        Convert the stats to a dictionary for JSON output.
+        
+        Returns:
+            dict: Counts, latency summary in milliseconds, histogram and bytes
+        """
+        bounds = [*self.metrics.buckets, "+Inf"]
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': self.total_seconds * 1000,
+            'mean_ms': self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'histogram': {  # Calls per bucket upper bound, empty buckets left out
+                str(bound): count for bound, count in zip(bounds, self.bucket_counts) if count
+            },
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+        }
+
+
+class Metrics:
+    """
+    Call counts, latency histograms and I/O volume per operation.
+    
+    Operations are named after the class and method, for example
+    ``TaskManager.add_task`` or ``FileStorage.save``. Calls made during
+    another call are recorded for both, so bytes written by
+    ``FileStorage.save`` also count for the ``TaskManager.save_tasks``
+    call that caused them. Safe to share between threads and managers.
+    
+    Attributes:
+        buckets (tuple): Upper bounds of the latency buckets, in seconds
+        operations (dict): Operation name -> OperationStats
+        bytes_read (int): Bytes read during all operations
+        bytes_written (int): Bytes written during all operations
+        memory (dict): Results of the last ``capture`` with memory=True,
+            None if there was none
+        lock (threading.Lock): Guards the counters
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize new Metrics.
+        
+        Args:
+            buckets (tuple, optional): Upper bounds of the latency buckets in
+                seconds, in increasing order. Defaults to DEFAULT_BUCKETS.
+        """
+        self.buckets = tuple(buckets)
+        self.operations = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.memory = None
+        self.lock = threading.Lock()
+    
+    def stats(self, operation):
+        """
+        Get the stats of an operation, creating them on first use.
+        
+        Args:
+            operation (str): Operation name
+        
+        Returns:
+            OperationStats: The stats
+        """
+        with self.lock:
+            stats = self.operations.get(operation)
+            if stats is None:
+                stats = self.operations[operation] = OperationStats(self)
+            return stats
+    
+    def timed(self, operation, function):
+        """
+        Wrap a function so that its calls are recorded.
+        
+        Args:
+            operation (str): Operation name
+            function (callable): The function (usually a bound method)
+        
+        Returns:
+            callable: The wrapper
+        """
+        stats = self.stats(operation)
+        perf_counter = time.perf_counter
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            frames = _frames()
+            frames.append(stats)
+            failed = True
+            start = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                elapsed = perf_counter() - start
+                frames.pop()
+                stats.observe(elapsed, failed)
+        
+        wrapper.instrumented = function
+        return wrapper
+    
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self.lock:
+            for stats in self.operations.values():
+                stats.calls = stats.errors = 0
+                stats.total_seconds = 0.0
+                stats.bucket_counts = [0] * (len(self.buckets) + 1)
+                stats.bytes_read = stats.bytes_written = 0
+            self.bytes_read = self.bytes_written = 0
+            self.memory = None
+    
+    def to_dict(self):
+        """
+        Convert the metrics to a dictionary for JSON output.
+        
+        Operations that were never called are left out.
+        
+        Returns:
+            dict: Totals, per-operation stats and memory results
+        """
+        with self.lock:
+            operations = {
+                name: stats.to_dict()
+                for name, stats in sorted(self.operations.items()) if stats.calls
+            }
+            data = {
+                'bytes_read': self.bytes_read,
+                'bytes_written': self.bytes_written,
+                'operations': operations,
+            }
+            if self.memory is not None:
+                data['memory'] = self.memory
+            return data
+    
+    def to_json(self):
+        """
+        Encode the metrics as JSON.
+        
+        Returns:
+            str: The JSON text
+        """
+        return json.dumps(self.to_dict(), indent=4)
+    
+    def to_prometheus(self, prefix="taskmanager"):
+        """
+        Encode the metrics in the Prometheus text exposition format.
+        
+        Args:
+            prefix (str, optional): Prefix of the metric names.
+                Defaults to "taskmanager".
+        
+        Returns:
+            str: The metrics, one sample per line
+        """
+        lines = []
+        
+        def family(name, kind, description):
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+        
+        with self.lock:
+            operations = [
+                (_label(name), stats)
+                for name, stats in sorted(self.operations.items()) if stats.calls
+            ]
+            
+            family("calls_total", "counter", "Calls of each operation.")
+            for label, stats in operations:
+                lines.append(f'{prefix}_calls_total{{operation="{label}"}} {stats.calls}')
+            
+            family("errors_total", "counter", "Calls of each operation that raised an exception.")
+            for label, stats in operations:
+                lines.append(f'{prefix}_errors_total{{operation="{label}"}} {stats.errors}')
+            
+            family("operation_duration_seconds", "histogram", "Latency of each operation.")
+            for label, stats in operations:
+                cumulative = 0
+                bounds = [*map(_number, self.buckets), "+Inf"]
+                for bound, count in zip(bounds, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_operation_duration_seconds_bucket'
+                                 f'{{operation="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_operation_duration_seconds_sum{{operation="{label}"}} '
+                             f'{_number(stats.total_seconds)}')
+                lines.append(f'{prefix}_operation_duration_seconds_count{{operation="{label}"}} '
+                             f'{stats.calls}')
+            
+            family("read_bytes_total", "counter", "Bytes read from disk during each operation.")
+            for label, stats in operations:
+                lines.append(f'{prefix}_read_bytes_total{{operation="{label}"}} {stats.bytes_read}')
+            
+            family("written_bytes_total", "counter", "Bytes written to disk during each operation.")
+            for label, stats in operations:
+                lines.append(f'{prefix}_written_bytes_total{{operation="{label}"}} '
+                             f'{stats.bytes_written}')
+            
+            if self.memory is not None:
+                family("memory_peak_bytes", "gauge", "Peak traced memory of the last capture.")
+                lines.append(f"{prefix}_memory_peak_bytes {self.memory['peak_bytes']}")
+        
+        return "\n".join(lines) + "\n"
+
+
+def instrument(task_manager, metrics=None):
+    """
+    Record the calls of a TaskManager, its storage backend and its journal.
+    
+    Args:
+        task_manager (TaskManager): The manager to instrument
+        metrics (Metrics, optional): Where to record, for example to share
+            one Metrics between managers. Defaults to a new Metrics.
+    
+    Returns:
+        Metrics: The metrics the calls are recorded in
+    """
+    if metrics is None:
+        metrics = Metrics()
+    if task_manager.metrics is not None:
+        uninstrument(task_manager)
+    
+    for name, member in vars(type(task_manager)).items():
+        if inspect.isfunction(member) and not name.startswith("_") \
+                and name not in UNTIMED_METHODS:
+            _wrap(task_manager, name, metrics)
+    
+    # A write-behind storage wraps the storage that does the I/O
+    storage = task_manager.storage
+    while storage is not None:
+        for name in STORAGE_METHODS:
+            _wrap(storage, name, metrics)
+        if getattr(storage, 'journal', None) is not None:
+            for name in JOURNAL_METHODS:
+                _wrap(storage.journal, name, metrics)
+        storage = getattr(storage, 'storage', None)
+    
+    task_manager.metrics = metrics
+    return metrics
+
+
+def uninstrument(task_manager):
+    """
+    Restore the original methods of an instrumented TaskManager.
+    
+    Args:
+        task_manager (TaskManager): The manager
+    """
+    objects = [task_manager]
+    storage = task_manager.storage
+    while storage is not None:
+        objects.append(storage)
+        if getattr(storage, 'journal', None) is not None:
+            objects.append(storage.journal)
+        storage = getattr(storage, 'storage', None)
+    
+    for obj in objects:
+        for name, value in list(vars(obj).items()):
+            if hasattr(value, 'instrumented'):
+                delattr(obj, name)
+    task_manager.metrics = None
+
+
+def count_read(nbytes):
+    """
+    Count bytes read from disk for the operations running on this thread.
+    
+    Called by the storage code; does nothing outside instrumented calls.
+    
+    Args:
+        nbytes (int): Number of bytes read
+    """
+    frames = getattr(_local, 'frames', None)
+    if frames:
+        metrics = frames[0].metrics
+        with metrics.lock:
+            metrics.bytes_read += nbytes
+            for stats in frames:
+                stats.bytes_read += nbytes
+
+
+def count_written(nbytes):
+    """
+    Count bytes written to disk for the operations running on this thread.
+    
+    Called by the storage code; does nothing outside instrumented calls.
+    
+    Args:
+        nbytes (int): Number of bytes written
+    """
+    frames = getattr(_local, 'frames', None)
+    if frames:
+        metrics = frames[0].metrics
+        with metrics.lock:
+            metrics.bytes_written += nbytes
+            for stats in frames:
+                stats.bytes_written += nbytes
+
+
+@contextmanager
+def capture(profile_path=None, memory=False, metrics=None, top=10):
+    """
+    Profile the code run in a with block.
+    
+    Args:
+        profile_path (str, optional): Write the cProfile statistics to this
+            file (view them with ``python -m pstats PATH``). Defaults to None.
+        memory (bool, optional): Trace memory allocations with tracemalloc.
+            Slows allocations down considerably. Defaults to False.
+        metrics (Metrics, optional): Where to store the peak memory and the
+            top allocation sites. Defaults to None.
+        top (int, optional): Number of allocation sites to keep. Defaults to 10.
+    """
+    profiler = cProfile.Profile() if profile_path else None
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            sites = tracemalloc.take_snapshot().statistics("lineno")[:top]
+            tracemalloc.stop()
+            if metrics is not None:
+                metrics.memory = {
+                    'current_bytes': current,
+                    'peak_bytes': peak,
+                    'top': [
+                        {'location': f"{site.traceback[0].filename}:{site.traceback[0].lineno}",
+                         'size_bytes': site.size, 'count': site.count}
+                        for site in sites
+                    ],
+                }
+
+
+def _frames():
+    """
+    Get the stack of operations running on this thread.
+    
+    Returns:
+        list: OperationStats of the running operations, innermost last
+    """
+    try:
+        return _local.frames
+    except AttributeError:
+        _local.frames = []
+        return _local.frames
+
+
+def _wrap(obj, name, metrics):
+    """
+    Replace a method of one object with a timed wrapper, if it has the method.
+    
+    Args:
+        obj: The object
+        name (str): Method name
+        metrics (Metrics): Where to record the calls
+    """
+    method = getattr(obj, name, None)
+    if callable(method) and not hasattr(method, 'instrumented'):
+        setattr(obj, name, metrics.timed(f"{type(obj).__name__}.{name}", method))
+
+
+def _label(text):
+    """Escape a Prometheus label value."""
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    """Format a number for the Prometheus text format."""
+    return repr(float(value)) if isinstance(value, float) else str(value)
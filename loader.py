@@ -0,0 +1,224 @@
+"""
+Loader module for the Task Manager application.
+
+This module contains helpers for loading large task files: a streaming
+parser that reads a JSON object one entry at a time, and LazyTasks, a
+task dictionary that only turns entries into Task objects when they are
+used.
+"""
+
+import json
+import re
+import threading
+from collections.abc import MutableMapping
+from journal import apply_record
+from task import Task
+
+# Number of characters read from the file at a time
+CHUNK_SIZE = 1 << 16
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_json_object(f, chunk_size=CHUNK_SIZE):
+    """
+    Parse a JSON object from a file one key/value pair at a time.
+    
+    Only the current chunk and the value being decoded are held in memory,
+    instead of the whole file text plus the whole decoded object.
+    
+    Args:
+        f (file): Text file positioned at the start of a JSON object
+        chunk_size (int, optional): Characters to read at a time
+    
+    Yields:
+        tuple: (key, value) pairs in file order
+    
+    Raises:
+        json.JSONDecodeError: If the file is not a valid JSON object
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    
+    def read_more():
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk  # Drop what has been consumed
+        pos = 0
+        return True
+    
+    def peek():
+        # Skip whitespace and return the next character ('' at the end)
+        nonlocal pos
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return ""
+    
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            if end == len(buffer) and read_more():
+                continue  # A number may go on in the next chunk
+            pos = end
+            return value
+    
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", buffer, pos)
+        pos += 1
+    
+    expect("{")
+    if peek() == "}":
+        return
+    
+    while True:
+        if peek() != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes",
+                                       buffer, pos)
+        key = decode()
+        expect(":")
+        peek()
+        yield key, decode()
+        
+        char = peek()
+        if char == "}":
+            return
+        expect(",")
+
+
+class LazyTasks(MutableMapping):
+    """
+    A task dictionary that creates Task objects on first access.
+    
+    Nothing is read until the mapping is first used. Then the snapshot is
+    streamed into plain dictionaries and the journal is replayed, which
+    only builds Task objects for the tasks it touches. Every other entry
+    becomes a Task when it is looked up. Loading and creating Task objects
+    are safe to do from several threads at once.
+    
+    Attributes:
+        storage (FileStorage): The storage the tasks come from
+        on_load (callable): Called with every Task created from an entry
+    """
+    
+    def __init__(self, storage, on_load=None):
+        """
+        Initialize a new LazyTasks mapping.
+        
+        Args:
+            storage (FileStorage): The storage the tasks come from
+            on_load (callable, optional): Called with every Task created from an entry
+        """
+        self.storage = storage
+        self.on_load = on_load
+        self._entries = None  # Task ID -> Task, or the task's dictionary until first use
+        self._ready = False  # True once the journal has been replayed as well
+        self._lock = threading.RLock()  # Guards loading and Task creation
+    
+    @property
+    def loaded(self):
+        """bool: True once the snapshot has been read."""
+        return self._ready
+    
+    def hydrated_count(self):
+        """
+        Count the entries that have been turned into Task objects.
+        
+        Returns:
+            int: Number of Task objects created so far
+        """
+        entries = self._load()
+        return sum(1 for value in entries.values() if type(value) is not dict)
+    
+    def __getitem__(self, task_id):
+        entries = self._load()
+        value = entries[task_id]
+        if type(value) is dict:
+            with self._lock:
+                value = entries[task_id]
+                if type(value) is dict:  # Not created by another thread meanwhile
+                    value = Task.from_dict(value)
+                    entries[task_id] = value
+                    if self.on_load is not None:
+                        self.on_load(value)
+        return value
+    
+    def __setitem__(self, task_id, task):
+        self._load()[task_id] = task
+        if self.on_load is not None:
+            self.on_load(task)
+    
+    def __delitem__(self, task_id):
+        del self._load()[task_id]
+    
+    def __contains__(self, task_id):
+        return task_id in self._load()
+    
+    def __iter__(self):
+        return iter(self._load())
+    
+    def __len__(self):
+        return len(self._load())
+    
+    def copy(self):
+        """
+        Make a shallow copy that shares the entries but not the mapping.
+        
+        Returns:
+            LazyTasks: The copy, already loaded
+        """
+        tasks = LazyTasks(self.storage)
+        tasks._entries = dict(self._load())
+        tasks._ready = True
+        return tasks
+    
+    def iter_dicts(self):
+        """
+        Iterate over the tasks in to_dict() form without creating Task objects.
+        
+        Yields:
+            tuple: (task ID, task dictionary) pairs
+        """
+        for task_id, value in self._load().items():
+            yield task_id, value if type(value) is dict else value.to_dict()
+    
+    def raw_items(self):
+        """
+        Iterate over the tasks without creating Task objects.
+        
+        Returns:
+            iterator: (task ID, Task, or task dictionary if the task has not
+                been used yet) pairs
+        """
+        return iter(self._load().items())
+    
+    def _load(self):
+        """
+        Read the snapshot and replay the journal on first use.
+        
+        Returns:
+            dict: Task ID -> Task or task dictionary
+        """
+        if not self._ready:
+            with self._lock:
+                if self._entries is None:
+                    self._entries, records = self.storage.load_entries()
+                    for record in records:
+                        apply_record(self, record)
+                    self._ready = True
+        return self._entries
@@ -6,14 +6,19 @@ This module serves as the entry point for the Task Manager application.
 It handles the command-line interface and user interaction.
 
 Usage:
-    python main.py
+    python main.py                  (interactive menu)
+    python main.py COMMAND [...]    (scriptable subcommands, see cli.py)
 """
 
-import os
 import sys
+from datetime import datetime
+import cli
 from task_manager import TaskManager
 from utils import clear_screen, print_colored
 
+# Number of tasks shown per page when viewing all tasks
+PAGE_SIZE = 20
+
 
 def display_menu():
     """Display the main menu options."""
@@ -40,13 +45,87 @@ def display_category_menu():
     print("===============================")
 
 
+def print_tasks(tasks):
+    """
+    Print a list of tasks.
+    
+    The clock is read once for the whole list, so every task is checked
+    for being overdue against the same time.
+    
+    Args:
+        tasks (list): The Task objects to print
+    """
+    now = datetime.now()
+    for task in tasks:
+        print(task.render(now))
+
+
+def view_all_tasks(task_manager, page_size=PAGE_SIZE):
+    """
+    Show all tasks one page at a time.
+    
+    Only the tasks of the current page are fetched, so the first page shows
+    up right away however many tasks there are.
+    
+    Args:
+        task_manager (TaskManager): The task manager to list
+        page_size (int, optional): Number of tasks per page. Defaults to PAGE_SIZE.
+    """
+    total = len(task_manager.tasks)
+    if not total:
+        print_colored("\nNo tasks found!", "yellow")
+        return
+    
+    pages = (total + page_size - 1) // page_size
+    page = 0
+    while True:
+        tasks = list(task_manager.iter_tasks(offset=page * page_size, limit=page_size))
+        print(f"\n=== All Tasks (page {page + 1} of {pages}) ===")
+        print_tasks(tasks)
+        if pages == 1:
+            return
+        
+        command = input("\n[Enter] next page, [p] previous page, [q] stop: ").strip().lower()
+        if command == 'q':
+            return
+        elif command == 'p':
+            page = max(page - 1, 0)
+        elif page + 1 < pages:
+            page += 1
+        else:
+            return
+
+
+def read_task_id(task_manager, prompt):
+    """
+    Ask for a task ID. A unique prefix of the ID is enough.
+    
+    Args:
+        task_manager (TaskManager): The task manager holding the tasks
+        prompt (str): The input prompt
+    
+    Returns:
+        str: The full task ID, or None (after printing why) if the input
+            matches no task or several tasks
+    """
+    try:
+        return task_manager.resolve_id(input(prompt).strip())
+    except KeyError:
+        print_colored("\nTask not found!", "red")
+    except ValueError as e:
+        print_colored(f"\n{e}. Type more of the ID.", "yellow")
+    return None
+
+
 def main():
     """Main function to run the application."""
-    # Initialize the task manager
-    task_manager = TaskManager()
+    # Initialize the task manager. Changes are written by a background
+    # thread so the menu never waits for the disk.
+    task_manager = TaskManager(write_behind=True)
     
-    # Load any existing tasks from storage
-    task_manager.load_tasks()
+    # Load any existing tasks from storage. Tasks are read when first
+    # needed, so the menu shows up right away even for large files.
+    task_manager.load_tasks(mode="lazy")
     
     while True:
         clear_screen()
@@ -87,14 +166,8 @@ def main():
             print_colored(f"\nTask added successfully with ID: {task_id}", "green")
         
         elif choice == '2':
-            # View all tasks
-            tasks = task_manager.get_all_tasks()
-            if tasks:
-                print("\n=== All Tasks ===")
-                for task in tasks:
-                    print(task)
-            else:
-                print_colored("\nNo tasks found!", "yellow")
+            # View all tasks, one page at a time
+            view_all_tasks(task_manager)
         
         elif choice == '3':
             # View tasks by priority
@@ -111,26 +184,21 @@ def main():
             tasks = task_manager.get_tasks_by_priority(priority)
             if tasks:
                 print(f"\n=== Priority {priority} Tasks ===")
-                for task in tasks:
-                    print(task)
+                print_tasks(tasks)
             else:
                 print_colored(f"\nNo tasks with priority {priority} found!", "yellow")
         
         elif choice == '4':
             # Mark task as completed
-            task_id = input("Enter task ID to mark as completed: ")
-            if task_manager.mark_task_completed(task_id):
+            task_id = read_task_id(task_manager, "Enter task ID to mark as completed: ")
+            if task_id is not None and task_manager.mark_task_completed(task_id):
                 print_colored("\nTask marked as completed!", "green")
-            else:
-                print_colored("\nTask not found!", "red")
         
         elif choice == '5':
             # Delete a task
-            task_id = input("Enter task ID to delete: ")
-            if task_manager.delete_task(task_id):
+            task_id = read_task_id(task_manager, "Enter task ID to delete: ")
+            if task_id is not None and task_manager.delete_task(task_id):
                 print_colored("\nTask deleted successfully!", "green")
-            else:
-                print_colored("\nTask not found!", "red")
         
         elif choice == '6':
             # Search tasks
@@ -139,8 +207,7 @@ def main():
             
             if results:
                 print(f"\n=== Search Results for '{query}' ===")
-                for task in results:
-                    print(task)
+                print_tasks(results)
             else:
                 print_colored(f"\nNo tasks found matching '{query}'", "yellow")
         
@@ -163,8 +230,8 @@ def main():
                 
                 elif category_choice == '2':
                     # Add category to a task
-                    task_id = input("Enter task ID: ")
-                    task = task_manager.get_task(task_id)
+                    task_id = read_task_id(task_manager, "Enter task ID: ")
+                    task = task_manager.get_task(task_id) if task_id is not None else None
                     
                     if task:
                         print(f"\nCurrent task: {task}")
@@ -174,13 +241,13 @@ def main():
                             print_colored(f"\nCategory '{category}' added to task!", "green")
                         else:
                             print_colored(f"\nCategory '{category}' already exists or is invalid!", "yellow")
-                    else:
+                    elif task_id is not None:
                         print_colored("\nTask not found!", "red")
                 
                 elif category_choice == '3':
                     # Remove category from a task
-                    task_id = input("Enter task ID: ")
-                    task = task_manager.get_task(task_id)
+                    task_id = read_task_id(task_manager, "Enter task ID: ")
+                    task = task_manager.get_task(task_id) if task_id is not None else None
                     
                     if task:
                         print(f"\nCurrent task: {task}")
@@ -198,7 +265,7 @@ def main():
                                 print_colored(f"\nCategory '{category}' removed from task!", "green")
                             else:
                                 print_colored(f"\nCategory '{category}' not found!", "yellow")
-                    else:
+                    elif task_id is not None:
                         print_colored("\nTask not found!", "red")
                 
                 elif category_choice == '4':
@@ -229,8 +296,7 @@ def main():
                         
                         if tasks:
                             print(f"\n=== Tasks in Category '{selected_category}' ===")
-                            for task in tasks:
-                                print(task)
+                            print_tasks(tasks)
                         else:
                             print_colored(f"\nNo tasks found in category '{selected_category}'!", "yellow")
                     else:
@@ -252,11 +318,13 @@ def main():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli.run(sys.argv[1:]))
+    
     try:
         main()
     except KeyboardInterrupt:
         print("\nApplication terminated by user. Saving data...")
-        # This is a bit of a hack - we create a new manager just to save tasks
-        # In a more robust application, we'd handle this differently
-        TaskManager().save_tasks()
+        # Every change is already journaled or queued in the write-behind
+        # thread, which writes what is left when the interpreter exits
         sys.exit(0) 
\ No newline at end of file
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped snapshot module for the Task Manager application.
+
+This module defines a read-only snapshot file with a fixed layout that is
+used through mmap instead of being read and parsed. Opening one only
+reads its header; a task is found by a binary search over a sorted
+offset table and its fields are decoded from the mapping when they are
+first read. Processes that open the same snapshot share its pages
+through the OS page cache, so the time to open a store and the memory a
+reader holds hardly depend on the number of tasks.
+
+Layout (all integers little-endian, offsets from the start of the file):
+    
+    header      magic b"TMMAPSNP", version (u32), task count (u32),
+                category count (u32), then the offsets (u64 each) of the
+                record table, the ID index, the category table and the
+                string data; padded to 64 bytes
+    records     one 64-byte record per task, in storage order:
+                id, title, description (each offset (u64) + length (u32)
+                of UTF-8 bytes in the string data), priority (i8),
+                completed (u8), created_at (i64), due_date (i64,
+                NO_DUE_DATE if unset), offset (u64) of the task's category
+                indexes (u32 each) in the string data, category count (u16)
+    ID index    record numbers (u32 each), sorted by the UTF-8 bytes of
+                the task IDs
+    categories  one offset (u64) + length (u32) per distinct category
+    strings     UTF-8 bytes and category index lists
+
+Timestamps are microseconds since 1970-01-01 (see task.to_timestamp).
+
+A snapshot is never changed in place: writers build a new file and
+replace the old one, so readers keep the mapping they opened until they
+load the tasks again.
+
+Usage:
+    python mmap_snapshot.py build tasks.json tasks.tmm
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections.abc import ItemsView, Mapping, ValuesView
+from binary_format import NO_DUE_DATE, SnapshotFormatError, is_binary_snapshot
+from storage import FileStorage, TaskStorage
+from task import Task
+
+MAGIC = b"TMMAPSNP"
+VERSION = 1
+
+# File name suffix the command-line interface opens as a mapped snapshot
+SUFFIX = ".tmm"
+
+HEADER = struct.Struct("<8sIIIQQQQ12x")
+RECORD = struct.Struct("<QIQIQIbBqqQH")
+INDEX_ENTRY = struct.Struct("<I")
+STRING_REF = struct.Struct("<QI")
+
+
+def write_snapshot(tasks, path):
+    """
+    Write tasks to a mapped snapshot file.
+    
+    The file is written next to the destination and moved into place, so
+    readers never see a partly written snapshot.
+    
+    Args:
+        tasks (dict): Task ID -> Task, in storage order
+        path (str): Destination file path
+    """
+    data = bytearray()
+    
+    def add_string(value):
+        encoded = value.encode('utf-8')
+        offset = len(data)
+        data.extend(encoded)
+        return offset, len(encoded)
+    
+    categories = {}  # Category -> number in the category table
+    records = []
+    id_keys = []
+    for task in tasks.values():
+        id_ref = add_string(task.id)
+        title_ref = add_string(task.title)
+        description_ref = add_string(task.description)
+        indexes = [categories.setdefault(c, len(categories)) for c in task.categories]
+        indexes_offset = len(data)
+        data.extend(struct.pack(f"<{len(indexes)}I", *indexes))
+        due_ts = task.due_timestamp
+        records.append(RECORD.pack(
+            *id_ref, *title_ref, *description_ref, task.priority, task.completed,
+            task.created_timestamp, NO_DUE_DATE if due_ts is None else due_ts,
+            indexes_offset, len(indexes),
+        ))
+        id_keys.append(task.id.encode('utf-8'))
+    
+    category_refs = [STRING_REF.pack(*add_string(category)) for category in categories]
+    order = sorted(range(len(records)), key=id_keys.__getitem__)
+    
+    records_offset = HEADER.size
+    index_offset = records_offset + RECORD.size * len(records)
+    categories_offset = index_offset + INDEX_ENTRY.size * len(records)
+    data_offset = categories_offset + STRING_REF.size * len(category_refs)
+    header = HEADER.pack(MAGIC, VERSION, len(records), len(category_refs), records_offset,
+                         index_offset, categories_offset, data_offset)
+    
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmm-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(b"".join(records))
+            f.write(struct.pack(f"<{len(order)}I", *order))
+            f.write(b"".join(category_refs))
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def is_mapped_snapshot(path):
+    """
+    Check whether a file starts with the mapped snapshot magic.
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        bool: True if the file looks like a mapped snapshot, False if it
+            does not or cannot be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class MappedSnapshot:
+    """
+    An open mapped snapshot file.
+    
+    Attributes:
+        path (str): Path of the snapshot file
+    """
+    
+    def __init__(self, path):
+        """
+        Map a snapshot file into memory.
+        
+        Args:
+            path (str): Path of the snapshot file
+        
+        Raises:
+            SnapshotFormatError: If the file is not a valid snapshot
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise SnapshotFormatError("Not a mapped task snapshot")
+            # The mapping stays valid after the file is closed
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        (magic, version, self._count, self._category_count, self._records_offset,
+         self._index_offset, self._categories_offset, self._data_offset) = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotFormatError("Not a mapped task snapshot")
+        if version != VERSION:
+            self.close()
+            raise SnapshotFormatError(f"Unsupported snapshot version {version}")
+        if self._data_offset > size:
+            self.close()
+            raise SnapshotFormatError("Truncated mapped task snapshot")
+        
+        self._categories = {}  # Category number -> interned string, filled on use
+    
+    def __len__(self):
+        """Return the number of tasks."""
+        return self._count
+    
+    def close(self):
+        """Unmap the file. Tasks read from the snapshot can no longer decode fields."""
+        self._map.close()
+    
+    def record(self, position):
+        """
+        Read the fixed-size record of a task.
+        
+        Args:
+            position (int): Record number, in storage order
+        
+        Returns:
+            tuple: The RECORD fields
+        """
+        return RECORD.unpack_from(self._map, self._records_offset + position * RECORD.size)
+    
+    def string(self, offset, length):
+        """
+        Decode a string from the string data.
+        
+        Args:
+            offset (int): Offset in the string data
+            length (int): Length in bytes
+        
+        Returns:
+            str: The decoded string
+        """
+        start = self._data_offset + offset
+        return self._map[start:start + length].decode('utf-8')
+    
+    def task_id(self, position):
+        """
+        Decode the ID of a task.
+        
+        Args:
+            position (int): Record number
+        
+        Returns:
+            str: The task ID
+        """
+        offset, length = struct.unpack_from("<QI", self._map,
+                                            self._records_offset + position * RECORD.size)
+        return self.string(offset, length)
+    
+    def categories(self, offset, count):
+        """
+        Decode the categories of a task.
+        
+        Args:
+            offset (int): Offset of the category indexes in the string data
+            count (int): Number of categories
+        
+        Returns:
+            list: The category strings
+        """
+        indexes = struct.unpack_from(f"<{count}I", self._map, self._data_offset + offset)
+        names = self._categories
+        result = []
+        for index in indexes:
+            name = names.get(index)
+            if name is None:
+                ref = STRING_REF.unpack_from(self._map,
+                                             self._categories_offset + index * STRING_REF.size)
+                name = names[index] = sys.intern(self.string(*ref))
+            result.append(name)
+        return result
+    
+    def find(self, task_id):
+        """
+        Look up the record number of a task by binary search over the ID index.
+        
+        Args:
+            task_id (str): The task ID
+        
+        Returns:
+            int: The record number, or None if there is no such task
+        """
+        key = task_id.encode('utf-8')
+        mapping = self._map
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            (position,) = INDEX_ENTRY.unpack_from(mapping,
+                                                  self._index_offset + middle * INDEX_ENTRY.size)
+            offset, length = struct.unpack_from("<QI", mapping,
+                                                self._records_offset + position * RECORD.size)
+            start = self._data_offset + offset
+            current = mapping[start:start + length]
+            if current == key:
+                return position
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+    
+    def task(self, position):
+        """
+        Get a read-only task backed by a record.
+        
+        Args:
+            position (int): Record number
+        
+        Returns:
+            MappedTask: The task
+        """
+        task = MappedTask.__new__(MappedTask)
+        object.__setattr__(task, '_snapshot', self)
+        object.__setattr__(task, '_position', position)
+        object.__setattr__(task, '_listener', None)
+        object.__setattr__(task, '_revision', 0)
+        return task
+
+
+class MappedTask(Task):
+    """
+    A read-only task whose fields are decoded from a mapped snapshot on first use.
+    
+    Every field slot starts out empty. Reading an empty slot falls back to
+    __getattr__, which decodes the field from the record and fills the
+    slot, so the Task methods work unchanged and each field is decoded at
+    most once. The title and the description are decoded on their own,
+    the other fields all at once. Use copy() to get a Task that can be
+    changed.
+    """
+    
+    __slots__ = ('_snapshot', '_position')
+    
+    def __getattr__(self, name):
+        """
+        Decode a field that has not been read yet.
+        
+        Args:
+            name (str): Name of the missing attribute
+        
+        Returns:
+            The decoded value
+        """
+        if name not in _FIELDS:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        
+        snapshot = self._snapshot
+        (id_offset, id_length, title_offset, title_length, description_offset,
+         description_length, priority, completed, created_ts, due_ts, categories_offset,
+         category_count) = snapshot.record(self._position)
+        if name == '_title':
+            value = snapshot.string(title_offset, title_length)
+        elif name == '_description':
+            value = snapshot.string(description_offset, description_length)
+        else:
+            # Indexing reads every short field of a task, so they are all
+            # decoded together from one read of the record
+            object.__setattr__(self, 'id', snapshot.string(id_offset, id_length))
+            object.__setattr__(self, '_priority', priority)
+            object.__setattr__(self, '_completed', bool(completed))
+            object.__setattr__(self, '_created_ts', created_ts)
+            object.__setattr__(self, '_due_ts', None if due_ts == NO_DUE_DATE else due_ts)
+            object.__setattr__(self, '_categories',
+                               snapshot.categories(categories_offset, category_count))
+            return object.__getattribute__(self, name)
+        
+        object.__setattr__(self, name, value)
+        return value
+    
+    def __setattr__(self, name, value):
+        """Refuse every change: the snapshot is read-only."""
+        raise AttributeError(f"Tasks of a mapped snapshot are read-only (cannot set {name!r})")
+
+
+# Slots decoded by MappedTask.__getattr__
+_FIELDS = frozenset({'id', '_title', '_description', '_priority', '_completed', '_created_ts',
+                     '_due_ts', '_categories'})
+
+
+class MappedTasks(Mapping):
+    """
+    Read-only task dictionary over a mapped snapshot.
+    
+    Lookups search the ID index, iteration follows storage order. Every
+    access returns a new MappedTask; nothing is cached, so the memory held
+    by a reader only grows with the tasks it keeps references to.
+    
+    Attributes:
+        snapshot (MappedSnapshot): The mapped file
+    """
+    
+    def __init__(self, snapshot):
+        """
+        Initialize a new MappedTasks.
+        
+        Args:
+            snapshot (MappedSnapshot): The mapped file
+        """
+        self.snapshot = snapshot
+    
+    def __getitem__(self, task_id):
+        """Return the task with the given ID."""
+        position = self.snapshot.find(task_id)
+        if position is None:
+            raise KeyError(task_id)
+        return self.snapshot.task(position)
+    
+    def __contains__(self, task_id):
+        """Check whether a task ID is in the snapshot."""
+        return self.snapshot.find(task_id) is not None
+    
+    def __iter__(self):
+        """Iterate over the task IDs in storage order."""
+        snapshot = self.snapshot
+        return (snapshot.task_id(position) for position in range(len(snapshot)))
+    
+    def __len__(self):
+        """Return the number of tasks."""
+        return len(self.snapshot)
+    
+    def values(self):
+        """Return a view of the tasks that reads the records in order."""
+        return _MappedValues(self)
+    
+    def items(self):
+        """Return a view of the (ID, task) pairs that reads the records in order."""
+        return _MappedItems(self)
+
+
+class _MappedValues(ValuesView):
+    """Values view of MappedTasks that skips the ID lookups."""
+    
+    def __iter__(self):
+        snapshot = self._mapping.snapshot
+        return (snapshot.task(position) for position in range(len(snapshot)))
+
+
+class _MappedItems(ItemsView):
+    """Items view of MappedTasks that skips the ID lookups."""
+    
+    def __iter__(self):
+        snapshot = self._mapping.snapshot
+        for position in range(len(snapshot)):
+            task = snapshot.task(position)
+            yield task.id, task
+
+
+class MappedStorage(TaskStorage):
+    """
+    Read-only storage backend over a mapped snapshot file.
+    
+    A TaskManager on this backend refuses every mutation (see
+    TaskManager.read_only). Loading the tasks again maps the file as it is
+    then, e.g. after a writer replaced it with write_snapshot.
+    
+    Attributes:
+        path (str): Path of the snapshot file
+        snapshot (MappedSnapshot): The mapped file, None until loaded
+    """
+    
+    read_only = True
+    
+    def __init__(self, path):
+        """
+        Initialize a new MappedStorage.
+        
+        Args:
+            path (str): Path of the snapshot file
+        """
+        self.path = path
+        self.snapshot = None
+    
+    def load(self, mode="eager"):
+        """
+        Map the snapshot file.
+        
+        Args:
+            mode (str, optional): Ignored, fields are always decoded on use
+        
+        Returns:
+            MappedTasks: Task ID -> read-only Task
+        """
+        snapshot = MappedSnapshot(self.path)
+        # The previous mapping stays open: tasks read from it may still be in use
+        self.snapshot = snapshot
+        return MappedTasks(snapshot)
+    
+    def _refuse(self, *args):
+        raise PermissionError(f"{self.path} is a read-only mapped snapshot")
+    
+    save = write = begin = commit = rollback = _refuse
+    
+    def close(self):
+        """Unmap the snapshot file."""
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+
+def build_snapshot(source_path, snapshot_path):
+    """
+    Build a mapped snapshot from a task file.
+    
+    The task file is read like TaskManager reads it, journal included, in
+    either snapshot format.
+    
+    Args:
+        source_path (str): Source task file (JSON or binary)
+        snapshot_path (str): Destination snapshot file
+    
+    Returns:
+        int: Number of tasks written
+    """
+    binary = os.path.exists(source_path) and is_binary_snapshot(source_path)
+    storage = FileStorage(source_path, snapshot_format="binary" if binary else "json")
+    try:
+        tasks = storage.load()
+    finally:
+        storage.close()
+    write_snapshot(tasks, snapshot_path)
+    return len(tasks)
+
+
+def main(argv=None):
+    """Run the snapshot builder from the command line."""
+    parser = argparse.ArgumentParser(description="Build a memory-mapped task snapshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    build = subparsers.add_parser("build", help="build a snapshot from a task file")
+    build.add_argument("source", help="task file (JSON or binary, with its journal)")
+    build.add_argument("destination", help=f"snapshot file to write (e.g. tasks{SUFFIX})")
+    
+    args = parser.parse_args(argv)
+    count = build_snapshot(args.source, args.destination)
+    print(f"Wrote {count} tasks to {args.destination}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
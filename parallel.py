@@ -0,0 +1,262 @@
+"""
+Parallel scan module for the Task Manager application.
+
+This module runs full scans of the tasks (substring searches and query
+filters that no index can answer) on several worker processes at once,
+so that they use more than one core. The tasks are split into shards,
+one per worker: every shard has its own single-process pool, which
+receives copies of its tasks once, when it starts, and keeps them. After
+that only the tasks changed since the last scan are sent along with the
+next one. Every task has a sequence number in storage order, so the
+matches of the shards merge back into the order of a serial scan.
+
+Stores smaller than a threshold are scanned serially, as sending the
+query and the results between processes costs more than the scan saves.
+"""
+
+import heapq
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+# Default number of tasks below which scans stay in the calling process
+SERIAL_THRESHOLD = 20_000
+
+# The shard held by a worker process: sequence number -> Task copy, in
+# sequence order
+_shard = {}
+
+
+def _load_shard(items):
+    """
+    Fill the shard of a new worker process.
+    
+    Args:
+        items (list): (sequence number, Task) pairs in sequence order
+    """
+    _shard.clear()
+    _shard.update(items)
+
+
+def _update_shard(upserts, deletes):
+    """
+    Apply changes to the shard of a worker process.
+    
+    A new task always has a higher sequence number than every task in the
+    shard, so inserting it keeps the shard in sequence order.
+    
+    Args:
+        upserts (list): (sequence number, Task) pairs to add or replace
+        deletes (list): Sequence numbers to remove
+    """
+    for sequence in deletes:
+        _shard.pop(sequence, None)
+    for sequence, task in upserts:
+        _shard[sequence] = task
+
+
+def _scan_shard(predicate, limit):
+    """
+    Find the tasks of the shard that match a predicate.
+    
+    Args:
+        predicate (query.Predicate): The predicate to test
+        limit (int): Stop after this many matches, or None
+    
+    Returns:
+        list: Sequence numbers of the matches, in order
+    """
+    matches = []
+    for sequence, task in _shard.items():
+        if predicate.matches(task):
+            matches.append(sequence)
+            if limit is not None and len(matches) >= limit:
+                break
+    return matches
+
+
+class ParallelScanner:
+    """
+    Runs predicates over the tasks of a TaskManager on worker processes.
+    
+    The workers are started on the first scan. The manager reports every
+    added, changed and removed task (see ``touch`` and ``discard``); the
+    changes are sent to the workers before the next scan.
+    
+    Attributes:
+        workers (int): Number of worker processes (and shards)
+        threshold (int): Stores with fewer tasks should be scanned serially
+    """
+    
+    def __init__(self, workers=None, threshold=SERIAL_THRESHOLD):
+        """
+        Initialize a new ParallelScanner.
+        
+        Args:
+            workers (int, optional): Number of worker processes. Defaults to
+                the number of CPUs.
+            threshold (int, optional): Number of tasks below which scans
+                should stay serial. Defaults to SERIAL_THRESHOLD.
+        
+        Raises:
+            ValueError: If workers is less than 1
+        """
+        workers = workers or os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("A parallel scan needs at least one worker")
+        self.workers = workers
+        self.threshold = threshold
+        self._executors = None  # One single-process pool per shard, None until started
+        self._positions = {}  # Task ID -> (sequence number, shard)
+        self._ids = []  # Sequence number -> task ID (None once removed)
+        self._pending = {}  # IDs of the tasks changed since the last scan, in order
+        self._pending_deletes = []  # Positions of the tasks removed since the last scan
+        self._lock = threading.Lock()
+    
+    def should_scan(self, count):
+        """
+        Check whether a store is large enough to be scanned in parallel.
+        
+        Args:
+            count (int): Number of tasks in the store
+        
+        Returns:
+            bool: True if count reaches the threshold
+        """
+        return count >= self.threshold
+    
+    def touch(self, task_id):
+        """
+        Note that a task was added or changed.
+        
+        Args:
+            task_id (str): The ID of the task
+        """
+        if self._executors is not None:
+            self._pending[task_id] = None
+    
+    def discard(self, task_id):
+        """
+        Note that a task was removed. Added again, it moves to the end.
+        
+        Args:
+            task_id (str): The ID of the task
+        """
+        if self._executors is None:
+            return
+        # Added again, the task must be queued after the tasks added before it
+        self._pending.pop(task_id, None)
+        position = self._positions.pop(task_id, None)
+        if position is not None:
+            self._ids[position[0]] = None
+            self._pending_deletes.append(position)
+    
+    def scan(self, tasks, predicate, limit=None):
+        """
+        Find the tasks matching a predicate.
+        
+        Args:
+            tasks (dict): Task ID -> Task, the tasks of the manager
+            predicate (query.Predicate): The predicate to test; it is sent
+                to the workers, so it must be picklable
+            limit (int, optional): Return at most this many IDs. Defaults to None.
+        
+        Returns:
+            list: IDs of the matching tasks, in storage order
+        """
+        try:
+            with self._lock:
+                if self._executors is None:
+                    self._start(tasks)
+                    updates = []
+                else:
+                    updates = self._flush(tasks)
+                futures = [executor.submit(_scan_shard, predicate, limit)
+                           for executor in self._executors]
+            
+            for future in updates:
+                future.result()  # Raise if a shard could not be updated
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            self.close()  # A worker died; start over on the next scan
+            raise
+        
+        # Only numbers travel back, which is much cheaper than the IDs
+        ids = self._ids
+        return [ids[sequence] for sequence in islice(heapq.merge(*results), limit)]
+    
+    def _start(self, tasks):
+        """
+        Split the tasks into shards and start a worker for each.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        """
+        shards = [[] for _ in range(self.workers)]
+        self._positions = {}
+        self._ids = []
+        for sequence, task in enumerate(tasks.values()):
+            shard = sequence % self.workers
+            self._positions[task.id] = (sequence, shard)
+            self._ids.append(task.id)
+            shards[shard].append((sequence, task.copy()))
+        self._pending = {}
+        self._pending_deletes = []
+        
+        # The copies are handed over once, when each worker starts
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, initializer=_load_shard, initargs=(items,))
+            for items in shards
+        ]
+    
+    def _flush(self, tasks):
+        """
+        Send the changes since the last scan to the workers.
+        
+        Each pool has a single worker that runs its calls in order, so a
+        scan submitted after an update sees it.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        
+        Returns:
+            list: Futures of the shard updates
+        """
+        if not self._pending and not self._pending_deletes:
+            return []
+        
+        upserts = [[] for _ in range(self.workers)]
+        deletes = [[] for _ in range(self.workers)]
+        for sequence, shard in self._pending_deletes:
+            deletes[shard].append(sequence)
+        
+        for task_id in self._pending:
+            task = tasks.get(task_id)
+            if task is None:
+                continue  # Removed again, or an ID that was never stored
+            position = self._positions.get(task_id)
+            if position is None:
+                sequence = len(self._ids)
+                position = self._positions[task_id] = (sequence, sequence % self.workers)
+                self._ids.append(task_id)
+            upserts[position[1]].append((position[0], task.copy()))
+        
+        self._pending = {}
+        self._pending_deletes = []
+        return [
+            executor.submit(_update_shard, upserts[shard], deletes[shard])
+            for shard, executor in enumerate(self._executors)
+            if upserts[shard] or deletes[shard]
+        ]
+    
+    def close(self):
+        """Stop the workers. The next scan starts them again from the current tasks."""
+        executors, self._executors = self._executors, None
+        for executor in executors or ():
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._positions = {}
+        self._ids = []
+        self._pending = {}
+        self._pending_deletes = []
@@ -0,0 +1,691 @@
+"""
+Query module for the Task Manager application.
+
+This module defines composable task predicates (combined with ``&``,
+``|`` and ``~``) and the Query class that evaluates them. A small
+planner answers each query from the most selective secondary index
+instead of scanning every task, and ``Query.explain`` shows the plan it
+picked.
+
+Example:
+    from query import Category, Completed, Priority, Text
+    
+    query = (task_manager.query(Priority(1, 2) & Category("work") & ~Completed())
+             .order_by("due_date").limit(10))
+    print(query.explain())
+    for task in query:
+        print(task)
+"""
+
+import heapq
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from task import ONE_MICROSECOND, Task, to_timestamp
+
+# Sort keys accepted by Query.order_by. "status" is the listing order of
+# TaskManager.get_all_tasks; tasks without a due date sort last.
+SORT_KEYS = {
+    'status': lambda task: (task.completed, task.priority),
+    'priority': lambda task: task.priority,
+    'due_date': lambda task: (task.due_timestamp is None, task.due_timestamp or 0),
+    'created_at': lambda task: task.created_timestamp,
+    'title': lambda task: task.title.lower(),
+}
+
+
+def due_bounds(start, end):
+    """
+    Convert an inclusive due date range to a half-open one.
+    
+    Args:
+        start (datetime or str): Start of the range, inclusive, or None. A
+            string is a date in YYYY-MM-DD format.
+        end (datetime or str): End of the range, inclusive, or None. A string
+            is a date in YYYY-MM-DD format and includes that whole day.
+    
+    Returns:
+        tuple: (start, before) datetimes, either of which may be None
+    
+    Raises:
+        ValueError: If a date string is not in YYYY-MM-DD format
+    """
+    if isinstance(start, str):
+        start = datetime.strptime(start, "%Y-%m-%d")
+    if isinstance(end, str):
+        before = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+    else:
+        before = None if end is None else end + ONE_MICROSECOND
+    return start, before
+
+
+def filters(priority=None, category=None, completed=None, due_start=None, due_end=None,
+            text=None):
+    """
+    Combine the common filters into one predicate.
+    
+    Args:
+        priority (int, optional): Only tasks with this priority
+        category (str, optional): Only tasks with this category
+        completed (bool, optional): Only completed (True) or open (False) tasks
+        due_start (datetime or str, optional): Only open tasks due on or after this date
+        due_end (datetime or str, optional): Only open tasks due on or before this date
+        text (str, optional): Only tasks containing this text
+    
+    Returns:
+        Predicate: The filters combined with AND, or None if none is given
+    
+    Raises:
+        ValueError: If a date string is not in YYYY-MM-DD format
+    """
+    predicates = []
+    if priority is not None:
+        predicates.append(Priority(priority))
+    if category is not None:
+        predicates.append(Category(category))
+    if completed is not None:
+        predicates.append(Completed(completed))
+    if due_start is not None or due_end is not None:
+        predicates.append(DueBetween(due_start, due_end))
+    if text is not None:
+        predicates.append(Text(text))
+    
+    if not predicates:
+        return None
+    return predicates[0] if len(predicates) == 1 else And(*predicates)
+
+
+class Access:
+    """
+    A way of finding candidate tasks without scanning all of them.
+    
+    Attributes:
+        description (str): What the access reads, for explain()
+        estimate (int): Upper bound on the number of IDs it produces
+        ids (callable): Returns an iterator over the candidate task IDs
+        order (str): Sort key the IDs are already ordered by, or None
+        children (list): Accesses combined by this one, for explain()
+    """
+    
+    def __init__(self, description, estimate, ids, order=None, children=()):
+        """
+        Initialize a new Access.
+        
+        Args:
+            description (str): What the access reads
+            estimate (int): Upper bound on the number of IDs it produces
+            ids (callable): Returns an iterator over the candidate task IDs
+            order (str, optional): Sort key the IDs are ordered by. Defaults to None.
+            children (list, optional): Combined accesses. Defaults to none.
+        """
+        self.description = description
+        self.estimate = estimate
+        self.ids = ids
+        self.order = order
+        self.children = list(children)
+    
+    def explain(self, depth):
+        """
+        Describe the access and its children.
+        
+        Args:
+            depth (int): Indentation level
+        
+        Returns:
+            list: Lines of the description
+        """
+        lines = ["  " * depth + f"{self.description} (est. {self.estimate} tasks)"]
+        for child in self.children:
+            lines.extend(child.explain(depth + 1))
+        return lines
+
+
+class Predicate:
+    """
+    Base class of the task predicates.
+    
+    Predicates are combined with ``&`` (And), ``|`` (Or) and ``~`` (Not).
+    Each one can test a single task, and the planner asks it for an index
+    access that narrows down the tasks to test.
+    """
+    
+    def __and__(self, other):
+        return And(self, other)
+    
+    def __or__(self, other):
+        return Or(self, other)
+    
+    def __invert__(self):
+        return Not(self)
+    
+    def matches(self, task):
+        """
+        Test a task.
+        
+        Args:
+            task (Task): The task to test
+        
+        Returns:
+            bool: True if the task satisfies the predicate
+        """
+        raise NotImplementedError
+    
+    def plan(self, manager):
+        """
+        Find the cheapest way to get the tasks matching the predicate.
+        
+        Args:
+            manager (TaskManager): The manager whose indexes may be used
+        
+        Returns:
+            tuple: (access, residual). access is an Access producing a
+                superset of the matching tasks, or None if every task must
+                be scanned; residual is the predicate those tasks must still
+                satisfy, or None if every one of them matches.
+        """
+        return None, self
+    
+    def __repr__(self):
+        return f"<{type(self).__name__} {self}>"
+
+
+class Priority(Predicate):
+    """Tasks with a priority in an inclusive range."""
+    
+    def __init__(self, low, high=None):
+        """
+        Initialize a new Priority predicate.
+        
+        Args:
+            low (int): Lowest priority level
+            high (int, optional): Highest priority level. Defaults to low.
+        """
+        self.low = low
+        self.high = low if high is None else high
+    
+    def matches(self, task):
+        return self.low <= task.priority <= self.high
+    
+    def plan(self, manager):
+        by_priority = manager.index.by_priority
+        levels = [by_priority[p] for p in sorted(by_priority) if self.low <= p <= self.high]
+        access = Access(f"Priority index scan: {self}", sum(len(ids) for ids in levels),
+                        lambda: chain.from_iterable(levels))
+        return access, None
+    
+    def __str__(self):
+        if self.low == self.high:
+            return f"priority = {self.low}"
+        return f"priority between {self.low} and {self.high}"
+
+
+class Category(Predicate):
+    """Tasks with a category."""
+    
+    def __init__(self, category):
+        """
+        Initialize a new Category predicate.
+        
+        Args:
+            category (str): Category name (case insensitive)
+        """
+        self.category = Task.normalize_category(category)
+    
+    def matches(self, task):
+        return self.category in task.categories
+    
+    def plan(self, manager):
+        ids = manager.index.ids_with_category(self.category)
+        return Access(f"Category index scan: {self}", len(ids), lambda: iter(ids)), None
+    
+    def __str__(self):
+        return f"category = {self.category!r}"
+
+
+class Completed(Predicate):
+    """Completed tasks, or open tasks with ``Completed(False)``."""
+    
+    def __init__(self, completed=True):
+        """
+        Initialize a new Completed predicate.
+        
+        Args:
+            completed (bool, optional): Match completed (True) or open (False)
+                tasks. Defaults to True.
+        """
+        self.completed = completed
+    
+    def matches(self, task):
+        return task.completed == self.completed
+    
+    def plan(self, manager):
+        index = manager.index
+        ids = index.completed if self.completed else index.open
+        return Access(f"Status index scan: {self}", len(ids), lambda: iter(ids)), None
+    
+    def __invert__(self):
+        return Completed(not self.completed)
+    
+    def __str__(self):
+        return "completed" if self.completed else "not completed"
+
+
+class DueBetween(Predicate):
+    """Open tasks due in an inclusive date range (see TaskManager.get_tasks_due_between)."""
+    
+    def __init__(self, start=None, end=None):
+        """
+        Initialize a new DueBetween predicate.
+        
+        Args:
+            start (datetime or str, optional): Start of the range, inclusive.
+                Defaults to no lower bound.
+            end (datetime or str, optional): End of the range, inclusive.
+                Defaults to no upper bound.
+        
+        Raises:
+            ValueError: If a date string is not in YYYY-MM-DD format
+        """
+        self.start, self.before = due_bounds(start, end)
+        self._start_ts = to_timestamp(self.start)
+        self._before_ts = to_timestamp(self.before)
+    
+    def matches(self, task):
+        due = task.due_timestamp
+        if due is None or task.completed:
+            return False
+        return ((self._start_ts is None or due >= self._start_ts) and
+                (self._before_ts is None or due < self._before_ts))
+    
+    def plan(self, manager):
+        index = manager.index
+        low, high = index.due_range(self._start_ts, self._before_ts)
+        by_due = index.by_due
+        access = Access(f"Due date index range scan: {self}", high - low,
+                        lambda: (entry[1] for entry in by_due[low:high]), order='due_date')
+        return access, None
+    
+    def __str__(self):
+        start = "-" if self.start is None else self.start.isoformat()
+        before = "-" if self.before is None else self.before.isoformat()
+        return f"open and due in [{start}, {before})"
+
+
+class Text(Predicate):
+    """Tasks whose title, description or categories contain a string (case insensitive)."""
+    
+    def __init__(self, query):
+        """
+        Initialize a new Text predicate.
+        
+        Args:
+            query (str): The text to look for
+        """
+        self.query = query.lower()
+    
+    def matches(self, task):
+        query = self.query
+        return (query in task.title.lower() or
+                query in task.description.lower() or
+                any(query in category for category in task.categories))
+    
+    def plan(self, manager):
+        engine = manager.search_engine
+        if engine is None:
+            return None, self
+        
+        # The n-gram index only narrows the tasks down; they are verified after
+        ids = engine.candidates(self.query)
+        return Access(f"Search engine candidates: {self}", len(ids), lambda: iter(ids)), self
+    
+    def __str__(self):
+        return f"text contains {self.query!r}"
+
+
+class And(Predicate):
+    """Tasks matching every one of several predicates."""
+    
+    def __init__(self, *predicates):
+        """
+        Initialize a new And predicate.
+        
+        Args:
+            *predicates (Predicate): The predicates to combine
+        """
+        self.predicates = _flatten(And, predicates)
+    
+    def matches(self, task):
+        return all(predicate.matches(task) for predicate in self.predicates)
+    
+    def plan(self, manager):
+        # Drive the query from the most selective index; the other
+        # predicates are checked on the tasks it produces
+        best = None
+        for position, predicate in enumerate(self.predicates):
+            access, residual = predicate.plan(manager)
+            if access is not None and (best is None or access.estimate < best[1].estimate):
+                best = (position, access, residual)
+        if best is None:
+            return None, self
+        
+        position, access, residual = best
+        rest = self.predicates[:position] + self.predicates[position + 1:]
+        if residual is not None:
+            rest.insert(0, residual)
+        if not rest:
+            return access, None
+        return access, rest[0] if len(rest) == 1 else And(*rest)
+    
+    def __str__(self):
+        return "(" + " AND ".join(str(predicate) for predicate in self.predicates) + ")"
+
+
+class Or(Predicate):
+    """Tasks matching at least one of several predicates."""
+    
+    def __init__(self, *predicates):
+        """
+        Initialize a new Or predicate.
+        
+        Args:
+            *predicates (Predicate): The predicates to combine
+        """
+        self.predicates = _flatten(Or, predicates)
+    
+    def matches(self, task):
+        return any(predicate.matches(task) for predicate in self.predicates)
+    
+    def plan(self, manager):
+        # An index union only pays off if every branch has an index
+        plans = [predicate.plan(manager) for predicate in self.predicates]
+        if any(access is None for access, _ in plans):
+            return None, self
+        
+        accesses = [access for access, _ in plans]
+        
+        def ids():
+            seen = set()
+            for access in accesses:
+                for task_id in access.ids():
+                    if task_id not in seen:
+                        seen.add(task_id)
+                        yield task_id
+        
+        access = Access("Union", sum(access.estimate for access in accesses), ids,
+                        children=accesses)
+        exact = all(residual is None for _, residual in plans)
+        return access, None if exact else self
+    
+    def __str__(self):
+        return "(" + " OR ".join(str(predicate) for predicate in self.predicates) + ")"
+
+
+class Not(Predicate):
+    """Tasks not matching a predicate."""
+    
+    def __init__(self, predicate):
+        """
+        Initialize a new Not predicate.
+        
+        Args:
+            predicate (Predicate): The predicate to negate
+        """
+        self.predicate = predicate
+    
+    def matches(self, task):
+        return not self.predicate.matches(task)
+    
+    def __invert__(self):
+        return self.predicate
+    
+    def __str__(self):
+        return f"NOT {self.predicate}"
+
+
+class Query:
+    """
+    A lazily evaluated query over the tasks of a TaskManager.
+    
+    Queries are built with TaskManager.query and refined with where,
+    order_by, limit and offset, each of which returns a new Query. Nothing
+    is evaluated until the query is iterated. Without order_by, tasks come
+    out in the order of the index the planner picked (insertion order for
+    a full scan).
+    
+    Iterating evaluates the whole query when the iteration starts (see
+    all()), under the read lock, so the loop body may change the tasks.
+    """
+    
+    def __init__(self, manager, predicate=None):
+        """
+        Initialize a new Query.
+        
+        Args:
+            manager (TaskManager): The manager whose tasks are queried
+            predicate (Predicate, optional): Filter on the tasks. Defaults to all tasks.
+        """
+        self.manager = manager
+        self.predicate = predicate
+        self._order = None  # (field, descending)
+        self._limit = None
+        self._offset = 0
+    
+    def where(self, predicate):
+        """
+        Narrow the query down with another predicate.
+        
+        Args:
+            predicate (Predicate): The predicate the tasks must also satisfy
+        
+        Returns:
+            Query: The new query
+        """
+        query = self._copy()
+        query.predicate = predicate if self.predicate is None else And(self.predicate, predicate)
+        return query
+    
+    def order_by(self, field, descending=False):
+        """
+        Sort the results.
+        
+        Args:
+            field (str): 'status', 'priority', 'due_date', 'created_at' or 'title'
+            descending (bool, optional): Sort in descending order. Defaults to False.
+        
+        Returns:
+            Query: The new query
+        
+        Raises:
+            ValueError: If the field cannot be sorted by
+        """
+        if field not in SORT_KEYS:
+            raise ValueError(f"Cannot sort by {field!r}; expected one of {', '.join(SORT_KEYS)}")
+        query = self._copy()
+        query._order = (field, descending)
+        return query
+    
+    def limit(self, count):
+        """
+        Return at most a number of tasks.
+        
+        Args:
+            count (int): Maximum number of tasks
+        
+        Returns:
+            Query: The new query
+        """
+        query = self._copy()
+        query._limit = count
+        return query
+    
+    def offset(self, count):
+        """
+        Skip a number of tasks.
+        
+        Args:
+            count (int): Number of tasks to skip
+        
+        Returns:
+            Query: The new query
+        """
+        query = self._copy()
+        query._offset = count
+        return query
+    
+    def plan(self):
+        """
+        Plan the query.
+        
+        Returns:
+            tuple: (access, residual) as returned by Predicate.plan. The
+                access is None when the query needs a full scan.
+        """
+        if self.predicate is None:
+            return None, None
+        if self.manager.storage.queryable:
+            return None, self.predicate  # No in-memory indexes to use
+        return self.predicate.plan(self.manager)
+    
+    def explain(self):
+        """
+        Describe how the query would be evaluated.
+        
+        Returns:
+            str: The plan, one step per line, outermost step first
+        """
+        access, residual = self.plan()
+        lines = []
+        if self._limit is not None or self._offset:
+            limit = "all" if self._limit is None else self._limit
+            lines.append(f"Limit {limit} offset {self._offset}")
+        if self._order is not None:
+            field, descending = self._order
+            direction = " descending" if descending else ""
+            if self._index_sorted(access):
+                lines.append(f"Sort by {field}{direction} (provided by the index)")
+            else:
+                lines.append(f"Sort by {field}{direction}")
+        if residual is not None:
+            lines.append(f"Filter: {residual}")
+        
+        depth = len(lines)
+        lines = ["  " * depth + line for depth, line in enumerate(lines)]
+        if access is None:
+            lines.append("  " * depth + f"Full scan (est. {len(self.manager.tasks)} tasks)")
+        else:
+            lines.extend(access.explain(depth))
+        return "\n".join(lines)
+    
+    def all(self):
+        """
+        Evaluate the query.
+        
+        Returns:
+            list: The matching Task objects
+        """
+        return self.manager.run_query(self)
+    
+    def first(self):
+        """
+        Get the first matching task.
+        
+        Returns:
+            Task: The first result, or None if nothing matches
+        """
+        return next(iter(self.limit(1)), None)
+    
+    def count(self):
+        """
+        Count the matching tasks, taking limit and offset into account.
+        
+        Returns:
+            int: Number of results
+        """
+        return sum(1 for _ in self)
+    
+    def __iter__(self):
+        # The indexes change with the tasks, so they are not walked while the caller runs
+        return iter(self.all())
+    
+    def evaluate(self):
+        """
+        Evaluate the query lazily, without locking or refreshing.
+        
+        The tasks must not change until the generator is exhausted.
+        
+        Yields:
+            Task: The matching tasks
+        """
+        access, residual = self.plan()
+        tasks = self.manager.tasks
+        start = self._offset
+        stop = None if self._limit is None else start + self._limit
+        
+        scanned = None
+        if access is None and residual is not None:
+            # A filtered full scan may run on the manager's worker processes
+            scanned = self.manager.parallel_scan(residual, stop if self._order is None else None)
+        
+        if scanned is not None:
+            candidates = scanned
+        elif access is None:
+            candidates = tasks.values()
+        else:
+            candidates = (tasks[task_id] for task_id in access.ids())
+        if residual is not None and scanned is None:
+            candidates = (task for task in candidates if residual.matches(task))
+        
+        if self._order is not None and not self._index_sorted(access):
+            field, descending = self._order
+            key = SORT_KEYS[field]
+            if stop is None:
+                candidates = sorted(candidates, key=key, reverse=descending)
+            elif descending:
+                candidates = heapq.nlargest(stop, candidates, key=key)
+            else:
+                candidates = heapq.nsmallest(stop, candidates, key=key)
+        
+        yield from islice(candidates, start, stop)
+    
+    def _index_sorted(self, access):
+        """
+        Check whether the access already produces tasks in the requested order.
+        
+        Args:
+            access (Access): The access the query is driven by, or None
+        
+        Returns:
+            bool: True if no sort is needed
+        """
+        return (access is not None and self._order is not None and
+                self._order == (access.order, False))
+    
+    def _copy(self):
+        """
+        Copy the query so it can be refined without changing this one.
+        
+        Returns:
+            Query: The copy
+        """
+        query = Query(self.manager, self.predicate)
+        query._order, query._limit, query._offset = self._order, self._limit, self._offset
+        return query
+
+
+def _flatten(kind, predicates):
+    """
+    Merge nested predicates of the same kind, so (a & b) & c becomes And(a, b, c).
+    
+    Args:
+        kind (type): And or Or
+        predicates (iterable): The predicates to combine
+    
+    Returns:
+        list: The flattened predicates
+    """
+    flat = []
+    for predicate in predicates:
+        if isinstance(predicate, kind):
+            flat.extend(predicate.predicates)
+        else:
+            flat.append(predicate)
+    return flat
@@ -0,0 +1,105 @@
+"""
+Reader/writer lock module for the Task Manager application.
+
+This module defines the RWLock class used by a thread-safe TaskManager:
+any number of threads can read at the same time, while writes are
+serialized and exclude readers.
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    A writer-preferring reader/writer lock.
+    
+    Readers share the lock; a writer holds it alone. Once a writer is
+    waiting, new readers wait behind it so a steady stream of reads cannot
+    starve writes. Both sides are reentrant, and the thread holding the
+    write lock may also take the read lock.
+    
+    Attributes:
+        readers (int): Number of read locks currently held
+    """
+    
+    def __init__(self):
+        """Initialize an unlocked RWLock."""
+        self._condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self._writer = None  # Ident of the thread holding the write lock
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()  # Read locks held by the current thread
+    
+    def acquire_read(self):
+        """Block until the read lock is acquired."""
+        me = threading.get_ident()
+        depth = getattr(self._local, 'depth', 0)
+        with self._condition:
+            # A thread that already reads, or writes, never waits: it would
+            # wait for itself
+            if depth == 0 and self._writer != me:
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self.readers += 1
+        self._local.depth = depth + 1
+    
+    def release_read(self):
+        """Release one read lock."""
+        self._local.depth -= 1
+        with self._condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self._condition.notify_all()
+    
+    def acquire_write(self):
+        """
+        Block until the write lock is acquired.
+        
+        Raises:
+            RuntimeError: If the thread holds only a read lock; upgrading
+                could deadlock with another upgrading reader
+        """
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if getattr(self._local, 'depth', 0):
+                raise RuntimeError("Cannot take the write lock while holding the read lock")
+            
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self.readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+    
+    def release_write(self):
+        """Release one level of the write lock."""
+        with self._condition:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+    
+    @contextmanager
+    def read_locked(self):
+        """Hold the read lock for the duration of a with block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+    
+    @contextmanager
+    def write_locked(self):
+        """Hold the write lock for the duration of a with block."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
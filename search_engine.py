@@ -0,0 +1,288 @@
+"""
+Search engine module for the Task Manager application.
+
+This module defines the SearchEngine class which keeps an incremental
+inverted index over task text so that searching does not need to
+lowercase and scan every task on every query.
+"""
+
+import heapq
+import re
+
+# Length of the n-grams used for substring lookups
+GRAM_SIZE = 3
+
+# Score given to a match in each field; higher ranks first
+FIELD_WEIGHTS = {'title': 3, 'categories': 2, 'description': 1}
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class SearchEngine:
+    """
+    An inverted index for substring search over tasks.
+    
+    Two indexes are kept for every task:
+    
+    * an n-gram index (gram -> task IDs) over the lowercased title,
+      description and categories. A query is answered by intersecting the
+      postings of its n-grams and verifying the surviving candidates, so
+      the results are exactly those of a plain substring search.
+    * a word index (word -> task IDs) used to rank tasks where the query
+      words appear as whole words above tasks where they only appear
+      inside longer words.
+    
+    Attributes:
+        documents (dict): Task ID -> (title, description, categories), with
+            title and description lowercased
+    """
+    
+    def __init__(self):
+        """Initialize an empty SearchEngine."""
+        self.documents = {}
+        self._grams = {}  # gram -> set of task IDs
+        self._words = {}  # word -> set of task IDs
+        self._order = {}  # task ID -> insertion sequence number, used to break ties
+        self._next_seq = 0
+    
+    @classmethod
+    def build(cls, tasks):
+        """
+        Build a search engine from scratch.
+        
+        Args:
+            tasks (iterable): The Task objects to index
+        
+        Returns:
+            SearchEngine: A new search engine containing the tasks
+        """
+        engine = cls()
+        for task in tasks:
+            engine.add(task)
+        return engine
+    
+    def add(self, task):
+        """
+        Index a task.
+        
+        Args:
+            task (Task): The task to index
+        """
+        if task.id in self.documents:
+            self.remove(task.id)
+        
+        document = (
+            task.title.lower(),
+            task.description.lower(),
+            tuple(task.categories),  # Already lowercase when added through Task
+        )
+        self.documents[task.id] = document
+        self._order[task.id] = self._next_seq
+        self._next_seq += 1
+        
+        for gram in _document_grams(document):
+            self._grams.setdefault(gram, set()).add(task.id)
+        for word in _document_words(document):
+            self._words.setdefault(word, set()).add(task.id)
+    
+    def remove(self, task_id):
+        """
+        Remove a task from the index.
+        
+        Args:
+            task_id (str): The ID of the task to remove
+        """
+        document = self.documents.pop(task_id, None)
+        if document is None:
+            return
+        
+        del self._order[task_id]
+        for gram in _document_grams(document):
+            _discard(self._grams, gram, task_id)
+        for word in _document_words(document):
+            _discard(self._words, word, task_id)
+    
+    def update(self, task):
+        """
+        Re-index a task after its title, description or categories changed.
+        
+        Keeps the task's original position for tie-breaking.
+        
+        Args:
+            task (Task): The task that changed
+        """
+        seq = self._order.get(task.id)
+        self.add(task)
+        if seq is not None:
+            self._order[task.id] = seq
+    
+    def search(self, query, limit=None):
+        """
+        Find tasks whose title, description or categories contain the query.
+        
+        Results are ranked by the fields that matched (title over
+        categories over description), then by how many query words appear
+        as whole words, then by insertion order.
+        
+        Args:
+            query (str): The search query (case insensitive)
+            limit (int, optional): Return at most this many results. Defaults to None.
+        
+        Returns:
+            list: Matching task IDs, best match first
+        """
+        query = query.lower()
+        scored = []
+        for task_id in self._candidates(query):
+            score = self._score(task_id, query)
+            if score:
+                scored.append((score, -self._order[task_id], task_id))
+        
+        if limit is not None:
+            scored = heapq.nlargest(limit, scored)
+        else:
+            scored.sort(reverse=True)
+        
+        return [task_id for _, _, task_id in scored]
+    
+    def candidates(self, query):
+        """
+        Find the tasks that may contain the query, without verifying or ranking them.
+        
+        Args:
+            query (str): The search query (case insensitive)
+        
+        Returns:
+            list: Task IDs in insertion order; every match is among them
+        """
+        return sorted(self._candidates(query.lower()), key=self._order.__getitem__)
+    
+    def _candidates(self, query):
+        """
+        Narrow the search down using the n-gram index.
+        
+        Args:
+            query (str): The lowercased search query
+        
+        Returns:
+            iterable: Task IDs that may contain the query
+        """
+        if not query:
+            return list(self.documents)
+        
+        if len(query) < GRAM_SIZE:
+            # Short queries match any gram that contains them
+            candidates = set()
+            for gram, task_ids in self._grams.items():
+                if query in gram:
+                    candidates |= task_ids
+            return candidates
+        
+        postings = []
+        for gram in _grams(query):
+            task_ids = self._grams.get(gram)
+            if not task_ids:
+                return ()
+            postings.append(task_ids)
+        
+        # Intersect starting from the most selective gram
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for task_ids in postings[1:]:
+            candidates &= task_ids
+            if not candidates:
+                break
+        return candidates
+    
+    def _score(self, task_id, query):
+        """
+        Verify a candidate and compute its rank.
+        
+        Args:
+            task_id (str): The candidate task ID
+            query (str): The lowercased search query
+        
+        Returns:
+            int: The score of the task, 0 if it does not contain the query
+        """
+        title, description, categories = self.documents[task_id]
+        
+        score = 0
+        if query in title:
+            score += FIELD_WEIGHTS['title']
+        if any(query in category for category in categories):
+            score += FIELD_WEIGHTS['categories']
+        if query in description:
+            score += FIELD_WEIGHTS['description']
+        
+        if score:
+            score += sum(1 for word in WORD_PATTERN.findall(query)
+                         if task_id in self._words.get(word, ()))
+        return score
+
+
+def _grams(text):
+    """
+    Split text into overlapping n-grams.
+    
+    Text shorter than an n-gram is returned as a single gram so that short
+    fields can still be found.
+    
+    Args:
+        text (str): The text to split
+    
+    Returns:
+        set: The n-grams of the text
+    """
+    if len(text) <= GRAM_SIZE:
+        return {text} if text else set()
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _document_grams(document):
+    """
+    Get the n-grams of every field of a document.
+    
+    Args:
+        document (tuple): (title, description, categories) as stored in documents
+    
+    Returns:
+        set: The n-grams of the document
+    """
+    title, description, categories = document
+    grams = _grams(title) | _grams(description)
+    for category in categories:
+        grams |= _grams(category)
+    return grams
+
+
+def _document_words(document):
+    """
+    Get the words of every field of a document.
+    
+    Args:
+        document (tuple): (title, description, categories) as stored in documents
+    
+    Returns:
+        set: The words of the document
+    """
+    title, description, categories = document
+    return set(WORD_PATTERN.findall(" ".join((title, description) + categories)))
+
+
+def _discard(mapping, key, task_id):
+    """
+    Remove a task ID from a posting set, dropping empty sets.
+    
+    Args:
+        mapping (dict): The index to update
+        key (str): The index key
+        task_id (str): The task ID to remove
+    """
+    task_ids = mapping.get(key)
+    if task_ids is None:
+        return
+    
+    task_ids.discard(task_id)
+    if not task_ids:
+        del mapping[key]
@@ -0,0 +1,541 @@
+"""
+HTTP server module for the Task Manager application.
+
+This module serves a TaskManager as a JSON API over HTTP, so that other
+programs can share one task store. It only uses the standard library: a
+ThreadingHTTPServer handles every connection in its own thread, and the
+TaskManager runs in thread-safe mode.
+
+Connections are kept alive (HTTP/1.1), so a client can send many
+requests over one connection. Batch endpoints change many tasks in a
+single write. GET responses on lists carry an ETag (a hash of the
+response); a client that sends it back in If-None-Match gets an empty 304
+response while the list is unchanged. As long as no task has changed at
+all, that answer comes from a cache without running the query again.
+
+Endpoints:
+    GET    /tasks                      List tasks. Query parameters: priority,
+                                       category, status (open or completed),
+                                       due_start, due_end, q (text), order,
+                                       offset, limit
+    POST   /tasks                      Add a task (JSON object) or several
+                                       tasks (JSON array) in one write
+    POST   /tasks/complete             Complete tasks: {"ids": [...]}
+    POST   /tasks/delete               Delete tasks: {"ids": [...]}
+    GET    /tasks/<id>                 Get a task
+    DELETE /tasks/<id>                 Delete a task
+    POST   /tasks/<id>/complete        Mark a task as completed
+    POST   /tasks/<id>/categories      Add a category: {"category": "..."}
+    DELETE /tasks/<id>/categories/<c>  Remove a category
+    GET    /categories                 List the categories in use
+    GET    /search?q=...&limit=N       Search tasks
+    GET    /metrics                    Call counts, latencies and I/O volume in
+                                       the Prometheus text format, or as JSON
+                                       with ?format=json (needs --metrics)
+
+Usage:
+    python main.py [--metrics FORMAT] serve [--host HOST] [--port PORT]
+"""
+
+import hashlib
+import json
+import threading
+import traceback
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from query import filters
+from task import Task
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Number of URLs whose last ETag is remembered
+ETAG_CACHE_SIZE = 1024
+
+
+class RequestError(Exception):
+    """
+    An error reported to the client with an HTTP status code.
+    
+    Attributes:
+        status (int): HTTP status code
+        message (str): Error message sent in the response body
+    """
+    
+    def __init__(self, status, message):
+        """
+        Initialize a new RequestError.
+        
+        Args:
+            status (int): HTTP status code
+            message (str): Error message
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class TaskServer(ThreadingHTTPServer):
+    """
+    An HTTP server that serves one TaskManager.
+    
+    Attributes:
+        task_manager (TaskManager): The served manager (must be thread-safe)
+        verbose (bool): Log every request to stderr
+    """
+    
+    daemon_threads = True
+    
+    def __init__(self, address, task_manager, verbose=False):
+        """
+        Initialize a new TaskServer.
+        
+        Args:
+            address (tuple): (host, port) to listen on; port 0 picks a free port
+            task_manager (TaskManager): The manager to serve, created with
+                thread_safe=True
+            verbose (bool, optional): Log every request. Defaults to False.
+        """
+        super().__init__(address, TaskRequestHandler)
+        self.task_manager = task_manager
+        self.verbose = verbose
+        self._etags = {}  # URL -> (version, ETag of the response at that version)
+        self._etags_lock = threading.Lock()
+    
+    @property
+    def url(self):
+        """str: Base URL of the server."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def version(self):
+        """
+        Get the current version of the tasks, after picking up changes of other processes.
+        
+        Returns:
+            int: The TaskManager version
+        """
+        self.task_manager.refresh()
+        return self.task_manager.version
+    
+    def cached_etag(self, url, version):
+        """
+        Get the ETag of a response if no task has changed since it was sent.
+        
+        Args:
+            url (str): Request path and query string
+            version (int): Current version of the tasks
+        
+        Returns:
+            str: The ETag, or None if it is not known for this version
+        """
+        cached = self._etags.get(url)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        return None
+    
+    def remember_etag(self, url, version, etag):
+        """
+        Remember the ETag of a response.
+        
+        Args:
+            url (str): Request path and query string
+            version (int): Version of the tasks read before the response was made
+            etag (str): The ETag
+        """
+        with self._etags_lock:
+            if len(self._etags) >= ETAG_CACHE_SIZE:
+                self._etags.clear()
+            self._etags[url] = (version, etag)
+
+
+class TaskRequestHandler(BaseHTTPRequestHandler):
+    """Handles the requests of one connection (see the module docstring for the API)."""
+    
+    protocol_version = "HTTP/1.1"  # Keep connections alive
+    disable_nagle_algorithm = True  # Send small responses right away
+    server_version = "TaskManager/1.0"
+    
+    def do_GET(self):
+        self._dispatch("GET")
+    
+    def do_POST(self):
+        self._dispatch("POST")
+    
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+    
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+    
+    def log_error(self, format, *args):
+        # Errors are logged even when requests are not
+        super().log_message(format, *args)
+    
+    def _dispatch(self, method):
+        """
+        Route a request and send the response.
+        
+        Args:
+            method (str): HTTP method
+        """
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        
+        try:
+            body = self._read_body()  # Always read, so the connection stays usable
+            self._route(method, parts, params, body)
+        except RequestError as e:
+            self._send_json(e.status, {'error': e.message})
+        except KeyError as e:
+            self._send_json(404, {'error': e.args[0] if e.args else "Not found"})
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception:
+            # For example an OSError from a save or a TimeoutError from the file
+            # lock: answer instead of closing the connection without a response
+            self.log_error("Error handling %s %s:\n%s", method, self.path,
+                           traceback.format_exc())
+            self._send_json(500, {'error': "Internal server error"})
+    
+    def _route(self, method, parts, params, body):
+        """
+        Call the operation for a method and path.
+        
+        Args:
+            method (str): HTTP method
+            parts (list): Decoded path segments
+            params (dict): Query parameters (last value of each)
+            body: Decoded JSON request body, or None
+        
+        Raises:
+            RequestError: If there is no such endpoint
+        """
+        manager = self.server.task_manager
+        route = (method, len(parts), parts[0] if parts else None)
+        
+        if route == ("GET", 1, "tasks"):
+            self._send_cached(lambda: [task.to_dict() for task in self._list_tasks(params)])
+        elif route == ("GET", 1, "categories"):
+            self._send_cached(manager.get_all_categories)
+        elif route == ("GET", 1, "search"):
+            limit = _int_param(params, "limit")
+            query = params.get("q", "")
+            self._send_cached(
+                lambda: [task.to_dict() for task in manager.search_tasks(query, limit)]
+            )
+        elif route == ("GET", 1, "metrics"):
+            self._send_metrics(params)
+        elif route == ("POST", 1, "tasks"):
+            if isinstance(body, list):
+                ids = manager.add_tasks(_task_specs(body))
+                self._send_json(201, {'ids': ids})
+            else:
+                self._send_json(201, {'id': manager.add_task(**_task_specs([body])[0])})
+        elif route == ("POST", 2, "tasks") and parts[1] in ("complete", "delete"):
+            ids = _object(body).get("ids")
+            if not isinstance(ids, list):
+                raise ValueError("Expected a list of task IDs in 'ids'")
+            if parts[1] == "complete":
+                count = manager.complete_tasks(ids)
+            else:
+                count = manager.delete_tasks(ids)
+            self._send_json(200, {'count': count})
+        elif route == ("GET", 2, "tasks"):
+            task = manager.get_task(parts[1])
+            if task is None:
+                raise RequestError(404, f"Unknown task ID: {parts[1]}")
+            self._send_json(200, task.to_dict())
+        elif route == ("DELETE", 2, "tasks"):
+            self._send_result(manager.delete_task(parts[1]), parts[1])
+        elif route == ("POST", 3, "tasks") and parts[2] == "complete":
+            self._send_result(manager.mark_task_completed(parts[1]), parts[1])
+        elif route == ("POST", 3, "tasks") and parts[2] == "categories":
+            category = _object(body).get("category")
+            if not isinstance(category, str) or not category.strip():
+                raise ValueError("Expected a category name in 'category'")
+            self._send_result(manager.add_category_to_task(parts[1], category), parts[1])
+        elif route == ("DELETE", 4, "tasks") and parts[2] == "categories":
+            self._send_result(manager.remove_category_from_task(parts[1], parts[3]), parts[1])
+        else:
+            raise RequestError(404, f"No endpoint for {method} {self.path}")
+    
+    def _list_tasks(self, params):
+        """
+        Get the tasks selected by the query parameters of GET /tasks.
+        
+        Args:
+            params (dict): Query parameters
+        
+        Returns:
+            iterator: The Task objects
+        """
+        status = params.get("status")
+        if status not in (None, "open", "completed"):
+            raise ValueError("status must be 'open' or 'completed'")
+        
+        where = filters(
+            priority=_int_param(params, "priority"),
+            category=params.get("category"),
+            completed=None if status is None else status == "completed",
+            due_start=params.get("due_start"),
+            due_end=params.get("due_end"),
+            text=params.get("q"),
+        )
+        return self.server.task_manager.iter_tasks(
+            params.get("order", "status"), _int_param(params, "offset") or 0,
+            _int_param(params, "limit"), where
+        )
+    
+    def _read_body(self):
+        """
+        Read and decode the JSON request body.
+        
+        Returns:
+            The decoded body, or None if there is none
+        
+        Raises:
+            RequestError: If the body is too large or not valid JSON
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_SIZE:
+            self.close_connection = True  # The body is not read
+            raise RequestError(413, "Request body too large")
+        if not length:
+            return None
+        
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError as e:  # Also covers invalid UTF-8
+            raise RequestError(400, f"Invalid JSON: {e}") from None
+    
+    def _send_cached(self, produce):
+        """
+        Send a list response with an ETag, or 304 if the client has it already.
+        
+        The version is read before the response is produced. A change made
+        in between moves the version on, so the remembered ETag is never
+        used for a state it does not describe.
+        
+        Args:
+            produce (callable): Returns the JSON-serializable response body
+        """
+        server = self.server
+        version = server.version()
+        client_etags = _etags(self.headers.get("If-None-Match"))
+        etag = server.cached_etag(self.path, version)
+        if etag is not None and etag in client_etags:
+            self._send(304, b"", {'ETag': etag})
+            return
+        
+        body = _encode(produce())
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        server.remember_etag(self.path, version, etag)
+        if etag in client_etags:
+            self._send(304, b"", {'ETag': etag})
+        else:
+            self._send(200, body, {'Content-Type': "application/json", 'ETag': etag})
+    
+    def _send_result(self, found, task_id):
+        """
+        Send the response of a single-task change.
+        
+        Args:
+            found (bool): Whether the task existed
+            task_id (str): The task ID
+        
+        Raises:
+            RequestError: If the task does not exist
+        """
+        if not found:
+            raise RequestError(404, f"Unknown task ID: {task_id}")
+        self._send_json(200, {'id': task_id})
+    
+    def _send_metrics(self, params):
+        """
+        Send the metrics of an instrumented manager.
+        
+        Args:
+            params (dict): Query parameters; format=json selects JSON
+        
+        Raises:
+            RequestError: If the manager is not instrumented
+        """
+        metrics = self.server.task_manager.metrics
+        if metrics is None:
+            raise RequestError(404, "Instrumentation is disabled; start the server with --metrics")
+        if params.get("format") == "json":
+            self._send_json(200, metrics.to_dict())
+        else:
+            self._send(200, metrics.to_prometheus().encode("utf-8"),
+                       {'Content-Type': "text/plain; version=0.0.4; charset=utf-8"})
+    
+    def _send_json(self, status, data):
+        """
+        Send a JSON response.
+        
+        Args:
+            status (int): HTTP status code
+            data: JSON-serializable response body
+        """
+        self._send(status, _encode(data), {'Content-Type': "application/json"})
+    
+    def _send(self, status, body, headers):
+        """
+        Send a response with a Content-Length, so the connection can be reused.
+        
+        Args:
+            status (int): HTTP status code
+            body (bytes): Response body
+            headers (dict): Headers to send
+        """
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _encode(data):
+    """
+    Encode a response body.
+    
+    Args:
+        data: JSON-serializable value
+    
+    Returns:
+        bytes: Compact UTF-8 JSON
+    """
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etags(header):
+    """
+    Parse an If-None-Match header.
+    
+    Args:
+        header (str): The header value, or None
+    
+    Returns:
+        set: The entity tags, without any W/ prefix
+    """
+    if not header:
+        return set()
+    tags = {tag.strip() for tag in header.split(",")}
+    return {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+
+
+def _int_param(params, name):
+    """
+    Get an integer query parameter.
+    
+    Args:
+        params (dict): Query parameters
+        name (str): Parameter name
+    
+    Returns:
+        int: The value, or None if the parameter is missing
+    
+    Raises:
+        ValueError: If the value is not an integer
+    """
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def _object(body):
+    """
+    Check that a request body is a JSON object.
+    
+    Args:
+        body: The decoded body
+    
+    Returns:
+        dict: The body
+    
+    Raises:
+        ValueError: If it is not an object
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Expected a JSON object")
+    return body
+
+
+def _task_specs(entries):
+    """
+    Check the task objects of a POST /tasks body.
+    
+    Args:
+        entries (list): Decoded JSON values
+    
+    Returns:
+        list: Keyword arguments for TaskManager.add_task, with the
+            categories normalized
+    
+    Raises:
+        ValueError: If an entry is not an object, has unknown fields or a
+            field of the wrong type, or a due date not in YYYY-MM-DD format
+    """
+    fields = {'title', 'description', 'priority', 'due_date', 'categories'}
+    specs = []
+    for entry in entries:
+        unknown = set(_object(entry)) - fields
+        if unknown:
+            raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+        
+        spec = {'description': "", **entry}
+        for name in ('title', 'description'):
+            if not isinstance(spec.get(name), str):
+                raise ValueError(f"{name} must be a string")
+        # bool is an int subclass, but true is not a priority
+        priority = spec.get('priority', 3)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("priority must be an integer")
+        
+        due_date = spec.get('due_date')
+        if due_date is not None:
+            if not isinstance(due_date, str):
+                raise ValueError("due_date must be a string or null")
+            try:
+                datetime.strptime(due_date, "%Y-%m-%d")  # Reject bad dates instead of dropping them
+            except ValueError:
+                raise ValueError("due_date must be in YYYY-MM-DD format") from None
+        
+        categories = spec.get('categories')
+        if categories is not None:
+            if not isinstance(categories, list) or not all(
+                    isinstance(category, str) for category in categories):
+                raise ValueError("categories must be a list of strings")
+            spec['categories'] = [Task.normalize_category(category) for category in categories]
+        specs.append(spec)
+    return specs
+
+
+def serve(task_manager, host="127.0.0.1", port=8080, verbose=False):
+    """
+    Serve a TaskManager until interrupted, then write out pending changes.
+    
+    Args:
+        task_manager (TaskManager): The manager to serve, created with thread_safe=True
+        host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+        port (int, optional): Port to listen on. Defaults to 8080.
+        verbose (bool, optional): Log every request. Defaults to False.
+    """
+    with TaskServer((host, port), task_manager, verbose) as server:
+        print(f"Serving tasks on {server.url} (press Ctrl+C to stop)", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            task_manager.close()
@@ -0,0 +1,1441 @@
+"""
+Storage module for the Task Manager application.
+
+This module defines the storage backends a TaskManager can persist its
+tasks to:
+
+* FileStorage keeps every task in memory and stores them in a JSON file
+  plus an append-only journal. This is the default.
+* SQLiteStorage keeps the tasks in an SQLite database and only loads the
+  tasks that are actually used. Filters and searches run as SQL queries.
+* WriteBehindStorage wraps a FileStorage and moves its writes to a
+  background thread.
+
+Every backend receives mutations as journal records (see journal.py), so
+adding a new backend only means translating those records.
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+import binary_format
+from file_lock import FileLock
+from instrumentation import count_read, count_written
+from journal import TaskJournal, apply_record
+from loader import LazyTasks, iter_json_object
+from task import Task
+
+
+class TaskStorage:
+    """
+    Base class for storage backends.
+    
+    Mutations are passed to ``write`` as journal records. Between ``begin``
+    and ``commit`` (or ``rollback``) the writes belong to one transaction
+    and must be persisted all together or not at all.
+    
+    Attributes:
+        queryable (bool): True if the backend answers filters and searches
+            itself, so that the tasks do not need to be loaded into memory
+        read_only (bool): True if the backend cannot store changes, so that
+            the TaskManager refuses every mutation
+    """
+    
+    queryable = False
+    read_only = False
+    
+    def load(self, mode="eager"):
+        """
+        Load every task.
+        
+        Args:
+            mode (str, optional): How to read the data, for backends that
+                support several ways. Defaults to "eager".
+        
+        Returns:
+            dict: Task ID -> Task
+        """
+        raise NotImplementedError
+    
+    def save(self, tasks):
+        """
+        Replace the stored tasks with the given ones.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        """
+        raise NotImplementedError
+    
+    def write(self, records, tasks):
+        """
+        Persist mutation records.
+        
+        Args:
+            records (list): The operation records to persist
+            tasks (dict): Task ID -> Task after the mutations, for backends
+                that need to rewrite a snapshot
+        """
+        raise NotImplementedError
+    
+    def begin(self):
+        """Start a transaction."""
+        raise NotImplementedError
+    
+    def commit(self, tasks):
+        """
+        Persist every write made since ``begin``.
+        
+        Args:
+            tasks (dict): Task ID -> Task after the mutations
+        """
+        raise NotImplementedError
+    
+    def rollback(self):
+        """Discard every write made since ``begin``."""
+        raise NotImplementedError
+    
+    def flush(self):
+        """Persist any writes the backend is still holding on to."""
+    
+    @contextmanager
+    def lock(self, shared=False):
+        """
+        Keep other processes from writing while the with block runs.
+        
+        Backends that are not shared between processes do not lock.
+        
+        Args:
+            shared (bool, optional): Only keep out writers, not readers. Defaults to False.
+        """
+        yield
+    
+    def has_changes(self):
+        """
+        Cheaply check whether another process may have changed the stored tasks.
+        
+        Returns:
+            bool: True if ``changes`` should be called
+        """
+        return False
+    
+    def changes(self):
+        """
+        Read what other processes changed since this one last read or wrote.
+        
+        Call with the lock held.
+        
+        Returns:
+            list: The records written by other processes, or None if the
+                tasks have to be loaded again in full
+        """
+        return []
+    
+    def close(self):
+        """Release any resources held by the backend."""
+
+
+class FragmentCache:
+    """
+    The encoded JSON of every task in the last snapshot.
+    
+    A JSON snapshot is one object with a member per task. Each member is
+    kept as bytes together with the object it was encoded from and that
+    object's revision (see Task.revision), so the next snapshot reuses the
+    bytes of every task that did not change and only encodes the others:
+    the cost of a save grows with the number of changed tasks, plus
+    joining the bytes. The output is byte for byte what
+    ``json.dumps(tasks_dict, indent=4)`` produces, so any reader of the old
+    snapshots reads the new ones.
+    
+    Deleted tasks drop out of the cache with the next snapshot.
+    
+    Attributes:
+        encoded_count (int): Number of tasks the last snapshot had to encode
+    """
+    
+    def __init__(self):
+        """Initialize an empty FragmentCache."""
+        self._entries = {}  # Task ID -> (source object, revision, member bytes)
+        self.encoded_count = 0
+    
+    def encode(self, items):
+        """
+        Encode tasks as an indented JSON object.
+        
+        Args:
+            items (iterable): (task ID, Task or task dictionary) pairs
+        
+        Returns:
+            bytes: The snapshot file contents
+        """
+        cached_entries = self._entries
+        entries = {}
+        members = []
+        encoded_count = 0
+        for task_id, value in items:
+            # Read the revision first: a change made while encoding bumps it
+            revision = None if type(value) is dict else value.revision
+            cached = cached_entries.get(task_id)
+            if cached is None or cached[0] is not value or cached[1] != revision:
+                data = value if type(value) is dict else value.to_dict()
+                # Indented one level deeper, as a member of the outer object
+                member = "    " + json.dumps(task_id) + ": " + \
+                    json.dumps(data, indent=4).replace("\n", "\n    ")
+                cached = (value, revision, member.encode('utf-8'))
+                encoded_count += 1
+            entries[task_id] = cached
+            members.append(cached[2])
+        
+        self._entries = entries
+        self.encoded_count = encoded_count
+        if not members:
+            return b"{}"
+        return b"{\n" + b",\n".join(members) + b"\n}"
+    
+    def clear(self):
+        """Forget every encoded task."""
+        self._entries = {}
+
+
+class FileStorage(TaskStorage):
+    """
+    Stores tasks in a snapshot file plus an append-only journal.
+    
+    Mutations are appended to the journal, which is folded into the snapshot
+    once it grows past ``compact_threshold`` records. Without a journal the
+    whole snapshot is rewritten on every write.
+    
+    The snapshot is an indented JSON file by default, or a compact binary
+    file (see binary_format.py) with ``snapshot_format="binary"``.
+    
+    With ``shared=True`` several processes can use the same files. Every
+    read and write happens under an advisory lock on ``<path>.lock``, and
+    the storage remembers which snapshot (by inode, mtime and size) and
+    how much of the journal it has seen, so ``changes`` returns just the
+    journal records other processes appended since, or asks for a full
+    reload once another process has rewritten the snapshot.
+    
+    Attributes:
+        path (str): File path of the snapshot
+        journal (TaskJournal): The journal, or None if journaling is disabled
+        compact_threshold (int): Journal records after which the snapshot is rewritten
+        snapshot_format (str): "json" or "binary"
+        compress (bool): zlib-compress binary snapshots
+        backups (int): Number of previous snapshot generations kept next to
+            the snapshot (``<path>.bak1`` is the newest), each with the
+            journal that was folded into the following snapshot
+        file_lock (FileLock): The inter-process lock, or None if not shared
+        fragments (FragmentCache): The encoded tasks of the last JSON
+            snapshot, or None if they are not kept
+    """
+    
+    SNAPSHOT_FORMATS = ("json", "binary")
+    
+    def __init__(self, path="tasks.json", journal=True, compact_threshold=1000,
+                 snapshot_format="json", compress=False, backups=1, shared=False,
+                 cache_encoded=True):
+        """
+        Initialize a new FileStorage.
+        
+        Args:
+            path (str, optional): File path of the snapshot. Defaults to "tasks.json".
+            journal (bool, optional): Keep a journal next to the snapshot. Defaults to True.
+            compact_threshold (int, optional): Journal records after which the
+                snapshot is rewritten. Defaults to 1000.
+            snapshot_format (str, optional): "json" or "binary". Defaults to "json".
+            compress (bool, optional): zlib-compress binary snapshots. Defaults to False.
+            backups (int, optional): Number of previous snapshot generations to keep
+                for recovery. Defaults to 1.
+            shared (bool, optional): Coordinate with other processes using the
+                same files. Defaults to False.
+            cache_encoded (bool, optional): Keep the encoded tasks of the last
+                JSON snapshot, so the next one only encodes the tasks that
+                changed. Costs about the size of the snapshot in memory.
+                Defaults to True.
+        """
+        if snapshot_format not in self.SNAPSHOT_FORMATS:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        
+        self.path = path
+        self.journal = TaskJournal(path + ".journal") if journal else None
+        self.compact_threshold = compact_threshold
+        self.snapshot_format = snapshot_format
+        self.compress = compress
+        self.backups = backups
+        self.file_lock = FileLock(path + ".lock") if shared else None
+        self.fragments = FragmentCache() if cache_encoded and snapshot_format == "json" else None
+        self._buffer = None  # Records of the open transaction
+        self._signature = None  # Signature of the snapshot last read or written
+    
+    def load(self, mode="eager"):
+        """
+        Load the snapshot and replay the journal on top of it.
+        
+        If the snapshot is missing or damaged (for example after a crash
+        during a save), the newest intact backup generation is loaded
+        instead, together with the journals written since.
+        
+        Args:
+            mode (str, optional): "eager" parses the whole file at once;
+                "stream" parses it one task at a time so the file text and
+                the decoded JSON are never all in memory together; "lazy"
+                returns a LazyTasks mapping that reads the file on first use
+                and creates Task objects on first access. Defaults to "eager".
+                Binary snapshots are quick to decode and are always read
+                eagerly.
+        
+        Returns:
+            dict: Task ID -> Task (a LazyTasks mapping in lazy JSON mode)
+        """
+        if mode not in ("eager", "stream", "lazy"):
+            raise ValueError(f"Unknown load mode: {mode}")
+        if mode == "lazy" and self.snapshot_format == "json":
+            return LazyTasks(self)
+        
+        def read(path):
+            if self.snapshot_format == "binary":
+                return binary_format.load(path)
+            
+            with open(path, 'r') as f:
+                if mode == "stream":
+                    entries = iter_json_object(f)
+                else:
+                    entries = json.load(f).items()
+                
+                # Convert dictionary data back to Task objects
+                return {task_id: Task.from_dict(task_data) for task_id, task_data in entries}
+        
+        with self.lock(shared=True):
+            tasks, journals = self._recover(read)
+            records = self._replay(journals)
+        
+        # Apply the changes made since the snapshot
+        for record in records:
+            apply_record(tasks, record)
+        
+        return tasks
+    
+    def load_entries(self):
+        """
+        Stream the snapshot into plain task dictionaries.
+        
+        Falls back to backups like load() does. The journal is not applied.
+        
+        Returns:
+            tuple: (dict of task ID -> task dictionary, list of journal
+                records to replay on top)
+        """
+        def read(path):
+            with open(path, 'r') as f:
+                return dict(iter_json_object(f))
+        
+        with self.lock(shared=True):
+            entries, journals = self._recover(read)
+            return entries, self._replay(journals)
+    
+    def save(self, tasks):
+        """
+        Write all tasks to the snapshot file and clear the journal.
+        
+        The snapshot is written to a temporary file, flushed to disk and
+        then renamed over the old one, so a crash never leaves a partly
+        written snapshot behind. The previous snapshot and its journal are
+        kept as backup generations.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        """
+        data = self.encode(tasks)
+        with self.lock():
+            self._write_atomic(data)
+    
+    def checkpoint(self):
+        """
+        Mark the current state of the files, before encoding a snapshot
+        outside of any lock.
+        
+        Returns:
+            tuple: Opaque value to pass to ``install``
+        """
+        size = 0
+        if self.journal is not None and os.path.exists(self.journal.path):
+            size = os.path.getsize(self.journal.path)
+        return _file_signature(self.path), size
+    
+    def install(self, data, checkpoint):
+        """
+        Write a snapshot encoded from the tasks as they were at a checkpoint.
+        
+        Journal records appended since the checkpoint are not part of the
+        snapshot, so they are carried over into the new journal.
+        
+        Args:
+            data (bytes): The snapshot, as returned by ``encode``
+            checkpoint (tuple): The value ``checkpoint`` returned before encoding
+        
+        Returns:
+            bool: False if the snapshot was rewritten since the checkpoint, in
+                which case nothing is written and the caller must save again
+        """
+        signature, size = checkpoint
+        with self.lock():
+            if _file_signature(self.path) != signature:
+                return False
+            
+            tail = self.journal.read_from(size) if self.journal is not None else []
+            self._write_atomic(data)
+            if tail:
+                self.journal.append_many(tail)
+        return True
+    
+    def encode(self, tasks):
+        """
+        Encode tasks in the snapshot format.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        
+        Returns:
+            bytes: The snapshot file contents
+        """
+        if self.snapshot_format == "binary":
+            data = binary_format.encode_tasks(tasks.values(), self.compress)
+        elif self.fragments is not None:
+            # Lazily loaded tasks that were never used stay dictionaries
+            items = tasks.raw_items() if isinstance(tasks, LazyTasks) else tasks.items()
+            data = self.fragments.encode(items)
+        else:
+            # Convert tasks to dictionary format (lazily loaded tasks that were
+            # never used are written back without creating Task objects)
+            if isinstance(tasks, LazyTasks):
+                tasks_dict = dict(tasks.iter_dicts())
+            else:
+                tasks_dict = {task_id: task.to_dict() for task_id, task in tasks.items()}
+            data = json.dumps(tasks_dict, indent=4).encode('utf-8')
+        return data
+    
+    def backup_path(self, generation):
+        """
+        Get the path of a backup snapshot.
+        
+        Args:
+            generation (int): 1 for the newest backup, 2 for the one before, ...
+        
+        Returns:
+            str: File path of the backup
+        """
+        return f"{self.path}.bak{generation}"
+    
+    def journal_backup_path(self, generation):
+        """
+        Get the path of the journal that goes with a backup snapshot.
+        
+        Args:
+            generation (int): 1 for the newest backup, 2 for the one before, ...
+        
+        Returns:
+            str: File path of the journal backup
+        """
+        return f"{self.path}.journal.bak{generation}"
+    
+    def _write_atomic(self, data):
+        """
+        Replace the snapshot with new contents without ever exposing a partial file.
+        
+        Args:
+            data (bytes): The new snapshot contents
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            count_written(len(data))
+            
+            self._rotate_backups()
+            os.replace(temp_path, self.path)
+        except BaseException:
+            # The old snapshot (or its backup) is still intact
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        _fsync_directory(directory)
+        self._signature = _file_signature(self.path)
+        
+        # Everything in the journal is now part of the snapshot. Without
+        # backups it is only removed now: after a crash before this point,
+        # replaying it on the new snapshot is harmless (records are idempotent)
+        journal_path = self.path + ".journal"
+        if self.backups == 0 and os.path.exists(journal_path):
+            os.remove(journal_path)
+        if self.journal is not None:
+            self.journal.count = 0
+            self.journal.offset = 0
+    
+    def _rotate_backups(self):
+        """
+        Turn the current snapshot and journal into the newest backup generation.
+        
+        The steps are ordered so that at every point in time some generation
+        plus the journals after it describes the current tasks.
+        """
+        if self.backups == 0:
+            return  # The journal is removed once the new snapshot is in place
+        
+        journal_path = self.path + ".journal"
+        
+        # Shift the older generations, dropping the oldest one
+        for generation in range(self.backups, 0, -1):
+            for path_of in (self.journal_backup_path, self.backup_path):
+                source = path_of(generation)
+                if not os.path.exists(source):
+                    continue
+                if generation == self.backups:
+                    os.remove(source)
+                else:
+                    os.replace(source, path_of(generation + 1))
+        
+        if os.path.exists(self.path):
+            os.replace(self.path, self.backup_path(1))
+        if os.path.exists(journal_path):
+            os.replace(journal_path, self.journal_backup_path(1))
+    
+    def _recover(self, read):
+        """
+        Read the newest intact snapshot generation.
+        
+        Args:
+            read (callable): Reads a snapshot file, raising on damaged data
+        
+        Returns:
+            tuple: (the data read, list of journal paths to replay in order)
+        """
+        self._signature = _file_signature(self.path)
+        generations = [(self.path, [])] + [
+            (self.backup_path(generation), [self.journal_backup_path(generation)])
+            for generation in range(1, self.backups + 1)
+        ]
+        
+        journals = [self.path + ".journal"]
+        for index, (snapshot_path, journal_paths) in enumerate(generations):
+            journals = journal_paths + journals
+            if not os.path.exists(snapshot_path):
+                older = [path for path, _ in generations[index + 1:] if os.path.exists(path)]
+                if older:
+                    continue  # Interrupted save, an older generation has the data
+                return {}, journals
+            
+            try:
+                data = read(snapshot_path)
+                count_read(os.path.getsize(snapshot_path))
+            except (ValueError, OSError) as e:
+                # json.JSONDecodeError and SnapshotFormatError are ValueErrors
+                print(f"Error loading tasks from {snapshot_path}: {e}")
+                continue
+            
+            if index > 0:
+                print(f"Recovered tasks from backup {snapshot_path}")
+            return data, journals
+        
+        # Nothing readable: start with an empty task list
+        return {}, [self.path + ".journal"]
+    
+    def _replay(self, journal_paths):
+        """
+        Read the records of several journals in order.
+        
+        Args:
+            journal_paths (list): Journal file paths, oldest first
+        
+        Returns:
+            list: The operation records
+        """
+        if self.journal is None:
+            return []
+        
+        records = []
+        for path in journal_paths:
+            if path == self.journal.path:
+                records.extend(self.journal.replay())
+            else:
+                records.extend(TaskJournal(path).replay())
+        return records
+    
+    def write(self, records, tasks):
+        """
+        Append mutation records to the journal, compacting it when it is full.
+        
+        Args:
+            records (list): The operation records to persist
+            tasks (dict): Task ID -> Task after the mutations
+        """
+        if self._buffer is not None:
+            self._buffer.extend(records)
+            return
+        
+        if not records:
+            return
+        
+        with self.lock():
+            if self.journal is None:
+                self.save(tasks)
+                return
+            
+            self.journal.append_many(records)
+            if self.journal.count >= self.compact_threshold:
+                self.save(tasks)
+    
+    @contextmanager
+    def lock(self, shared=False):
+        """
+        Hold the inter-process lock (if shared) for the duration of a with block.
+        
+        Args:
+            shared (bool, optional): Take a shared (read) lock. Defaults to False.
+        """
+        if self.file_lock is None:
+            yield
+            return
+        
+        with self.file_lock.locked(shared):
+            yield
+    
+    def has_changes(self):
+        """
+        Check whether the snapshot was replaced or the journal grew.
+        
+        Only two stat calls, without taking the lock.
+        
+        Returns:
+            bool: True if another process may have written
+        """
+        if self.file_lock is None:
+            return False
+        
+        if _file_signature(self.path) != self._signature:
+            return True
+        if self.journal is None:
+            return False
+        try:
+            return os.path.getsize(self.journal.path) != self.journal.offset
+        except FileNotFoundError:
+            return self.journal.offset != 0
+    
+    def changes(self):
+        """
+        Read what other processes changed since this one last read or wrote.
+        
+        Call with the lock held.
+        
+        Returns:
+            list: The journal records appended by other processes, or None if
+                the snapshot was rewritten and the tasks must be loaded again
+        """
+        if self.file_lock is None:
+            return []
+        
+        if _file_signature(self.path) != self._signature:
+            return None
+        if self.journal is None:
+            return []
+        return self.journal.read_from(self.journal.offset)
+    
+    def begin(self):
+        """Start buffering writes."""
+        self._buffer = []
+    
+    def commit(self, tasks):
+        """
+        Write the buffered records in one go.
+        
+        Args:
+            tasks (dict): Task ID -> Task after the mutations
+        """
+        records, self._buffer = self._buffer, None
+        self.write(records, tasks)
+    
+    def rollback(self):
+        """Drop the buffered records."""
+        self._buffer = None
+
+
+class WriteBehindStorage(TaskStorage):
+    """
+    Persists the writes of another storage from a background thread.
+    
+    ``write`` only queues the records and returns, so mutations run at
+    memory speed. A background thread waits until ``delay`` seconds have
+    passed since the first queued record, or until ``max_pending`` records
+    are queued, and then hands the whole burst to the wrapped storage in a
+    single write (one journal append, or one snapshot without a journal).
+    At most ``delay`` seconds or ``max_pending`` records of changes can be
+    lost in a crash.
+    
+    Queued records are flushed by ``flush``, ``save``, ``close`` and when
+    the interpreter exits (including through ``sys.exit`` and an uncaught
+    KeyboardInterrupt).
+    
+    Attributes:
+        storage (FileStorage): The wrapped storage
+        delay (float): Seconds a record may wait before it is written
+        max_pending (int): Number of queued records that triggers a write
+        error (Exception): The last error raised by a background write, or
+            None; the records are kept and retried after ``delay``
+    """
+    
+    def __init__(self, storage, delay=1.0, max_pending=100):
+        """
+        Initialize a new WriteBehindStorage and start its thread.
+        
+        Args:
+            storage (FileStorage): The storage to write to
+            delay (float, optional): Seconds a record may wait before it is
+                written. Defaults to 1.0.
+            max_pending (int, optional): Number of queued records that
+                triggers a write. Defaults to 100.
+        
+        Raises:
+            ValueError: If the storage is queryable (its connection cannot be
+                shared with the background thread)
+        """
+        if storage.queryable:
+            raise ValueError("Write-behind needs a storage that keeps tasks in memory")
+        if getattr(storage, 'file_lock', None) is not None:
+            raise ValueError("Write-behind cannot be used with a shared storage")
+        
+        self.storage = storage
+        self.delay = delay
+        self.max_pending = max_pending
+        self.error = None
+        
+        self._pending = []  # Records waiting to be written
+        self._tasks = None  # The tasks passed with the latest write
+        self._first_pending = None  # time.monotonic() of the oldest queued record
+        self._buffer = None  # Records of the open transaction, None outside of one
+        self._closed = False
+        
+        # _condition guards the queue and is only held for a moment by
+        # write(); _io_lock serializes the writes to the wrapped storage
+        self._condition = threading.Condition()
+        self._io_lock = threading.RLock()
+        
+        self._thread = threading.Thread(target=self._run, name="task-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    @property
+    def path(self):
+        """str: File path of the wrapped storage."""
+        return self.storage.path
+    
+    @property
+    def journal(self):
+        """TaskJournal: The journal of the wrapped storage."""
+        return self.storage.journal
+    
+    @property
+    def pending_count(self):
+        """int: Number of records waiting to be written."""
+        return len(self._pending)
+    
+    def load(self, mode="eager"):
+        """
+        Load every task from the wrapped storage.
+        
+        Args:
+            mode (str, optional): See FileStorage.load. Defaults to "eager".
+        
+        Returns:
+            dict: Task ID -> Task
+        """
+        self.flush()
+        return self.storage.load(mode)
+    
+    def save(self, tasks):
+        """
+        Write a snapshot right away; queued records are part of it.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        """
+        with self._io_lock:
+            with self._condition:
+                self._pending = []
+                self._first_pending = None
+            self.storage.save(tasks)
+    
+    def write(self, records, tasks):
+        """
+        Queue mutation records for the background thread.
+        
+        Args:
+            records (list): The operation records to persist
+            tasks (dict): Task ID -> Task after the mutations
+        """
+        if self._buffer is not None:
+            self._buffer.extend(records)
+            return
+        
+        if not records:
+            return
+        
+        if self._closed:
+            self.storage.write(records, tasks)
+            return
+        
+        with self._condition:
+            if not self._pending:
+                self._first_pending = time.monotonic()
+            self._pending.extend(records)
+            self._tasks = tasks
+            self._condition.notify()
+    
+    def begin(self):
+        """Start buffering writes."""
+        self._buffer = []
+    
+    def commit(self, tasks):
+        """
+        Queue the buffered records together.
+        
+        Args:
+            tasks (dict): Task ID -> Task after the mutations
+        """
+        records, self._buffer = self._buffer, None
+        self.write(records, tasks)
+    
+    def rollback(self):
+        """Drop the buffered records."""
+        self._buffer = None
+    
+    def flush(self):
+        """
+        Write every queued record now, in the calling thread.
+        
+        Raises:
+            Exception: Whatever the wrapped storage raised; the records stay queued
+        """
+        with self._io_lock:
+            with self._condition:
+                records, self._pending = self._pending, []
+                tasks = self._tasks
+                self._first_pending = None
+            if not records:
+                return
+            
+            try:
+                # Snapshot the mapping so that a compaction does not iterate
+                # over it while the main thread adds or removes tasks
+                self.storage.write(records, tasks.copy())
+            except BaseException:
+                with self._condition:
+                    self._pending[:0] = records
+                    self._first_pending = time.monotonic()
+                raise
+    
+    def close(self):
+        """Write every queued record and stop the background thread."""
+        if self._closed:
+            return
+        
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        atexit.unregister(self.close)
+        
+        self.flush()
+        self.storage.close()
+    
+    def _run(self):
+        """Background thread: wait for a burst of records to settle, then write it."""
+        while True:
+            with self._condition:
+                # Give a burst time to grow, up to the delay or the size limit
+                while not self._closed:
+                    if not self._pending:
+                        self._condition.wait()
+                        continue
+                    remaining = self._first_pending + self.delay - time.monotonic()
+                    if remaining <= 0 or len(self._pending) >= self.max_pending:
+                        break
+                    self._condition.wait(remaining)
+                if self._closed:
+                    return  # close() writes what is left
+            
+            try:
+                self.flush()
+                self.error = None
+            except Exception as e:
+                print(f"Error writing tasks to {self.path}: {e}")
+                self.error = e
+
+
+def _file_signature(path):
+    """
+    Identify the current version of a file without reading it.
+    
+    The snapshot is always replaced by a rename, so a new version has a new
+    inode even if its size and mtime happen to match the old one.
+    
+    Args:
+        path (str): The file path
+    
+    Returns:
+        tuple: (inode, mtime in nanoseconds, size), or None if the file is missing
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _fsync_directory(directory):
+    """
+    Flush a directory entry to disk so that a rename in it survives a crash.
+    
+    Args:
+        directory (str): The directory path
+    """
+    if not hasattr(os, 'O_DIRECTORY'):
+        return  # Not supported (Windows)
+    
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SQLiteStorage(TaskStorage):
+    """
+    Stores tasks in an SQLite database.
+    
+    Tasks live in a ``tasks`` table and their categories in a
+    ``task_categories`` table, with indexes on priority, completion status,
+    due date and category. Every mutation touches only the affected rows,
+    and filters, ordering and searches are answered by SQL queries so the
+    TaskManager never needs to hold all tasks in memory.
+    
+    Attributes:
+        path (str): File path of the database
+    """
+    
+    queryable = True
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            due_date TEXT,
+            completed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS task_categories (
+            task_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            PRIMARY KEY (task_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (priority);
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks (completed, priority);
+        CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (due_date);
+        CREATE INDEX IF NOT EXISTS idx_task_categories_category ON task_categories (category);
+    """
+    
+    COLUMNS = "id, title, description, priority, created_at, due_date, completed"
+    
+    # Maximum number of parameters per IN (...) clause
+    CHUNK_SIZE = 500
+    
+    def __init__(self, path="tasks.db"):
+        """
+        Initialize a new SQLiteStorage, creating the schema if needed.
+        
+        Args:
+            path (str, optional): File path of the database. Defaults to "tasks.db".
+        """
+        self.path = path
+        # Transactions are managed explicitly with BEGIN/COMMIT
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        # Python's lower() so searches match the in-memory search exactly
+        self.conn.create_function("py_lower", 1, str.lower, deterministic=True)
+        self.conn.executescript(self.SCHEMA)
+        self._in_transaction = False
+    
+    def load(self, mode="eager"):
+        """
+        Load every task.
+        
+        Args:
+            mode (str, optional): Ignored, rows are always read in one query
+        
+        Returns:
+            dict: Task ID -> Task
+        """
+        return {task.id: task for task in self.select()}
+    
+    def save(self, tasks):
+        """
+        Replace every row with the given tasks.
+        
+        Used to migrate tasks from another backend. Saving the database's
+        own task mapping is a no-op since every change is already stored.
+        
+        Args:
+            tasks (dict): Task ID -> Task
+        """
+        if isinstance(tasks, StoredTasks) and tasks.storage is self:
+            return
+        
+        with self._transaction():
+            self.conn.execute("DELETE FROM task_categories")
+            self.conn.execute("DELETE FROM tasks")
+            for task in tasks.values():
+                self._insert(task.to_dict())
+    
+    def write(self, records, tasks):
+        """
+        Apply mutation records to the affected rows.
+        
+        Args:
+            records (list): The operation records to persist
+            tasks (dict): Unused, every record carries all it needs
+        """
+        with self._transaction():
+            for record in records:
+                self._apply(record)
+    
+    def begin(self):
+        """Start a transaction."""
+        self.conn.execute("BEGIN")
+        self._in_transaction = True
+    
+    def commit(self, tasks):
+        """
+        Commit the open transaction.
+        
+        Args:
+            tasks (dict): Unused
+        """
+        self._in_transaction = False
+        self.conn.execute("COMMIT")
+    
+    def rollback(self):
+        """Roll back the open transaction."""
+        self._in_transaction = False
+        self.conn.execute("ROLLBACK")
+    
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+    
+    def get(self, task_id):
+        """
+        Load a single task.
+        
+        Args:
+            task_id (str): The ID of the task
+        
+        Returns:
+            Task: The task, or None if it does not exist
+        """
+        tasks = self.select("WHERE id = ?", (task_id,))
+        return tasks[0] if tasks else None
+    
+    def contains(self, task_id):
+        """
+        Check whether a task exists.
+        
+        Args:
+            task_id (str): The ID of the task
+        
+        Returns:
+            bool: True if the task exists
+        """
+        row = self.conn.execute("SELECT 1 FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return row is not None
+    
+    def count(self):
+        """
+        Count the stored tasks.
+        
+        Returns:
+            int: Number of tasks
+        """
+        return self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+    
+    def iter_ids(self):
+        """
+        Iterate over the task IDs in insertion order.
+        
+        Returns:
+            list: Task IDs
+        """
+        return [row[0] for row in self.conn.execute("SELECT id FROM tasks ORDER BY seq")]
+    
+    def ids_with_prefix(self, prefix, limit=None):
+        """
+        Get the task IDs that start with a prefix, using the index on id.
+        
+        Args:
+            prefix (str): The beginning of the IDs
+            limit (int, optional): Return at most this many IDs
+        
+        Returns:
+            list: Matching task IDs in sorted order
+        """
+        # Every string starting with the prefix sorts below prefix + U+10FFFF
+        sql = "SELECT id FROM tasks WHERE id >= ? AND id < ? ORDER BY id"
+        params = [prefix, prefix + "\U0010ffff"]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [row[0] for row in self.conn.execute(sql, params)]
+    
+    def find(self, priority=None, category=None, completed=None):
+        """
+        Load the tasks matching all given filters, in insertion order.
+        
+        Args:
+            priority (int, optional): Only tasks with this priority
+            category (str, optional): Only tasks with this category
+            completed (bool, optional): Only completed (True) or open (False) tasks
+        
+        Returns:
+            list: Matching Task objects
+        """
+        conditions, params = [], []
+        if priority is not None:
+            conditions.append("priority = ?")
+            params.append(priority)
+        if category is not None:
+            conditions.append("id IN (SELECT task_id FROM task_categories WHERE category = ?)")
+            params.append(category)
+        if completed is not None:
+            conditions.append("completed = ?")
+            params.append(int(completed))
+        
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        return self.select(where, params)
+    
+    def find_due(self, start=None, before=None, limit=None):
+        """
+        Load the open tasks due in a time range, earliest first.
+        
+        Args:
+            start (datetime, optional): Only tasks due at or after this time
+            before (datetime, optional): Only tasks due before this time
+            limit (int, optional): Load at most this many tasks
+        
+        Returns:
+            list: Matching Task objects, ordered by due date (then by ID)
+        """
+        # Due dates are stored in ISO format, which sorts like the dates
+        conditions, params = ["completed = 0", "due_date IS NOT NULL"], []
+        if start is not None:
+            conditions.append("due_date >= ?")
+            params.append(start.isoformat())
+        if before is not None:
+            conditions.append("due_date < ?")
+            params.append(before.isoformat())
+        
+        return self.select("WHERE " + " AND ".join(conditions), params,
+                           order="ORDER BY due_date, id", limit=limit)
+    
+    def ordered(self, limit=None, offset=0):
+        """
+        Load tasks, open tasks first and then by priority.
+        
+        Args:
+            limit (int, optional): Load at most this many tasks. Defaults to all.
+            offset (int, optional): Number of tasks to skip. Defaults to 0.
+        
+        Returns:
+            list: Task objects
+        """
+        return self.select(order="ORDER BY completed, priority, seq", limit=limit, offset=offset)
+    
+    def search(self, query, limit=None):
+        """
+        Load the tasks whose title, description or categories contain the query.
+        
+        Args:
+            query (str): The search query (case insensitive)
+            limit (int, optional): Return at most this many results. Defaults to None.
+        
+        Returns:
+            list: Matching Task objects, in insertion order
+        """
+        query = query.lower()
+        where = """
+            WHERE instr(py_lower(title), ?) > 0
+               OR instr(py_lower(description), ?) > 0
+               OR id IN (SELECT task_id FROM task_categories WHERE instr(category, ?) > 0)
+        """
+        return self.select(where, (query, query, query), limit=limit)
+    
+    def categories(self):
+        """
+        Get all categories in use.
+        
+        Returns:
+            list: Sorted list of category names
+        """
+        rows = self.conn.execute(
+            "SELECT DISTINCT category FROM task_categories ORDER BY category"
+        )
+        return [row[0] for row in rows]
+    
+    def select(self, where="", params=(), order="ORDER BY seq", limit=None, offset=0):
+        """
+        Load tasks with their categories.
+        
+        Args:
+            where (str, optional): SQL WHERE clause over the tasks table
+            params (sequence, optional): Parameters of the WHERE clause
+            order (str, optional): SQL ORDER BY clause. Defaults to insertion order.
+            limit (int, optional): Maximum number of tasks to load
+            offset (int, optional): Number of tasks to skip. Defaults to 0.
+        
+        Returns:
+            list: Task objects
+        """
+        sql = f"SELECT {self.COLUMNS} FROM tasks {where} {order}"
+        if limit is not None or offset:
+            sql += f" LIMIT {-1 if limit is None else int(limit)} OFFSET {int(offset)}"
+        rows = self.conn.execute(sql, params).fetchall()
+        
+        # Fetch the categories of all selected tasks in a few queries
+        categories = {row[0]: [] for row in rows}
+        ids = list(categories)
+        for start in range(0, len(ids), self.CHUNK_SIZE):
+            chunk = ids[start:start + self.CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            category_rows = self.conn.execute(
+                f"SELECT task_id, category FROM task_categories "
+                f"WHERE task_id IN ({placeholders}) ORDER BY task_id, position",
+                chunk
+            )
+            for task_id, category in category_rows:
+                categories[task_id].append(category)
+        
+        return [
+            Task.from_dict({
+                'id': task_id,
+                'title': title,
+                'description': description,
+                'priority': priority,
+                'created_at': created_at,
+                'due_date': due_date,
+                'completed': bool(completed),
+                'categories': categories[task_id],
+            })
+            for task_id, title, description, priority, created_at, due_date, completed in rows
+        ]
+    
+    def _transaction(self):
+        """
+        Get a context manager that wraps statements in a transaction.
+        
+        Inside an explicit transaction (between begin and commit) the
+        statements simply join it.
+        
+        Returns:
+            context manager: The transaction scope
+        """
+        return _Transaction(self)
+    
+    def _apply(self, record):
+        """
+        Translate a journal record into row updates.
+        
+        Args:
+            record (dict): The operation record to apply
+        """
+        op = record['op']
+        
+        if op == 'add':
+            self._delete(record['task']['id'])
+            self._insert(record['task'])
+        elif op == 'complete':
+            self.conn.execute("UPDATE tasks SET completed = 1 WHERE id = ?", (record['id'],))
+        elif op == 'delete':
+            self._delete(record['id'])
+        elif op == 'add_category':
+            category = Task.normalize_category(record['category'])
+            self.conn.execute(
+                "INSERT INTO task_categories (task_id, position, category) "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM task_categories WHERE task_id = ?",
+                (record['id'], category, record['id'])
+            )
+        elif op == 'remove_category':
+            category = Task.normalize_category(record['category'])
+            self.conn.execute(
+                "DELETE FROM task_categories WHERE task_id = ? AND position = "
+                "(SELECT MIN(position) FROM task_categories WHERE task_id = ? AND category = ?)",
+                (record['id'], record['id'], category)
+            )
+    
+    def _insert(self, data):
+        """
+        Insert a task row and its categories.
+        
+        Args:
+            data (dict): The task in to_dict() form
+        """
+        self.conn.execute(
+            f"INSERT INTO tasks ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (data['id'], data['title'], data['description'], data['priority'],
+             data['created_at'], data['due_date'], int(data['completed']))
+        )
+        self.conn.executemany(
+            "INSERT INTO task_categories (task_id, position, category) VALUES (?, ?, ?)",
+            [(data['id'], position, category)
+             for position, category in enumerate(data.get('categories', []))]
+        )
+    
+    def _delete(self, task_id):
+        """
+        Delete a task row and its categories.
+        
+        Args:
+            task_id (str): The ID of the task
+        """
+        self.conn.execute("DELETE FROM task_categories WHERE task_id = ?", (task_id,))
+        self.conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+
+class _Transaction:
+    """Context manager running statements in their own transaction if none is open."""
+    
+    def __init__(self, storage):
+        self.storage = storage
+        self.owned = False
+    
+    def __enter__(self):
+        if not self.storage._in_transaction:
+            self.storage.conn.execute("BEGIN")
+            self.owned = True
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.owned:
+            self.storage.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class StoredTasks(MutableMapping):
+    """
+    A task dictionary backed by a queryable storage backend.
+    
+    Tasks are loaded from the backend when they are looked up and cached for
+    as long as they are referenced somewhere else, so the same Task object
+    is returned while it is in use. Assigning or deleting entries only
+    updates the cache; the rows themselves are changed through journal
+    records passed to the backend.
+    
+    Attributes:
+        storage (TaskStorage): The queryable backend
+    """
+    
+    def __init__(self, storage, on_load=None):
+        """
+        Initialize a new StoredTasks mapping.
+        
+        Args:
+            storage (TaskStorage): The queryable backend
+            on_load (callable, optional): Called with every task loaded from the backend
+        """
+        self.storage = storage
+        self.on_load = on_load
+        self._cache = weakref.WeakValueDictionary()
+    
+    def __getitem__(self, task_id):
+        task = self._cache.get(task_id)
+        if task is None:
+            task = self.storage.get(task_id)
+            if task is None:
+                raise KeyError(task_id)
+            task = self._adopt(task)
+        return task
+    
+    def __setitem__(self, task_id, task):
+        self._cache[task_id] = task
+    
+    def __delitem__(self, task_id):
+        self._cache.pop(task_id, None)
+    
+    def __contains__(self, task_id):
+        return task_id in self._cache or self.storage.contains(task_id)
+    
+    def __iter__(self):
+        return iter(self.storage.iter_ids())
+    
+    def __len__(self):
+        return self.storage.count()
+    
+    def values(self):
+        """
+        Load every task.
+        
+        Returns:
+            list: Task objects in insertion order
+        """
+        return self.adopt_all(self.storage.select())
+    
+    def items(self):
+        """
+        Load every task with its ID.
+        
+        Returns:
+            list: (task ID, Task) pairs in insertion order
+        """
+        return [(task.id, task) for task in self.values()]
+    
+    def adopt_all(self, tasks):
+        """
+        Swap freshly loaded tasks for the cached instances where available.
+        
+        Args:
+            tasks (list): Task objects loaded from the backend
+        
+        Returns:
+            list: The Task objects to hand out
+        """
+        return [self._adopt(task) for task in tasks]
+    
+    def _adopt(self, task):
+        """
+        Return the cached instance of a task, caching the given one if needed.
+        
+        Args:
+            task (Task): A task loaded from the backend
+        
+        Returns:
+            Task: The instance to hand out
+        """
+        cached = self._cache.get(task.id)
+        if cached is not None:
+            return cached
+        
+        self._cache[task.id] = task
+        if self.on_load is not None:
+            self.on_load(task)
+        return task
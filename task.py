@@ -5,16 +5,59 @@ This module defines the Task class which represents a single task
 in the Task Manager application.
 """
 
-import uuid
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
+from ids import new_id
+
+# Timestamps are stored as whole microseconds since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_timestamp(value):
+    """
+    Convert a datetime to the compact form stored on tasks.
+    
+    The datetime is taken as-is (no time zone conversion), so converting
+    back with from_timestamp gives exactly the same value.
+    
+    Args:
+        value (datetime): The datetime to convert, or None
+    
+    Returns:
+        int: Microseconds since 1970-01-01, or None
+    """
+    if value is None:
+        return None
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def from_timestamp(value):
+    """
+    Convert a stored timestamp back to a datetime.
+    
+    Args:
+        value (int): Microseconds since 1970-01-01, or None
+    
+    Returns:
+        datetime: The datetime, or None
+    """
+    if value is None:
+        return None
+    return EPOCH + timedelta(microseconds=value)
 
 
 class Task:
     """
     A class representing a task in the Task Manager.
     
+    Tasks use __slots__ to avoid a per-instance __dict__, store their
+    dates as integer timestamps (datetimes are created when the
+    attributes are read) and intern their category strings so that
+    tasks sharing a category share one string object.
+    
     Attributes:
-        id (str): Unique identifier for the task
+        id (str): Unique identifier for the task (see ids.py)
         title (str): Brief title of the task
         description (str): Detailed description of the task
         priority (int): Priority level (1-5, with 1 being highest)
@@ -24,6 +67,11 @@ class Task:
         categories (list): List of categories/tags assigned to the task
     """
     
+    __slots__ = (
+        '_listener', 'id', '_title', '_description', '_priority', '_created_ts',
+        '_due_ts', '_completed', '_categories', '_revision', '__weakref__',
+    )
+    
     def __init__(self, title, description, priority=3, due_date=None, categories=None):
         """
         Initialize a new Task object.
@@ -35,7 +83,9 @@ class Task:
             due_date (str, optional): Due date in format YYYY-MM-DD. Defaults to None.
             categories (list, optional): List of categories/tags. Defaults to empty list.
         """
-        self.id = str(uuid.uuid4())[:8]  # Generate a shorter unique ID
+        self._listener = None  # Set by the TaskManager that owns this task
+        self._revision = 0
+        self.id = new_id()  # Time-sortable, see ids.py
         self.title = title
         self.description = description
         self.priority = priority
@@ -52,21 +102,154 @@ class Task:
                 # If date format is incorrect, just leave it as None
                 print(f"Warning: Invalid date format '{due_date}'. Expected YYYY-MM-DD.")
     
+    @property
+    def title(self):
+        """str: Brief title of the task."""
+        return self._title
+    
+    @title.setter
+    def title(self, value):
+        old = getattr(self, '_title', None)
+        self._title = value
+        self._notify('title', old)
+    
+    @property
+    def description(self):
+        """str: Detailed description of the task."""
+        return self._description
+    
+    @description.setter
+    def description(self, value):
+        old = getattr(self, '_description', None)
+        self._description = value
+        self._notify('description', old)
+    
+    @property
+    def priority(self):
+        """int: Priority level (1-5, with 1 being highest)."""
+        return self._priority
+    
+    @priority.setter
+    def priority(self, value):
+        old = getattr(self, '_priority', None)
+        self._priority = value
+        self._notify('priority', old)
+    
+    @property
+    def completed(self):
+        """bool: Whether the task is completed."""
+        return self._completed
+    
+    @completed.setter
+    def completed(self, value):
+        old = getattr(self, '_completed', None)
+        self._completed = value
+        self._notify('completed', old)
+    
+    @property
+    def categories(self):
+        """
+        list: Categories/tags assigned to the task.
+        
+        Use add_category and remove_category (or assign a new list) to change
+        them, so that the owning TaskManager can keep its indexes up to date.
+        The same goes for every other field: assigning to it is fine, but
+        mutating a value in place is not seen by the TaskManager.
+        """
+        return self._categories
+    
+    @categories.setter
+    def categories(self, value):
+        old = tuple(getattr(self, '_categories', ()))
+        self._categories = [sys.intern(c) if type(c) is str else c for c in value]
+        self._notify('categories', old)
+    
+    @property
+    def created_at(self):
+        """datetime: When the task was created."""
+        return from_timestamp(self._created_ts)
+    
+    @created_at.setter
+    def created_at(self, value):
+        self._created_ts = to_timestamp(value)
+        self._revision += 1
+    
+    @property
+    def due_date(self):
+        """datetime: When the task is due, or None."""
+        return from_timestamp(self._due_ts)
+    
+    @due_date.setter
+    def due_date(self, value):
+        old = getattr(self, '_due_ts', None)
+        self._due_ts = to_timestamp(value)
+        self._notify('due_date', from_timestamp(old))
+    
+    @property
+    def revision(self):
+        """
+        int: Counter bumped by every change to a field.
+        
+        Storage backends use it to tell whether a task changed since it was
+        last encoded (see storage.FragmentCache).
+        """
+        return self._revision
+    
+    @property
+    def created_timestamp(self):
+        """int: Creation time in the form returned by to_timestamp."""
+        return self._created_ts
+    
+    @property
+    def due_timestamp(self):
+        """int: Due date in the form returned by to_timestamp, or None."""
+        return self._due_ts
+    
+    def _notify(self, field, old):
+        """
+        Tell the owning TaskManager that a field has changed.
+        
+        Args:
+            field (str): Name of the changed field
+            old: The previous value of the field
+        """
+        self._revision += 1
+        if self._listener is not None:
+            self._listener._on_task_changed(self, field, old)
+    
     def mark_completed(self):
         """Mark the task as completed."""
         self.completed = True
     
-    def is_overdue(self):
+    def is_overdue(self, now=None):
         """
         Check if the task is overdue.
         
+        Args:
+            now (datetime, optional): The current time. Pass the same value
+                when checking many tasks to read the clock only once.
+                Defaults to datetime.now().
+        
         Returns:
             bool: True if the task is overdue, False otherwise
         """
-        if not self.due_date or self.completed:
+        if self._due_ts is None or self.completed:
             return False
-            
-        return datetime.now() > self.due_date
+        
+        return to_timestamp(now or datetime.now()) > self._due_ts
+    
+    @staticmethod
+    def normalize_category(category):
+        """
+        Convert a category to the form it is stored in.
+        
+        Args:
+            category: The category as entered by the user
+        
+        Returns:
+            str: The category as a stripped, lowercase string
+        """
+        return str(category).strip().lower()
     
     def add_category(self, category):
         """
@@ -74,20 +257,22 @@ class Task:
         
         Args:
             category (str): The category to add
-            
+        
         Returns:
             bool: True if the category was added, False if it already exists
         """
         # Make sure category is a string and convert to lowercase for consistency
-        category = str(category).strip().lower()
+        category = self.normalize_category(category)
         
         if not category:
             return False  # Don't add empty categories
         
         if category not in self.categories:
-            self.categories.append(category)
+            old = tuple(self.categories)
+            self.categories.append(sys.intern(category))
+            self._notify('categories', old)
             return True
-            
+        
         return False  # Category already exists
     
     def remove_category(self, category):
@@ -96,17 +281,19 @@ class Task:
         
         Args:
             category (str): The category to remove
-            
+        
         Returns:
             bool: True if the category was removed, False if it wasn't found
         """
         # Make sure category is a string and convert to lowercase for consistency
-        category = str(category).strip().lower()
+        category = self.normalize_category(category)
         
         if category in self.categories:
+            old = tuple(self.categories)
             self.categories.remove(category)
+            self._notify('categories', old)
             return True
-            
+        
         return False  # Category not found
     
     def to_dict(self):
@@ -134,41 +321,93 @@ class Task:
         
         Args:
             data (dict): Dictionary containing task data
-            
+        
         Returns:
             Task: A new Task instance
         """
-        # Create a basic task
-        task = cls(
-            title=data['title'],
-            description=data['description'],
-            priority=data['priority'],
-            due_date=None,  # We'll set this manually below
-            categories=data.get('categories', [])  # Handle legacy data without categories
+        due_date = data['due_date']
+        return cls.from_fields(
+            data['id'],
+            data['title'],
+            data['description'],
+            data['priority'],
+            to_timestamp(datetime.fromisoformat(data['created_at'])),
+            to_timestamp(datetime.fromisoformat(due_date)) if due_date else None,
+            data['completed'],
+            data.get('categories', []),  # Handle legacy data without categories
         )
+    
+    @classmethod
+    def from_fields(cls, task_id, title, description, priority, created_ts, due_ts,
+                    completed, categories):
+        """
+        Create a Task instance from already parsed field values.
         
-        # Set the remaining attributes
-        task.id = data['id']
-        task.completed = data['completed']
+        The slots are filled directly: running __init__ would generate an ID
+        and a creation time only to overwrite them.
         
-        # Parse the dates
-        task.created_at = datetime.fromisoformat(data['created_at'])
-        if data['due_date']:
-            task.due_date = datetime.fromisoformat(data['due_date'])
+        Args:
+            task_id (str): Unique identifier for the task
+            title (str): The title of the task
+            description (str): The description of the task
+            priority (int): Priority level (1-5)
+            created_ts (int): Creation time as returned by to_timestamp
+            due_ts (int): Due date as returned by to_timestamp, or None
+            completed (bool): Whether the task is completed
+            categories (list): List of categories/tags
         
+        Returns:
+            Task: A new Task instance
+        """
+        task = cls.__new__(cls)
+        task._listener = None
+        task._revision = 0
+        task.id = task_id
+        task._title = title
+        task._description = description
+        task._priority = priority
+        task._completed = completed
+        task._categories = [sys.intern(c) if type(c) is str else c for c in categories]
+        task._created_ts = created_ts
+        task._due_ts = due_ts
         return task
     
+    def copy(self):
+        """
+        Make a detached copy of the task, not owned by any TaskManager.
+        
+        Returns:
+            Task: A new Task instance with the same fields
+        """
+        return Task.from_fields(self.id, self._title, self._description, self._priority,
+                                self._created_ts, self._due_ts, self._completed,
+                                self._categories)
+    
     def __str__(self):
         """
         Return a string representation of the task.
         
+        Returns:
+            str: String representation
+        """
+        return self.render()
+    
+    def render(self, now=None):
+        """
+        Return a string representation of the task as of a given time.
+        
+        Args:
+            now (datetime, optional): The current time, used to flag the task
+                as overdue. Pass the same value when rendering a list of
+                tasks. Defaults to datetime.now().
+        
         Returns:
             str: String representation
         """
         status = "✓" if self.completed else "✗"
         priority_str = "!" * self.priority
         due_str = f", Due: {self.due_date.strftime('%Y-%m-%d')}" if self.due_date else ""
-        overdue = " (OVERDUE!)" if self.is_overdue() else ""
+        overdue = " (OVERDUE!)" if self.is_overdue(now) else ""
         
         # Add categories if they exist
         category_str = ""
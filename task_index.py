@@ -0,0 +1,426 @@
+"""
+Task index module for the Task Manager application.
+
+This module defines the TaskIndex class which keeps secondary indexes
+over a collection of tasks so that filtering by priority, category or
+completion status does not need to scan every task, plus sorted lists
+that keep the tasks in listing order and the open tasks in due date
+order, so a page of either can be read without sorting. The sorted
+list of task IDs resolves ID prefixes by binary search.
+"""
+
+from bisect import bisect_left
+from task import to_timestamp
+
+
+class TaskIndex:
+    """
+    Secondary indexes over a collection of tasks.
+    
+    Every index maps a key to an insertion-ordered dictionary of task IDs
+    (used as an ordered set), so lookups return tasks in the order they
+    entered the index.
+    
+    Attributes:
+        by_priority (dict): Priority level -> ordered set of task IDs
+        by_category (dict): Category -> ordered set of task IDs. The size of
+            each set doubles as the reference count of the category, and a
+            category is dropped as soon as no task uses it.
+        completed (dict): Ordered set of completed task IDs
+        open (dict): Ordered set of task IDs that are not completed
+        by_due (list): Sorted (due timestamp, task ID) pairs of the open
+            tasks that have a due date
+        by_status (list): Sorted (completed, priority, sequence number,
+            task ID) tuples of every task: the listing order of
+            get_all_tasks (open tasks first, then by priority, then in
+            insertion order)
+        sequence (dict): Task ID -> insertion sequence number
+        ids (list): Every task ID in sorted order. New IDs sort after the
+            existing ones (see ids.py), so they are appended at the end.
+    """
+    
+    def __init__(self):
+        """Initialize an empty TaskIndex."""
+        self.by_priority = {}
+        self.by_category = {}
+        self.completed = {}
+        self.open = {}
+        self.by_due = []
+        self.by_status = []
+        self.sequence = {}
+        self._next_sequence = 0
+        self.ids = []
+    
+    @classmethod
+    def build(cls, tasks):
+        """
+        Build an index from scratch.
+        
+        Args:
+            tasks (iterable): The Task objects to index
+        
+        Returns:
+            TaskIndex: A new index containing the tasks
+        """
+        index = cls()
+        for task in tasks:
+            index.add(task, keep_sorted=False)
+        
+        # Sorting once is much cheaper than inserting every task in place
+        index.by_due.sort()
+        index.by_status.sort()
+        index.ids.sort()
+        return index
+    
+    def add(self, task, keep_sorted=True):
+        """
+        Add a task to every index.
+        
+        Args:
+            task (Task): The task to add
+            keep_sorted (bool, optional): Insert into the sorted lists at the
+                right position. With False the task is appended and the
+                caller sorts the lists afterwards. Defaults to True.
+        """
+        self.sequence[task.id] = self._next_sequence
+        self._next_sequence += 1
+        insert = self._insert_sorted if keep_sorted else list.append
+        insert(self.by_status, self._status_key(task))
+        insert(self.ids, task.id)
+        
+        self.by_priority.setdefault(task.priority, {})[task.id] = None
+        for category in set(task.categories):
+            self.by_category.setdefault(category, {})[task.id] = None
+        
+        if task.completed:
+            self.completed[task.id] = None
+        else:
+            self.open[task.id] = None
+            if task.due_timestamp is not None:
+                insert(self.by_due, (task.due_timestamp, task.id))
+    
+    def remove(self, task):
+        """
+        Remove a task from every index.
+        
+        Args:
+            task (Task): The task to remove
+        """
+        self._discard(self.by_priority, task.priority, task.id)
+        for category in set(task.categories):
+            self._discard(self.by_category, category, task.id)
+        
+        self.completed.pop(task.id, None)
+        self.open.pop(task.id, None)
+        self._discard_due(task.due_timestamp, task.id)
+        self._discard_sorted(self.by_status, self._status_key(task))
+        self._discard_sorted(self.ids, task.id)
+        del self.sequence[task.id]
+    
+    def update(self, task, field, old):
+        """
+        Update the indexes after a field of an indexed task has changed.
+        
+        Args:
+            task (Task): The task that changed (already holding the new value)
+            field (str): Name of the changed field
+            old: The previous value of the field
+        """
+        if field == 'priority':
+            self._discard(self.by_priority, old, task.id)
+            self.by_priority.setdefault(task.priority, {})[task.id] = None
+            self._move_status(task, (task.completed, old))
+        
+        elif field == 'completed':
+            self._move_status(task, (bool(old), task.priority))
+            if task.completed:
+                self.open.pop(task.id, None)
+                self.completed[task.id] = None
+                self._discard_due(task.due_timestamp, task.id)
+            else:
+                self.completed.pop(task.id, None)
+                self.open[task.id] = None
+                self._add_due(task.due_timestamp, task.id)
+        
+        elif field == 'due_date':
+            if not task.completed:
+                self._discard_due(to_timestamp(old), task.id)
+                self._add_due(task.due_timestamp, task.id)
+        
+        elif field == 'categories':
+            old, new = set(old), set(task.categories)
+            for category in old - new:
+                self._discard(self.by_category, category, task.id)
+            for category in new - old:
+                self.by_category.setdefault(category, {})[task.id] = None
+    
+    def ids_with_priority(self, priority):
+        """
+        Get the IDs of tasks with the given priority.
+        
+        Args:
+            priority (int): Priority level
+        
+        Returns:
+            dict: Ordered set of task IDs (do not modify)
+        """
+        return self.by_priority.get(priority, {})
+    
+    def ids_with_category(self, category):
+        """
+        Get the IDs of tasks with the given category.
+        
+        Args:
+            category (str): Category name
+        
+        Returns:
+            dict: Ordered set of task IDs (do not modify)
+        """
+        return self.by_category.get(category, {})
+    
+    def ids_in_order(self, offset=0, limit=None):
+        """
+        Get a page of task IDs in listing order.
+        
+        Open tasks come first, each group by priority (highest first) and
+        then in insertion order. The page is sliced out of a sorted list, so
+        this takes O(k) time for k IDs, whatever the offset.
+        
+        Args:
+            offset (int, optional): Number of tasks to skip. Defaults to 0.
+            limit (int, optional): Return at most this many IDs. Defaults to all.
+        
+        Returns:
+            list: Task IDs
+        """
+        stop = None if limit is None else offset + limit
+        return [entry[3] for entry in self.by_status[offset:stop]]
+    
+    def ids_with_prefix(self, prefix, limit=None):
+        """
+        Get the task IDs that start with a prefix.
+        
+        The first match is found by binary search, so this takes
+        O(log N + k) time for k results.
+        
+        Args:
+            prefix (str): The beginning of the IDs
+            limit (int, optional): Return at most this many IDs
+        
+        Returns:
+            list: Matching task IDs in sorted order
+        """
+        ids = self.ids
+        matches = []
+        for position in range(bisect_left(ids, prefix), len(ids)):
+            if not ids[position].startswith(prefix) or len(matches) == limit:
+                break
+            matches.append(ids[position])
+        return matches
+    
+    def ids_due(self, start=None, before=None, limit=None):
+        """
+        Get the IDs of open tasks due in a time range, earliest first.
+        
+        Both ends of the range are found by binary search, so this takes
+        O(log N + k) time for k results.
+        
+        Args:
+            start (int, optional): Only tasks due at or after this timestamp
+            before (int, optional): Only tasks due before this timestamp
+            limit (int, optional): Return at most this many IDs
+        
+        Returns:
+            list: Task IDs ordered by due date (then by ID)
+        """
+        low, high = self.due_range(start, before)
+        if limit is not None:
+            high = min(high, low + limit)
+        return [task_id for _, task_id in self.by_due[low:high]]
+    
+    def due_range(self, start=None, before=None):
+        """
+        Find the positions in by_due of the open tasks due in a time range.
+        
+        Args:
+            start (int, optional): Only tasks due at or after this timestamp
+            before (int, optional): Only tasks due before this timestamp
+        
+        Returns:
+            tuple: (low, high) so that by_due[low:high] holds the tasks
+        """
+        by_due = self.by_due
+        low = 0 if start is None else bisect_left(by_due, (start,))
+        high = len(by_due) if before is None else bisect_left(by_due, (before,))
+        return low, max(low, high)
+    
+    def category_count(self, category):
+        """
+        Get the number of tasks using a category.
+        
+        Args:
+            category (str): Category name
+        
+        Returns:
+            int: Number of tasks with the category
+        """
+        return len(self.by_category.get(category, ()))
+    
+    def categories(self):
+        """
+        Get all categories in use.
+        
+        Returns:
+            list: Sorted list of category names
+        """
+        return sorted(self.by_category)
+    
+    def check(self, tasks):
+        """
+        Compare the index against a freshly built one.
+        
+        Meant for tests and debugging.
+        
+        Args:
+            tasks (iterable): The Task objects that should be indexed
+        
+        Returns:
+            list: Descriptions of every inconsistency found (empty if consistent)
+        """
+        expected = TaskIndex.build(tasks)
+        problems = []
+        
+        for name in ('by_priority', 'by_category'):
+            actual_map, expected_map = getattr(self, name), getattr(expected, name)
+            for key in set(actual_map) | set(expected_map):
+                actual_ids = set(actual_map.get(key, ()))
+                expected_ids = set(expected_map.get(key, ()))
+                if actual_ids != expected_ids:
+                    problems.append(
+                        f"{name}[{key!r}]: extra {sorted(actual_ids - expected_ids)}, "
+                        f"missing {sorted(expected_ids - actual_ids)}"
+                    )
+                elif key in actual_map and not actual_ids:
+                    problems.append(f"{name}[{key!r}]: empty entry was not dropped")
+        
+        for name in ('completed', 'open'):
+            actual_ids, expected_ids = set(getattr(self, name)), set(getattr(expected, name))
+            if actual_ids != expected_ids:
+                problems.append(
+                    f"{name}: extra {sorted(actual_ids - expected_ids)}, "
+                    f"missing {sorted(expected_ids - actual_ids)}"
+                )
+        
+        # Sequence numbers differ after a rebuild; only the order must match
+        actual_order = [(entry[0], entry[1], entry[3]) for entry in self.by_status]
+        expected_order = [(entry[0], entry[1], entry[3]) for entry in expected.by_status]
+        if actual_order != expected_order or self.by_status != sorted(self.by_status):
+            problems.append("by_status: tasks are not in listing order")
+        
+        if self.ids != expected.ids:
+            actual_ids, expected_ids = set(self.ids), set(expected.ids)
+            problems.append(
+                f"ids: extra {sorted(actual_ids - expected_ids)}, "
+                f"missing {sorted(expected_ids - actual_ids)}"
+            )
+        
+        if self.by_due != expected.by_due:
+            actual_due, expected_due = set(self.by_due), set(expected.by_due)
+            problems.append(
+                f"by_due: extra {sorted(actual_due - expected_due)}, "
+                f"missing {sorted(expected_due - actual_due)}"
+            )
+        
+        return problems
+    
+    def _status_key(self, task, fields=None):
+        """
+        Get the entry of a task in by_status.
+        
+        Args:
+            task (Task): The task
+            fields (tuple, optional): (completed, priority) to use instead of
+                the task's current values
+        
+        Returns:
+            tuple: (completed, priority, sequence number, task ID)
+        """
+        completed, priority = fields or (task.completed, task.priority)
+        return (bool(completed), priority, self.sequence[task.id], task.id)
+    
+    def _move_status(self, task, old_fields):
+        """
+        Move a task to its new position in by_status.
+        
+        Args:
+            task (Task): The task, already holding its new values
+            old_fields (tuple): (completed, priority) it was indexed under
+        """
+        self._discard_sorted(self.by_status, self._status_key(task, old_fields))
+        self._insert_sorted(self.by_status, self._status_key(task))
+    
+    def _add_due(self, due, task_id):
+        """
+        Insert an open task into the due date list.
+        
+        Args:
+            due (int): Due timestamp of the task, or None
+            task_id (str): The task ID
+        """
+        if due is not None:
+            self._insert_sorted(self.by_due, (due, task_id))
+    
+    def _discard_due(self, due, task_id):
+        """
+        Remove a task from the due date list if it is there.
+        
+        Args:
+            due (int): Due timestamp the task was indexed under, or None
+            task_id (str): The task ID
+        """
+        if due is not None:
+            self._discard_sorted(self.by_due, (due, task_id))
+    
+    @staticmethod
+    def _insert_sorted(entries, entry):
+        """
+        Insert an entry into a sorted list unless it is already there.
+        
+        Args:
+            entries (list): The sorted list
+            entry: The entry to insert
+        """
+        position = bisect_left(entries, entry)
+        if position == len(entries) or entries[position] != entry:
+            entries.insert(position, entry)
+    
+    @staticmethod
+    def _discard_sorted(entries, entry):
+        """
+        Remove an entry from a sorted list if it is there.
+        
+        Args:
+            entries (list): The sorted list
+            entry: The entry to remove
+        """
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+    
+    @staticmethod
+    def _discard(mapping, key, task_id):
+        """
+        Remove a task ID from one entry of an index, dropping empty entries.
+        
+        Args:
+            mapping (dict): The index to update
+            key: The index key
+            task_id (str): The task ID to remove
+        """
+        ids = mapping.get(key)
+        if ids is None:
+            return
+        
+        ids.pop(task_id, None)
+        if not ids:
+            del mapping[key]
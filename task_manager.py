@@ -5,9 +5,39 @@ This module defines the TaskManager class which is responsible for
 managing the collection of tasks and their operations.
 """
 
-import json
-import os
-from task import Task
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from types import MappingProxyType
+import instrumentation
+from analytics import ColumnarView
+from ids import new_id
+from parallel import SERIAL_THRESHOLD, ParallelScanner
+from journal import apply_record
+from rwlock import RWLock
+from search_engine import SearchEngine
+from loader import LazyTasks
+from query import Query, Text, due_bounds
+from storage import FileStorage, StoredTasks, WriteBehindStorage
+from task import Task, to_timestamp
+from task_index import TaskIndex
+
+
+def _reading(method):
+    """
+    Run a TaskManager method that only reads tasks under the read lock.
+    
+    Changes made by other processes are picked up first.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.refresh()
+        if self._lock is None:
+            return method(self, *args, **kwargs)
+        with self._lock.read_locked():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class TaskManager:
@@ -16,17 +46,157 @@ class TaskManager:
     
     This class provides methods to add, view, update, and delete tasks,
     as well as save and load tasks from storage.
+    
+    Tasks are persisted through a storage backend (see storage.py). By
+    default this is a FileStorage: mutations are appended to a journal
+    file next to the storage file and folded into the snapshot once the
+    journal grows past ``compact_threshold`` records, so a single change
+    does not rewrite every task. With a queryable backend such as
+    SQLiteStorage, tasks are loaded on demand and filters and searches
+    are answered by the backend.
+    
+    With ``shared=True`` several processes can work on the same file. Each
+    mutation locks the storage, first picks up what other processes
+    changed (only the new journal records, or a diff against a rewritten
+    snapshot) and only then applies itself, so no process overwrites the
+    changes of another. Changes to different tasks, or to different fields
+    of the same task, merge; a change to a task that another process has
+    deleted is detected and fails like a change to an unknown task. Reads
+    pick up the changes of other processes as well (see ``refresh``).
+    
+    With ``thread_safe=True`` the manager can be shared between threads.
+    Reads hold a shared lock and do not block each other; mutations hold an
+    exclusive lock (see rwlock.RWLock). ``snapshot`` returns a consistent,
+    read-only copy of the tasks that is only rebuilt for the tasks that
+    changed, and ``save_tasks`` encodes such a snapshot without holding
+    any lock, so neither readers nor writers wait for the encoding. Tasks
+    must then be changed through the manager, not through their setters.
+    
+    With ``write_behind=True`` the file writes are made by a background
+    thread that groups bursts of mutations together (see
+    storage.WriteBehindStorage); call ``flush`` or ``close`` to write them
+    out right away.
+    
+    With ``search_engine=True`` searches are answered from an incremental
+    inverted index (see search_engine.SearchEngine) and ranked, instead of
+    scanning every task.
+    
+    With ``instrument=True`` call counts, latencies and the bytes read and
+    written are recorded for every public method and storage operation in
+    ``metrics`` (see instrumentation.py).
+    
+    With ``parallel=True`` (or a number of worker processes) searches and
+    query filters that have to scan every task run on worker processes
+    that each hold a shard of the tasks (see parallel.py), once the store
+    has ``parallel_threshold`` tasks or more.
+    
+    With a read-only storage such as mmap_snapshot.MappedStorage, tasks
+    are decoded from a memory-mapped snapshot as they are read and every
+    mutation raises PermissionError.
     """
     
-    def __init__(self, storage_file="tasks.json"):
+    def __init__(self, storage_file="tasks.json", journal=True, compact_threshold=1000,
+                 search_engine=False, storage=None, snapshot_format="json",
+                 write_behind=False, shared=False, thread_safe=False, instrument=False,
+                 parallel=False, parallel_threshold=SERIAL_THRESHOLD):
         """
         Initialize a new TaskManager.
         
         Args:
             storage_file (str, optional): File path to store tasks. Defaults to "tasks.json".
+            journal (bool, optional): Record mutations in an append-only journal
+                instead of rewriting the storage file. Defaults to True.
+            compact_threshold (int, optional): Number of journal records after which
+                the journal is compacted into the storage file. Defaults to 1000.
+            search_engine (bool, optional): Answer searches from an inverted index.
+                Defaults to False.
+            storage (TaskStorage, optional): Storage backend to use instead of a
+                FileStorage on storage_file. Defaults to None.
+            snapshot_format (str, optional): Format of the storage file, "json" or
+                "binary" (see binary_format.py). Defaults to "json".
+            write_behind (bool, optional): Write changes from a background thread
+                instead of on every mutation. Defaults to False.
+            shared (bool, optional): Coordinate with other processes using the same
+                storage file. Defaults to False.
+            thread_safe (bool, optional): Allow several threads to use the manager
+                at once. Defaults to False.
+            instrument (bool, optional): Record call counts, latencies and I/O
+                volume in ``metrics``. Defaults to False.
+            parallel (bool or int, optional): Run full scans on this many worker
+                processes, or one per CPU with True. Defaults to False.
+            parallel_threshold (int, optional): Number of tasks from which scans
+                run in parallel. Defaults to parallel.SERIAL_THRESHOLD.
+        
+        Raises:
+            ValueError: If thread_safe or parallel is combined with a queryable storage
         """
-        self.tasks = {}  # Dictionary to store tasks with id as key
-        self.storage_file = storage_file
+        if storage is None:
+            storage = FileStorage(storage_file, journal, compact_threshold, snapshot_format,
+                                  shared=shared)
+        if write_behind:
+            storage = WriteBehindStorage(storage)
+        if thread_safe and storage.queryable:
+            raise ValueError("Thread-safe mode needs a storage that keeps tasks in memory")
+        if parallel and storage.queryable:
+            raise ValueError("Parallel scans need a storage that keeps tasks in memory")
+        self.storage = storage
+        self.storage_file = getattr(storage, 'path', storage_file)
+        
+        # Dictionary to store tasks with id as key. Queryable backends
+        # load tasks on demand instead of holding all of them in memory.
+        if storage.queryable:
+            self.tasks = StoredTasks(storage, on_load=self._adopt)
+        else:
+            self.tasks = {}
+        
+        # Secondary indexes and search engine, built on first use
+        self._index = None
+        self.use_search_engine = search_engine
+        self._search_engine = None
+        
+        # Columnar view for reports, built on first use
+        self._analytics = None
+        
+        # Worker processes for full scans, None unless parallel
+        self._scanner = None
+        if parallel:
+            workers = None if parallel is True else parallel
+            self._scanner = ParallelScanner(workers, parallel_threshold)
+        
+        # Original state of every task touched by the running mutation or
+        # batch, None outside of one
+        self._undo = None
+        
+        # Reader/writer lock in thread-safe mode, None otherwise
+        self._lock = RWLock() if thread_safe else None
+        self._save_lock = threading.Lock()
+        
+        # Copy-on-write snapshot: bumped on every change, and the IDs of the
+        # tasks changed since the cached snapshot was built
+        self._version = 0
+        self._snapshot = None  # (version, dict of task copies)
+        self._dirty = {}  # Ordered, so new tasks keep their position
+        self._snapshot_lock = threading.Lock()
+        
+        # instrumentation.Metrics of an instrumented manager, None otherwise
+        self.metrics = None
+        if instrument:
+            instrumentation.instrument(self)
+    
+    @property
+    def version(self):
+        """
+        int: Counter bumped by every change to the tasks.
+        
+        Two reads that see the same version see the same tasks, which makes
+        it usable as an HTTP entity tag (see server.py).
+        """
+        return self._version
+    
+    @property
+    def journal(self):
+        """TaskJournal: The journal of the file storage, None if there is none."""
+        return getattr(self.storage, 'journal', None)
     
     def add_task(self, title, description, priority=3, due_date=None, categories=None):
         """
@@ -38,38 +208,199 @@ class TaskManager:
             priority (int, optional): Priority level (1-5). Defaults to 3.
             due_date (str, optional): Due date in YYYY-MM-DD format. Defaults to None.
             categories (list, optional): List of category strings. Defaults to None.
-            
+        
         Returns:
             str: The ID of the new task
         """
         # Input validation
+        self._validate_task(title, priority)
+        
+        with self._exclusive():
+            # Create and store the task
+            task = Task(title, description, priority, due_date, categories)
+            self._ensure_unique_id(task)
+            self._touch(task.id)
+            self._insert(task)
+            
+            # Persist the change
+            self._record({'op': 'add', 'task': task.to_dict()})
+        
+        return task.id
+    
+    def add_tasks(self, task_specs):
+        """
+        Add several tasks at once.
+        
+        All entries are validated before any task is added, and the new
+        tasks are persisted together in a single write.
+        
+        Args:
+            task_specs (iterable): Dictionaries with the keyword arguments of add_task
+                ('title', 'description' and optionally 'priority', 'due_date', 'categories')
+        
+        Returns:
+            list: The IDs of the new tasks, in input order
+        """
+        specs = [dict(spec) for spec in task_specs]
+        for spec in specs:
+            self._validate_task(spec.get('title'), spec.get('priority', 3))
+        
+        with self.batch():
+            return [self.add_task(**spec) for spec in specs]
+    
+    def import_tasks(self, entries):
+        """
+        Add tasks given as dictionaries, persisting them in a single write.
+        
+        Entries use the format of Task.to_dict. An entry with an 'id' is
+        stored as-is (replacing any task with that ID), so exported tasks
+        keep their IDs and dates; only 'title' is required and the other
+        fields get the same defaults as in add_task. Entries without an
+        'id' become new tasks. If any entry is invalid, no task is added.
+        
+        Args:
+            entries (iterable): Task dictionaries; consumed one at a time
+        
+        Returns:
+            int: Number of tasks imported
+        
+        Raises:
+            ValueError: If an entry has an empty title, an invalid priority
+                or a malformed date
+        """
+        count = 0
+        with self.batch():
+            for entry in entries:
+                task = self._task_from_entry(entry)
+                self._validate_task(task.title, task.priority)
+                if not entry.get('id'):
+                    self._ensure_unique_id(task)
+                self._touch(task.id)
+                self._insert(task)
+                self._record({'op': 'add', 'task': task.to_dict()})
+                count += 1
+        return count
+    
+    @staticmethod
+    def _task_from_entry(entry):
+        """
+        Create a Task from an imported dictionary.
+        
+        Args:
+            entry (dict): Task fields in the format of Task.to_dict
+        
+        Returns:
+            Task: The new task
+        
+        Raises:
+            ValueError: If a date is malformed
+        """
+        data = {
+            'id': None,
+            'title': None,
+            'description': "",
+            'priority': 3,
+            'created_at': None,
+            'due_date': None,
+            'completed': False,
+            'categories': [],
+        }
+        data.update(entry)
+        if data['id'] and data['created_at']:
+            return Task.from_dict(data)
+        
+        task = Task(data['title'], data['description'], data['priority'],
+                    categories=[Task.normalize_category(c) for c in data['categories']])
+        if data['id']:
+            task.id = data['id']
+        if data['due_date']:
+            task.due_date = datetime.fromisoformat(data['due_date'])
+        task.completed = bool(data['completed'])
+        return task
+    
+    def _ensure_unique_id(self, task):
+        """
+        Give a new task another ID if its ID is already taken.
+        
+        IDs only repeat if another process created a task in the same
+        millisecond and drew the same 30 random bits, but a repeated ID
+        would silently replace the stored task.
+        
+        Args:
+            task (Task): The new task, not stored yet
+        """
+        while task.id in self.tasks:
+            task.id = new_id()
+    
+    def _validate_task(self, title, priority):
+        """
+        Check the fields of a new task.
+        
+        Args:
+            title (str): The title of the task
+            priority (int): Priority level (1-5)
+        
+        Raises:
+            ValueError: If the title is empty or the priority is out of range
+        """
         if not title:
             raise ValueError("Task title cannot be empty")
         
         if not isinstance(priority, int) or priority < 1 or priority > 5:
             raise ValueError("Priority must be an integer between 1 and 5")
-        
-        # Create and store the task
-        task = Task(title, description, priority, due_date, categories)
-        self.tasks[task.id] = task
-        
-        # Save the tasks to file
-        self.save_tasks()
-        
-        return task.id
     
+    @_reading
     def get_task(self, task_id):
         """
         Get a task by its ID.
         
         Args:
             task_id (str): The ID of the task to retrieve
-            
+        
         Returns:
             Task: The task object if found, None otherwise
         """
         return self.tasks.get(task_id)
     
+    @_reading
+    def resolve_id(self, prefix):
+        """
+        Find the task ID that starts with a prefix, so users can type a few characters.
+        
+        A complete ID always resolves to itself. The prefix is looked up by
+        binary search in the sorted ID list of the index; until the index
+        is built, the IDs are scanned instead so that a one-off lookup does
+        not create every Task of a lazily loaded store.
+        
+        Args:
+            prefix (str): The beginning of a task ID
+        
+        Returns:
+            str: The full task ID
+        
+        Raises:
+            KeyError: If no task ID starts with the prefix
+            ValueError: If the prefix is empty or several task IDs start with it
+        """
+        if not prefix:
+            raise ValueError("Task ID prefix cannot be empty")
+        if prefix in self.tasks:
+            return prefix
+        
+        if self.storage.queryable:
+            matches = self.storage.ids_with_prefix(prefix, limit=2)
+        elif self._index is not None:
+            matches = self._index.ids_with_prefix(prefix, limit=2)
+        else:
+            matches = [task_id for task_id in self.tasks if task_id.startswith(prefix)][:2]
+        
+        if not matches:
+            raise KeyError(f"Unknown task ID: {prefix}")
+        if len(matches) > 1:
+            raise ValueError(f"Task ID prefix {prefix!r} matches several tasks")
+        return matches[0]
+    
+    @_reading
     def get_all_tasks(self):
         """
         Get all tasks.
@@ -77,34 +408,102 @@ class TaskManager:
         Returns:
             list: List of all Task objects
         """
-        # Convert to list and sort by priority (highest first)
-        return sorted(self.tasks.values(), key=lambda x: (x.completed, x.priority))
+        if self.storage.queryable:
+            return self.tasks.adopt_all(self.storage.ordered())
+        
+        # Open tasks first, then by priority (highest first). The index
+        # keeps the tasks in this order, so no sort is needed.
+        return [self.tasks[task_id] for task_id in self.index.ids_in_order()]
+    
+    @_reading
+    def iter_tasks(self, order="status", offset=0, limit=None, where=None):
+        """
+        Iterate over one page of the tasks.
+        
+        The default order is that of get_all_tasks, which the index keeps
+        up to date, so a page costs O(k) for k tasks. Any other order, or a
+        filter, is evaluated as a query (see query.Query), which picks the
+        first offset + limit tasks with a heap instead of sorting all of
+        them.
+        
+        Args:
+            order (str, optional): "status" (open tasks first, then by
+                priority), or another sort key of query.Query.order_by
+                ("priority", "due_date", "created_at", "title"). Defaults to
+                "status".
+            offset (int, optional): Number of tasks to skip. Defaults to 0.
+            limit (int, optional): Maximum number of tasks. Defaults to all.
+            where (Predicate, optional): Only tasks matching this predicate
+                (see query.filters). Defaults to all tasks.
+        
+        Returns:
+            iterator: The Task objects of the page
+        
+        Raises:
+            ValueError: If the order is not supported
+        """
+        if order != "status" or where is not None:
+            query = Query(self, where).order_by(order).offset(offset).limit(limit)
+            return iter(list(query.evaluate()))
+        
+        if self.storage.queryable:
+            return iter(self.tasks.adopt_all(self.storage.ordered(limit, offset)))
+        
+        return iter([self.tasks[task_id] for task_id in self.index.ids_in_order(offset, limit)])
+    
+    @_reading
+    def top_tasks(self, k=10):
+        """
+        Get the open tasks with the highest priority.
+        
+        Args:
+            k (int, optional): Number of tasks. Defaults to 10.
+        
+        Returns:
+            list: Up to k open Task objects, highest priority first
+        """
+        if self.storage.queryable:
+            tasks = self.tasks.adopt_all(self.storage.ordered(limit=k))
+            return [task for task in tasks if not task.completed]
+        
+        # Open tasks come first in listing order
+        index = self.index
+        return [self.tasks[task_id] for task_id in index.ids_in_order(0, min(k, len(index.open)))]
     
+    @_reading
     def get_tasks_by_priority(self, priority):
         """
         Get tasks with the specified priority.
         
         Args:
             priority (int): Priority level to filter by
-            
+        
         Returns:
             list: List of Task objects with the specified priority
         """
-        return [task for task in self.tasks.values() if task.priority == priority]
+        if self.storage.queryable:
+            return self.tasks.adopt_all(self.storage.find(priority=priority))
+        
+        return [self.tasks[task_id] for task_id in self.index.ids_with_priority(priority)]
     
+    @_reading
     def get_tasks_by_category(self, category):
         """
         Get tasks with the specified category.
         
         Args:
             category (str): Category to filter by (case insensitive)
-            
+        
         Returns:
             list: List of Task objects with the specified category
         """
         category = category.lower()  # Make case-insensitive
-        return [task for task in self.tasks.values() if category in task.categories]
+        if self.storage.queryable:
+            return self.tasks.adopt_all(self.storage.find(category=category))
+        
+        return [self.tasks[task_id] for task_id in self.index.ids_with_category(category)]
     
+    @_reading
     def get_all_categories(self):
         """
         Get all unique categories used across all tasks.
@@ -112,13 +511,103 @@ class TaskManager:
         Returns:
             list: Sorted list of unique category strings
         """
-        # Use a set to collect unique categories
-        categories = set()
-        for task in self.tasks.values():
-            categories.update(task.categories)
+        if self.storage.queryable:
+            return self.storage.categories()
+        
+        return self.index.categories()
+    
+    @_reading
+    def get_overdue_tasks(self, now=None):
+        """
+        Get the open tasks whose due date has passed.
+        
+        Args:
+            now (datetime, optional): The current time. Defaults to datetime.now().
+        
+        Returns:
+            list: Overdue Task objects, the longest overdue first
+        """
+        return self._due_tasks(before=now or datetime.now())
+    
+    @_reading
+    def get_tasks_due_between(self, start, end):
+        """
+        Get the open tasks due between two dates.
+        
+        Args:
+            start (datetime or str): Start of the range, inclusive. A string
+                is a date in YYYY-MM-DD format.
+            end (datetime or str): End of the range, inclusive. A string is a
+                date in YYYY-MM-DD format and includes that whole day.
+        
+        Returns:
+            list: Task objects ordered by due date
+        
+        Raises:
+            ValueError: If a date string is not in YYYY-MM-DD format
+        """
+        return self._due_tasks(*due_bounds(start, end))
+    
+    @_reading
+    def next_due(self, k=1, now=None):
+        """
+        Get the open tasks that are due next.
+        
+        Args:
+            k (int, optional): Number of tasks to return. Defaults to 1.
+            now (datetime, optional): The current time. Defaults to datetime.now().
+        
+        Returns:
+            list: Up to k Task objects that are not overdue yet, earliest first
+        """
+        return self._due_tasks(start=now or datetime.now(), limit=k)
+    
+    def _due_tasks(self, start=None, before=None, limit=None):
+        """
+        Get the open tasks due in a time range from the due date index.
+        
+        Args:
+            start (datetime, optional): Only tasks due at or after this time
+            before (datetime, optional): Only tasks due before this time
+            limit (int, optional): Return at most this many tasks
+        
+        Returns:
+            list: Task objects ordered by due date
+        """
+        if self.storage.queryable:
+            return self.tasks.adopt_all(self.storage.find_due(start, before, limit))
         
-        # Return sorted list
-        return sorted(list(categories))
+        task_ids = self.index.ids_due(to_timestamp(start), to_timestamp(before), limit)
+        return [self.tasks[task_id] for task_id in task_ids]
+    
+    def query(self, predicate=None):
+        """
+        Start a query over the tasks.
+        
+        Predicates from query.py (Priority, Category, Completed, DueBetween,
+        Text) combine with ``&``, ``|`` and ``~``; the query is answered from
+        the most selective index.
+        
+        Args:
+            predicate (Predicate, optional): Filter on the tasks. Defaults to all tasks.
+        
+        Returns:
+            Query: A lazily evaluated query (see query.Query)
+        """
+        return Query(self, predicate)
+    
+    @_reading
+    def run_query(self, query):
+        """
+        Evaluate a query under the read lock.
+        
+        Args:
+            query (Query): The query to evaluate
+        
+        Returns:
+            list: The matching Task objects
+        """
+        return list(query.evaluate())
     
     def add_category_to_task(self, task_id, category):
         """
@@ -127,16 +616,18 @@ class TaskManager:
         Args:
             task_id (str): The ID of the task
             category (str): The category to add
-            
+        
         Returns:
             bool: True if successful, False if task not found or category already exists
         """
-        task = self.get_task(task_id)
-        if task:
-            result = task.add_category(category)
-            if result:
-                self.save_tasks()
-            return result
+        with self._exclusive():
+            task = self.get_task(task_id)
+            if task:
+                self._touch(task_id)
+                result = task.add_category(category)
+                if result:
+                    self._record({'op': 'add_category', 'id': task_id, 'category': category})
+                return result
         return False
     
     def remove_category_from_task(self, task_id, category):
@@ -146,16 +637,18 @@ class TaskManager:
         Args:
             task_id (str): The ID of the task
             category (str): The category to remove
-            
+        
         Returns:
             bool: True if successful, False if task not found or category not found
         """
-        task = self.get_task(task_id)
-        if task:
-            result = task.remove_category(category)
-            if result:
-                self.save_tasks()
-            return result
+        with self._exclusive():
+            task = self.get_task(task_id)
+            if task:
+                self._touch(task_id)
+                result = task.remove_category(category)
+                if result:
+                    self._record({'op': 'remove_category', 'id': task_id, 'category': category})
+                return result
         return False
     
     def mark_task_completed(self, task_id):
@@ -164,15 +657,17 @@ class TaskManager:
         
         Args:
             task_id (str): The ID of the task to mark as completed
-            
+        
         Returns:
             bool: True if the task was found and marked, False otherwise
         """
-        task = self.get_task(task_id)
-        if task:
-            task.mark_completed()
-            self.save_tasks()
-            return True
+        with self._exclusive():
+            task = self.get_task(task_id)
+            if task:
+                self._touch(task_id)
+                task.mark_completed()
+                self._record({'op': 'complete', 'id': task_id})
+                return True
         return False
     
     def delete_task(self, task_id):
@@ -181,30 +676,457 @@ class TaskManager:
         
         Args:
             task_id (str): The ID of the task to delete
-            
+        
         Returns:
             bool: True if the task was found and deleted, False otherwise
         """
-        if task_id in self.tasks:
-            del self.tasks[task_id]
-            self.save_tasks()
-            return True
+        with self._exclusive():
+            if task_id in self.tasks:
+                self._touch(task_id)
+                self._remove(task_id)
+                self._record({'op': 'delete', 'id': task_id})
+                return True
         return False
     
-    def search_tasks(self, query):
+    def complete_tasks(self, task_ids):
+        """
+        Mark several tasks as completed at once.
+        
+        Args:
+            task_ids (iterable): The IDs of the tasks to mark as completed
+        
+        Returns:
+            int: Number of tasks marked as completed
+        
+        Raises:
+            KeyError: If any of the IDs is unknown; no task is changed in that case
+        """
+        with self.batch():
+            task_ids = self._require_tasks(task_ids)
+            for task_id in task_ids:
+                self.mark_task_completed(task_id)
+        return len(task_ids)
+    
+    def delete_tasks(self, task_ids):
+        """
+        Delete several tasks at once.
+        
+        Args:
+            task_ids (iterable): The IDs of the tasks to delete
+        
+        Returns:
+            int: Number of tasks deleted
+        
+        Raises:
+            KeyError: If any of the IDs is unknown; no task is deleted in that case
+        """
+        with self.batch():
+            task_ids = self._require_tasks(task_ids)
+            for task_id in task_ids:
+                self.delete_task(task_id)
+        return len(task_ids)
+    
+    def _require_tasks(self, task_ids):
+        """
+        Check that all the given task IDs exist.
+        
+        Args:
+            task_ids (iterable): Task IDs to check
+        
+        Returns:
+            list: The unique task IDs, in input order
+        
+        Raises:
+            KeyError: If any of the IDs is unknown
+        """
+        task_ids = list(dict.fromkeys(task_ids))  # Drop duplicates, keep order
+        missing = [task_id for task_id in task_ids if task_id not in self.tasks]
+        if missing:
+            raise KeyError(f"Unknown task IDs: {', '.join(missing)}")
+        return task_ids
+    
+    @contextmanager
+    def batch(self):
+        """
+        Group several mutations into a single transaction.
+        
+        Changes made inside the block are applied in memory and persisted
+        together (in one storage transaction) when the block exits. If the block raises an exception,
+        or persisting the changes fails, every change made inside it is
+        rolled back and nothing is written.
+        Nested batches join the outermost one. A shared storage stays locked
+        for the whole block.
+        
+        Example:
+            with task_manager.batch():
+                task_manager.add_task("Task 1", "Description")
+                task_manager.mark_task_completed(other_id)
+        
+        Yields:
+            TaskManager: This task manager
+        """
+        if self._undo is not None:
+            yield self  # Already inside a batch
+            return
+        
+        with self._exclusive():
+            # _exclusive restores the tasks in memory if anything below raises
+            self.storage.begin()
+            try:
+                yield self
+                self.storage.commit(self.tasks)
+            except BaseException:
+                self.storage.rollback()
+                raise
+    
+    @contextmanager
+    def _exclusive(self):
+        """
+        Lock the storage against other processes and catch up with their changes.
+        
+        Every mutation runs inside this block, so it is applied on top of
+        the latest stored state and written before anyone else can write.
+        In thread-safe mode it also holds the write lock.
+        
+        The tasks touched in the block are remembered (see ``_touch``): if
+        the block raises, for example because the write to storage failed,
+        they are restored, so memory never holds changes the storage lacks.
+        Inside a batch this is left to the outermost block.
+        
+        Raises:
+            PermissionError: If the storage is read-only
+        """
+        if self.storage.read_only:
+            raise PermissionError(f"{self.storage_file} is opened read-only")
+        with self._write_locked(), self.storage.lock():
+            self.refresh()
+            if self._undo is not None:
+                yield  # Inside a batch
+                return
+            
+            self._undo = {}
+            try:
+                yield
+            except BaseException:
+                self._rollback()
+                raise
+            finally:
+                self._undo = None
+    
+    def _write_locked(self):
+        """Return a context manager holding the write lock in thread-safe mode."""
+        return self._lock.write_locked() if self._lock is not None else nullcontext()
+    
+    def refresh(self):
+        """
+        Pick up the changes other processes made to a shared storage.
+        
+        Only the journal records appended since the last read are applied.
+        If another process rewrote the snapshot, it is loaded again and only
+        the tasks that differ are updated, so Task objects stay the same.
+        
+        Returns:
+            int: Number of changes applied (0 if nothing changed)
+        """
+        if isinstance(self.tasks, LazyTasks) and not self.tasks.loaded:
+            return 0  # Will read the current files on first use
+        if not self.storage.has_changes():
+            return 0
+        
+        with self._write_locked():
+            with self.storage.lock(shared=True):
+                records = self.storage.changes()
+                if records is None:
+                    return self._merge(self.storage.load())
+            
+            for record in records:
+                self._apply(record)
+            return len(records)
+    
+    def _apply(self, record):
+        """
+        Apply a journal record written by another process.
+        
+        Args:
+            record (dict): The operation record
+        """
+        if record['op'] == 'add':
+            self._insert(Task.from_dict(record['task']))
+        elif record['op'] == 'delete':
+            self._remove(record['id'])
+        else:
+            # Field changes go through the Task, which updates the indexes
+            apply_record(self.tasks, record)
+    
+    def _merge(self, loaded):
+        """
+        Bring the tasks in memory in line with freshly loaded ones.
+        
+        Args:
+            loaded (dict): Task ID -> Task as currently stored
+        
+        Returns:
+            int: Number of tasks added, removed or changed
+        """
+        changed = 0
+        for task_id in [task_id for task_id in self.tasks if task_id not in loaded]:
+            self._remove(task_id)
+            changed += 1
+        
+        for task_id, stored in loaded.items():
+            task = self.tasks.get(task_id)
+            if task is None:
+                self._insert(stored)
+                changed += 1
+            elif task.to_dict() != stored.to_dict():
+                # Update in place to keep the task's identity and position
+                task.title = stored.title
+                task.description = stored.description
+                task.priority = stored.priority
+                task.created_at = stored.created_at
+                task.due_date = stored.due_date
+                task.completed = stored.completed
+                task.categories = stored.categories
+                changed += 1
+        return changed
+    
+    def _touch(self, task_id):
+        """
+        Remember the state of a task before a mutation or batch changes it.
+        
+        Args:
+            task_id (str): The ID of the task about to change
+        """
+        if self._undo is None or task_id in self._undo:
+            return
+        
+        task = self.tasks.get(task_id)
+        if task is None:
+            self._undo[task_id] = None  # Task is being added
+        else:
+            self._undo[task_id] = (task, task.completed, list(task.categories))
+    
+    def _rollback(self):
+        """Restore every task touched by the current mutation or batch."""
+        for task_id, saved in self._undo.items():
+            if saved is None:
+                self._remove(task_id)
+                continue
+            
+            task, completed, categories = saved
+            task.completed = completed
+            task.categories = categories
+            if self.tasks.get(task_id) is not task:
+                # Removed or replaced by the batch; _insert drops any replacement
+                self._insert(task)
+    
+    @property
+    def index(self):
+        """
+        TaskIndex: Secondary indexes over the tasks.
+        
+        The indexes are built on first use and then kept up to date by
+        every mutation, including changes made directly on a Task.
+        """
+        if self._index is None:
+            self._index = TaskIndex.build(self.tasks.values())
+        return self._index
+    
+    @_reading
+    def check_indexes(self):
+        """
+        Verify that the secondary indexes match the tasks.
+        
+        Returns:
+            list: Descriptions of every inconsistency found (empty if consistent)
+        """
+        return self.index.check(self.tasks.values())
+    
+    def _insert(self, task):
+        """
+        Store a task and add it to the indexes.
+        
+        Args:
+            task (Task): The task to store
+        """
+        if task.id in self.tasks:
+            self._remove(task.id)
+            self._snapshot = None  # The task moves to the end
+        
+        self._adopt(task)
+        self.tasks[task.id] = task
+        self._changed(task.id)
+        if self._index is not None:
+            self._index.add(task)
+        if self._search_engine is not None:
+            self._search_engine.add(task)
+        if self._scanner is not None:
+            self._scanner.touch(task.id)
+        if self._analytics is not None:
+            self._analytics.touch(task.id)
+    
+    def _adopt(self, task):
+        """
+        Make this manager the owner of a task so that it hears about changes.
+        
+        Args:
+            task (Task): The task to adopt
+        """
+        task._listener = self
+    
+    def _remove(self, task_id):
+        """
+        Remove a task from storage and from the indexes.
+        
+        Args:
+            task_id (str): The ID of the task to remove
+        """
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return
+        
+        task._listener = None
+        self._changed(task_id)
+        if self._index is not None:
+            self._index.remove(task)
+        if self._search_engine is not None:
+            self._search_engine.remove(task_id)
+        if self._scanner is not None:
+            self._scanner.discard(task_id)
+        if self._analytics is not None:
+            self._analytics.touch(task_id)
+    
+    def _on_task_changed(self, task, field, old):
+        """
+        Keep the indexes in sync when a field of a stored task changes.
+        
+        Called by Task whenever one of its fields changes.
+        
+        Args:
+            task (Task): The task that changed
+            field (str): Name of the changed field
+            old: The previous value of the field
+        """
+        self._changed(task.id)
+        if self._index is not None:
+            self._index.update(task, field, old)
+        if self._search_engine is not None and field in ('title', 'description', 'categories'):
+            self._search_engine.update(task)
+        if self._scanner is not None:
+            self._scanner.touch(task.id)
+        if self._analytics is not None and field != 'title' and field != 'description':
+            self._analytics.touch(task.id)
+    
+    def _changed(self, task_id):
+        """
+        Note that a task was added, removed or changed.
+        
+        Args:
+            task_id (str): The ID of the task
+        """
+        self._version += 1
+        if self._snapshot is not None:
+            self._dirty[task_id] = None
+    
+    @_reading
+    def snapshot(self):
+        """
+        Get a consistent, read-only view of all tasks.
+        
+        The view holds detached copies of the tasks as they were when it was
+        taken, so it can be iterated and saved while other threads keep
+        changing the manager. It is cached until the next change, and a new
+        one only copies the tasks that changed (copy-on-write); the copies
+        are shared between views and must not be modified.
+        
+        Returns:
+            Mapping: Task ID -> Task copy, in storage order
+        """
+        with self._snapshot_lock:
+            cached = self._snapshot
+            if cached is not None and cached[0] == self._version:
+                return MappingProxyType(cached[1])
+            
+            if cached is None:
+                entries = {task_id: task.copy() for task_id, task in self.tasks.items()}
+            else:
+                entries = dict(cached[1])
+                for task_id in self._dirty:
+                    task = self.tasks.get(task_id)
+                    if task is None:
+                        entries.pop(task_id, None)
+                    else:
+                        entries[task_id] = task.copy()
+            
+            self._dirty = {}
+            self._snapshot = (self._version, entries)
+            return MappingProxyType(entries)
+    
+    @_reading
+    def analytics(self):
+        """
+        Get a columnar view of the tasks for reports.
+        
+        The view is built on first use and then refreshed from the tasks
+        changed since the last call (see analytics.ColumnarView).
+        
+        Example:
+            view = task_manager.analytics()
+            view.group_count("priority", where={'completed': False})
+            view.overdue_rate(by="category")
+        
+        Returns:
+            ColumnarView: The up-to-date view
+        """
+        if self._analytics is None:
+            self._analytics = ColumnarView(self.tasks)
+        else:
+            self._analytics.refresh(self.tasks)
+        return self._analytics
+    
+    @property
+    def search_engine(self):
+        """
+        SearchEngine: Inverted index over the task text, built on first use.
+        
+        None unless the manager was created with ``search_engine=True``.
+        """
+        if self.use_search_engine and self._search_engine is None:
+            self._search_engine = SearchEngine.build(self.tasks.values())
+        return self._search_engine
+    
+    @_reading
+    def search_tasks(self, query, limit=None):
         """
         Search for tasks containing the query in title, description, or categories.
         
+        With the search engine enabled the results are ranked (title matches
+        first, then categories, then description); otherwise they are in
+        storage order.
+        
         Args:
             query (str): The search query
-            
+            limit (int, optional): Return at most this many results. Defaults to None.
+        
         Returns:
             list: List of matching Task objects
         """
+        if self.search_engine is not None:
+            return [self.tasks[task_id] for task_id in self.search_engine.search(query, limit)]
+        
+        if self.storage.queryable:
+            return self.tasks.adopt_all(self.storage.search(query, limit))
+        
+        matches = self.parallel_scan(Text(query), limit)
+        if matches is not None:
+            return matches
+        
         query = query.lower()
         results = []
         
         for task in self.tasks.values():
+            if limit is not None and len(results) >= limit:
+                break
             if (query in task.title.lower() or 
                 query in task.description.lower() or
                 any(query in category for category in task.categories)):
@@ -212,29 +1134,119 @@ class TaskManager:
         
         return results
     
-    def save_tasks(self):
-        """Save all tasks to the storage file."""
-        # Convert tasks to dictionary format
-        tasks_dict = {task_id: task.to_dict() for task_id, task in self.tasks.items()}
+    def parallel_scan(self, predicate, limit=None):
+        """
+        Find the tasks matching a predicate on the worker processes.
+        
+        Does not lock or refresh; callers hold the read lock.
+        
+        Args:
+            predicate (Predicate): The predicate to test (see query.py)
+            limit (int, optional): Return at most this many tasks. Defaults to None.
+        
+        Returns:
+            list: The matching Task objects in storage order, or None if the
+                scan should run serially (not parallel, or a small store)
+        """
+        if self._scanner is None or not self._scanner.should_scan(len(self.tasks)):
+            return None
+        return [self.tasks[task_id] for task_id in self._scanner.scan(self.tasks, predicate, limit)]
+    
+    def _record(self, record):
+        """
+        Persist a single mutation.
+        
+        Inside a batch the storage backend holds on to it until the batch
+        is committed.
         
-        # Write to file
-        with open(self.storage_file, 'w') as f:
-            json.dump(tasks_dict, f, indent=4)
+        Args:
+            record (dict): The operation record describing the mutation
+        """
+        self.storage.write([record], self.tasks)
     
-    def load_tasks(self):
-        """Load tasks from the storage file if it exists."""
-        if not os.path.exists(self.storage_file):
+    def save_tasks(self):
+        """
+        Save all tasks to storage (for the file storage: rewrite the snapshot).
+        
+        In thread-safe mode the snapshot file is encoded from ``snapshot()``
+        without holding any lock; changes made meanwhile stay in the journal.
+        """
+        if self._lock is None:
+            with self._exclusive():
+                self.storage.save(self.tasks)
             return
         
-        try:
-            with open(self.storage_file, 'r') as f:
-                tasks_dict = json.load(f)
+        with self._save_lock:
+            if not isinstance(self.storage, FileStorage) or self.storage.file_lock is not None:
+                # Other processes may rewrite the file at any time: save under the lock
+                with self._exclusive():
+                    self.storage.save(self.snapshot())
+                return
             
-            # Convert dictionary data back to Task objects
-            for task_id, task_data in tasks_dict.items():
-                self.tasks[task_id] = Task.from_dict(task_data)
-                
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Error loading tasks: {e}")
-            # If there's an error, start with an empty task list
-            self.tasks = {} 
\ No newline at end of file
+            with self._exclusive():
+                tasks = self.snapshot()
+                checkpoint = self.storage.checkpoint()
+            data = self.storage.encode(tasks)
+            with self._exclusive():
+                if not self.storage.install(data, checkpoint):
+                    # The journal was compacted meanwhile
+                    self.storage.save(self.snapshot())
+    
+    def load_tasks(self, mode="eager"):
+        """
+        Load tasks from storage.
+        
+        Args:
+            mode (str, optional): "eager" reads everything up front, "stream"
+                parses the file one task at a time to keep peak memory low,
+                and "lazy" defers reading until the tasks are first used and
+                only creates Task objects for the tasks that are accessed.
+                Defaults to "eager".
+        """
+        if self.storage.queryable:
+            return  # Tasks are loaded on demand
+        
+        loaded = self.storage.load(mode)
+        self.adopt_tasks(loaded)
+    
+    def adopt_tasks(self, loaded):
+        """
+        Take over tasks that were read from storage.
+        
+        If the manager holds no tasks yet, the loaded mapping becomes its
+        task dictionary; otherwise the loaded tasks are merged in. A
+        read-only storage always replaces the tasks, which are not adopted.
+        
+        Args:
+            loaded (dict): Task ID -> Task, as returned by the storage's load()
+        """
+        with self._write_locked():
+            if self.tasks and not self.storage.read_only:
+                # Merge into the tasks already in memory
+                for task in loaded.values():
+                    self._insert(task)
+                return
+            
+            if isinstance(loaded, LazyTasks):
+                loaded.on_load = self._adopt
+            elif not self.storage.read_only:  # Read-only tasks never change
+                for task in loaded.values():
+                    self._adopt(task)
+            self.tasks = loaded
+            self._index = None
+            self._search_engine = None
+            self._analytics = None
+            if self._scanner is not None:
+                self._scanner.close()  # Restarted from the new tasks by the next scan
+            self._version += 1
+            self._snapshot = None
+    
+    def flush(self):
+        """Write out any changes the storage backend has not persisted yet."""
+        self.storage.flush()
+    
+    def close(self):
+        """Write out pending changes and release the resources held by the storage backend."""
+        if self._scanner is not None:
+            self._scanner.close()
+        self.storage.close()
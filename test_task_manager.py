@@ -4,13 +4,48 @@ Test module for the Task Manager application.
 This module contains simple tests for the Task and TaskManager classes.
 """
 
+import asyncio
+import contextlib
+import glob
+import http.client
+import io
+import json
 import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from unittest import mock
+from bisect import bisect_right
+from collections import Counter
 from datetime import datetime
+import analytics
+import binary_format
+import cli
+import ids
+import instrumentation
+import mmap_snapshot
+import utils
+from async_task_manager import AsyncTaskManager
+from loader import LazyTasks, iter_json_object
+from query import Category, Completed, DueBetween, Predicate, Priority, Text
+from rwlock import RWLock
+from server import TaskServer
+from storage import FileStorage, SQLiteStorage, WriteBehindStorage
 from task import Task
 from task_manager import TaskManager
 
 
+def remove_files(*paths):
+    """Remove test files together with their journals, backups and temp files."""
+    for path in paths:
+        for name in glob.glob(glob.escape(path) + "*"):
+            os.remove(name)
+
+
 class TestTask(unittest.TestCase):
     """Tests for the Task class."""
     
@@ -114,9 +149,8 @@ class TestTaskManager(unittest.TestCase):
     
     def tearDown(self):
         """Clean up after tests."""
-        # Remove the test file if it exists
-        if os.path.exists(self.test_file):
-            os.remove(self.test_file)
+        # Remove the test file, its journal and its backups
+        remove_files(self.test_file)
     
     def test_add_task(self):
         """Test adding a task."""
@@ -282,6 +316,2121 @@ class TestTaskManager(unittest.TestCase):
         # Search for tasks containing "important" in categories
         results = self.task_manager.search_tasks("important")
         self.assertEqual(len(results), 1)
+    
+    def test_task_ids_and_prefixes(self):
+        """Test sortable IDs, prefix lookup, legacy IDs and the collision check."""
+        added = [self.task_manager.add_task(f"Task {n}", "Description") for n in range(50)]
+        self.assertEqual(added, sorted(added))
+        self.assertTrue(all(len(task_id) == ids.ID_LENGTH for task_id in added))
+        self.task_manager.import_tasks([
+            {'id': "1a2b3c4d", 'title': "Legacy", 'created_at': "2023-01-01T00:00:00"}
+        ])
+        
+        # Shortest prefix of one ID that no other ID shares
+        target = added[25]
+        prefix = next(target[:n] for n in range(1, ids.ID_LENGTH + 1)
+                      if sum(task_id.startswith(target[:n]) for task_id in added) == 1)
+        
+        for with_index in (False, True):
+            if with_index:
+                self.assertEqual(self.task_manager.check_indexes(), [])
+            self.assertEqual(self.task_manager.resolve_id(prefix), target)
+            self.assertEqual(self.task_manager.resolve_id(target), target)
+            self.assertEqual(self.task_manager.resolve_id("1a2b"), "1a2b3c4d")
+            with self.assertRaises(ValueError):
+                self.task_manager.resolve_id(added[0][:3])  # Shared by every new ID
+            with self.assertRaises(ValueError):
+                self.task_manager.resolve_id("")
+            with self.assertRaises(KeyError):
+                self.task_manager.resolve_id("zzzz")
+        
+        # A repeated ID never replaces a stored task
+        with mock.patch("task.new_id", return_value=added[0]):
+            task_id = self.task_manager.add_task("Clash", "Description")
+        self.assertNotEqual(task_id, added[0])
+        self.assertEqual(self.task_manager.get_task(added[0]).title, "Task 0")
+        self.assertEqual(self.task_manager.resolve_id(task_id), task_id)
+
+
+class TestTaskManagerSQLite(TestTaskManager):
+    """Runs the TaskManager tests against the SQLite storage backend."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_tasks.db"
+        self.task_manager = TaskManager(storage=SQLiteStorage(self.test_file))
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.task_manager.close()
+        super().tearDown()
+    
+    def test_changes_are_stored_in_rows(self):
+        """Test that every mutation is visible to a fresh connection."""
+        id1 = self.task_manager.add_task("Task 1", "Description 1", 1, "2023-12-31", ["Work"])
+        id2 = self.task_manager.add_task("Task 2", "Description 2", 2, categories=["home"])
+        self.task_manager.mark_task_completed(id1)
+        self.task_manager.add_category_to_task(id1, " Urgent ")
+        self.task_manager.remove_category_from_task(id2, "home")
+        
+        with self.assertRaises(ValueError):
+            with self.task_manager.batch():
+                self.task_manager.delete_task(id2)
+                self.task_manager.add_task("", "Invalid")
+        
+        reopened = TaskManager(storage=SQLiteStorage(self.test_file))
+        try:
+            task = reopened.get_task(id1)
+            self.assertTrue(task.completed)
+            self.assertEqual(task.categories, ["Work", "urgent"])
+            self.assertEqual(task.due_date, datetime(2023, 12, 31))
+            self.assertEqual(reopened.get_task(id2).categories, [])
+            self.assertEqual(len(reopened.tasks), 2)
+        finally:
+            reopened.close()
+    
+    def test_queries_match_file_storage(self):
+        """Test that SQL filters and searches match the in-memory ones."""
+        memory_manager = TaskManager("test_sqlite_compare.json", journal=False)
+        try:
+            rng = random.Random(3)
+            words = ["Apple", "banana", "cherry", "report"]
+            for i in range(60):
+                memory_manager.add_task(
+                    f"{rng.choice(words)} {i}", rng.choice(words), rng.randint(1, 5),
+                    rng.choice([None, "2024-01-05", "2024-01-10", "2024-02-01"]),
+                    categories=rng.sample(["work", "home", "fruit"], rng.randint(0, 2))
+                )
+                if rng.random() < 0.3:
+                    memory_manager.mark_task_completed(rng.choice(list(memory_manager.tasks)))
+            
+            # Migrate the in-memory tasks into the database
+            self.task_manager.storage.save(memory_manager.tasks)
+            
+            def ids(tasks):
+                return [task.id for task in tasks]
+            
+            self.assertEqual(ids(self.task_manager.get_all_tasks()),
+                             ids(memory_manager.get_all_tasks()))
+            for priority in range(1, 6):
+                self.assertEqual(ids(self.task_manager.get_tasks_by_priority(priority)),
+                                 ids(memory_manager.get_tasks_by_priority(priority)))
+            for category in ["work", "HOME", "none"]:
+                self.assertEqual(ids(self.task_manager.get_tasks_by_category(category)),
+                                 ids(memory_manager.get_tasks_by_category(category)))
+            for query in ["apple", "AN", "rep", "ork", "1", "zzz"]:
+                self.assertEqual(ids(self.task_manager.search_tasks(query)),
+                                 ids(memory_manager.search_tasks(query)))
+            self.assertEqual(self.task_manager.search_tasks("a", limit=3),
+                             self.task_manager.search_tasks("a")[:3])
+            self.assertEqual(self.task_manager.get_all_categories(),
+                             memory_manager.get_all_categories())
+            
+            now = datetime(2024, 1, 10, 12)
+            self.assertEqual(ids(self.task_manager.get_overdue_tasks(now)),
+                             ids(memory_manager.get_overdue_tasks(now)))
+            self.assertEqual(ids(self.task_manager.get_tasks_due_between("2024-01-05", "2024-01-10")),
+                             ids(memory_manager.get_tasks_due_between("2024-01-05", "2024-01-10")))
+            self.assertEqual(ids(self.task_manager.next_due(3, datetime(2024, 1, 6))),
+                             ids(memory_manager.next_due(3, datetime(2024, 1, 6))))
+            
+            pages = [ids(self.task_manager.iter_tasks(offset=offset, limit=7))
+                     for offset in range(0, 63, 7)]
+            self.assertEqual(sum(pages, []), ids(memory_manager.get_all_tasks()))
+            self.assertEqual(ids(self.task_manager.top_tasks(5)), ids(memory_manager.top_tasks(5)))
+            
+            query = (Priority(1, 3) & ~Completed()) | Text("apple")
+            self.assertIn("Full scan", self.task_manager.query(query).explain())
+            self.assertEqual(ids(self.task_manager.query(query).order_by("priority").all()),
+                             ids(memory_manager.query(query).order_by("priority").all()))
+        finally:
+            remove_files("test_sqlite_compare.json")
+
+
+class TestTaskJournal(unittest.TestCase):
+    """Tests for journaled persistence in the TaskManager."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_journal_tasks.json"
+        self.task_manager = TaskManager(self.test_file, compact_threshold=5)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_mutations_append_to_journal(self):
+        """Test that mutations are journaled instead of rewriting the snapshot."""
+        task_id = self.task_manager.add_task("Task 1", "Description 1", 1)
+        self.task_manager.mark_task_completed(task_id)
+        
+        self.assertFalse(os.path.exists(self.test_file))
+        self.assertEqual(self.task_manager.journal.count, 2)
+    
+    def test_load_replays_journal(self):
+        """Test that loading applies journaled changes on top of the snapshot."""
+        id1 = self.task_manager.add_task("Task 1", "Description 1", 1)
+        self.task_manager.save_tasks()  # Snapshot contains Task 1 only
+        
+        id2 = self.task_manager.add_task("Task 2", "Description 2", 2, categories=["work"])
+        self.task_manager.mark_task_completed(id1)
+        self.task_manager.add_category_to_task(id1, "home")
+        self.task_manager.remove_category_from_task(id2, "work")
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        
+        self.assertEqual(set(reloaded.tasks), {id1, id2})
+        self.assertTrue(reloaded.get_task(id1).completed)
+        self.assertEqual(reloaded.get_task(id1).categories, ["home"])
+        self.assertEqual(reloaded.get_task(id2).categories, [])
+        
+        # Deleting is journaled too
+        self.task_manager.delete_task(id2)
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(set(reloaded.tasks), {id1})
+    
+    def test_compaction(self):
+        """Test that the journal is folded into the snapshot past the threshold."""
+        for i in range(5):
+            self.task_manager.add_task(f"Task {i}", "Description")
+        
+        self.assertTrue(os.path.exists(self.test_file))
+        self.assertFalse(os.path.exists(self.test_file + ".journal"))
+        self.assertEqual(self.task_manager.journal.count, 0)
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(len(reloaded.tasks), 5)
+    
+    def test_torn_journal_line_is_ignored(self):
+        """Test that a partially written journal record does not break loading."""
+        task_id = self.task_manager.add_task("Task 1", "Description 1")
+        with open(self.test_file + ".journal", 'a') as f:
+            f.write('{"op":"delete","id":"')
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertIn(task_id, reloaded.tasks)
+    
+    def test_append_after_torn_journal_line(self):
+        """Test that records appended after a torn journal line survive a reload."""
+        id_a = self.task_manager.add_task("Task A", "Description A")
+        with open(self.test_file + ".journal", 'a') as f:
+            f.write('{"op":"delete","id":"')
+        
+        reopened = TaskManager(self.test_file, compact_threshold=5)
+        reopened.load_tasks()
+        id_b = reopened.add_task("Task B", "Description B")
+        id_c = reopened.add_task("Task C", "Description C")
+        self.assertEqual(reopened.journal.offset, os.path.getsize(self.test_file + ".journal"))
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(set(reloaded.tasks), {id_a, id_b, id_c})
+    
+    def test_damaged_journal_line_is_kept(self):
+        """Test that loading stops at a damaged complete record without deleting the rest."""
+        ids = [self.task_manager.add_task(f"Task {i}", "Description") for i in range(3)]
+        journal_path = self.test_file + ".journal"
+        with open(journal_path, 'rb') as f:
+            lines = f.readlines()
+        lines[1] = b'{"op":"add",\n'
+        with open(journal_path, 'wb') as f:
+            f.writelines(lines)
+        
+        reloaded = TaskManager(self.test_file)
+        with mock.patch("sys.stdout", io.StringIO()) as stdout:
+            reloaded.load_tasks()
+            reloaded.load_tasks()
+        self.assertEqual(list(reloaded.tasks), ids[:1])
+        self.assertEqual(stdout.getvalue().count("Error reading journal"), 1)
+        with open(journal_path, 'rb') as f:
+            self.assertEqual(f.readlines(), lines)
+    
+    def test_save_only_encodes_changed_tasks(self):
+        """Test that snapshots reuse the encoding of unchanged tasks and match json.dumps."""
+        def expected():
+            entries = {task_id: task.to_dict() for task_id, task in self.task_manager.tasks.items()}
+            return json.dumps(entries, indent=4).encode('utf-8')
+        
+        with self.task_manager.batch():
+            ids = [self.task_manager.add_task(f"Tâsk \"{n}\"", "Line 1\nLine 2", n % 5 + 1,
+                                              "2024-01-31" if n % 2 else None, ["work"][:n % 2])
+                   for n in range(20)]
+        self.task_manager.save_tasks()
+        fragments = self.task_manager.storage.fragments
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(f.read(), expected())
+        
+        self.task_manager.save_tasks()
+        self.assertEqual(fragments.encoded_count, 0)
+        
+        self.task_manager.mark_task_completed(ids[0])
+        self.task_manager.get_task(ids[1]).priority = 1  # Changed on the Task itself
+        self.task_manager.get_task(ids[2]).created_at = datetime(2020, 1, 1)
+        self.task_manager.delete_task(ids[3])
+        self.task_manager.save_tasks()
+        self.assertEqual(fragments.encoded_count, 3)
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(f.read(), expected())
+        
+        # Lazily loaded tasks are written back without creating Task objects
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks(mode="lazy")
+        reloaded.save_tasks()
+        reloaded.save_tasks()
+        self.assertEqual(reloaded.storage.fragments.encoded_count, 0)
+        self.assertEqual(reloaded.tasks.hydrated_count(), 0)
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(f.read(), expected())
+        
+        self.task_manager.delete_tasks(list(self.task_manager.tasks))
+        self.task_manager.save_tasks()
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(f.read(), b"{}")
+
+
+class TestBatch(unittest.TestCase):
+    """Tests for batched mutations in the TaskManager."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_batch_tasks.json"
+        self.task_manager = TaskManager(self.test_file)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_batch_persists_once(self):
+        """Test that a batch is written to the journal in one go on exit."""
+        with self.task_manager.batch():
+            id1 = self.task_manager.add_task("Task 1", "Description 1")
+            self.task_manager.mark_task_completed(id1)
+            self.assertEqual(self.task_manager.journal.count, 0)
+        
+        self.assertEqual(self.task_manager.journal.count, 2)
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertTrue(reloaded.get_task(id1).completed)
+    
+    def test_batch_rolls_back_on_error(self):
+        """Test that a failing batch leaves no trace in memory or on disk."""
+        keep_id = self.task_manager.add_task("Keep", "Description", categories=["work"])
+        
+        with self.assertRaises(ValueError):
+            with self.task_manager.batch():
+                self.task_manager.add_task("New", "Description")
+                self.task_manager.mark_task_completed(keep_id)
+                self.task_manager.remove_category_from_task(keep_id, "work")
+                self.task_manager.delete_task(keep_id)
+                self.task_manager.add_task("", "Invalid task")
+        
+        self.assertEqual(list(self.task_manager.tasks), [keep_id])
+        task = self.task_manager.get_task(keep_id)
+        self.assertFalse(task.completed)
+        self.assertEqual(task.categories, ["work"])
+        self.assertEqual(self.task_manager.journal.count, 1)
+    
+    def test_failed_write_rolls_back(self):
+        """Test that changes the storage fails to write are undone in memory."""
+        keep_id = self.task_manager.add_task("Keep", "Description", categories=["work"])
+        journal = self.task_manager.journal
+        failing = mock.patch.object(journal, 'append_many', side_effect=OSError("disk full"))
+        
+        with failing, self.assertRaises(OSError):
+            with self.task_manager.batch():
+                self.task_manager.add_task("New", "Description")
+                self.task_manager.mark_task_completed(keep_id)
+                self.task_manager.remove_category_from_task(keep_id, "work")
+        
+        with failing:
+            with self.assertRaises(OSError):
+                self.task_manager.add_task("New", "Description")
+            with self.assertRaises(OSError):
+                self.task_manager.mark_task_completed(keep_id)
+            with self.assertRaises(OSError):
+                self.task_manager.delete_task(keep_id)
+        
+        self.assertEqual(list(self.task_manager.tasks), [keep_id])
+        task = self.task_manager.get_task(keep_id)
+        self.assertFalse(task.completed)
+        self.assertEqual(task.categories, ["work"])
+        self.assertEqual(self.task_manager.get_tasks_by_category("work"), [task])
+        self.assertEqual(self.task_manager.search_tasks("New"), [])
+        
+        # The manager keeps working once the storage does
+        self.task_manager.mark_task_completed(keep_id)
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(list(reloaded.tasks), [keep_id])
+        self.assertTrue(reloaded.get_task(keep_id).completed)
+    
+    def test_add_tasks(self):
+        """Test adding several tasks at once."""
+        ids = self.task_manager.add_tasks([
+            {'title': "Task 1", 'description': "Description 1", 'priority': 1},
+            {'title': "Task 2", 'description': "Description 2", 'categories': ["work"]},
+        ])
+        
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.task_manager.get_task(ids[1]).categories, ["work"])
+        
+        # An invalid entry means nothing is added
+        with self.assertRaises(ValueError):
+            self.task_manager.add_tasks([
+                {'title': "Task 3", 'description': "Description 3"},
+                {'title': "Task 4", 'description': "Description 4", 'priority': 9},
+            ])
+        self.assertEqual(len(self.task_manager.tasks), 2)
+    
+    def test_complete_and_delete_tasks(self):
+        """Test completing and deleting several tasks at once."""
+        ids = self.task_manager.add_tasks(
+            {'title': f"Task {i}", 'description': "Description"} for i in range(4)
+        )
+        
+        self.assertEqual(self.task_manager.complete_tasks(ids[:2]), 2)
+        self.assertTrue(all(self.task_manager.get_task(i).completed for i in ids[:2]))
+        
+        # Unknown IDs fail the whole call
+        with self.assertRaises(KeyError):
+            self.task_manager.delete_tasks([ids[2], "missing"])
+        self.assertIn(ids[2], self.task_manager.tasks)
+        
+        self.assertEqual(self.task_manager.delete_tasks(ids[2:]), 2)
+        self.assertEqual(set(self.task_manager.tasks), set(ids[:2]))
+
+
+class TestTaskIndex(unittest.TestCase):
+    """Tests for the secondary indexes kept by the TaskManager."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_index_tasks.json"
+        self.task_manager = TaskManager(self.test_file)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_direct_task_changes_update_indexes(self):
+        """Test that changing a Task directly keeps the indexes in sync."""
+        task_id = self.task_manager.add_task("Task", "Description", 2, categories=["work"])
+        task = self.task_manager.get_task(task_id)
+        
+        task.add_category("home")
+        task.remove_category("work")
+        task.priority = 4
+        task.mark_completed()
+        
+        self.assertEqual(self.task_manager.get_tasks_by_category("home"), [task])
+        self.assertEqual(self.task_manager.get_tasks_by_category("work"), [])
+        self.assertEqual(self.task_manager.get_tasks_by_priority(4), [task])
+        self.assertEqual(self.task_manager.get_all_categories(), ["home"])
+        self.assertEqual(self.task_manager.check_indexes(), [])
+        
+        # A deleted task no longer affects the indexes
+        self.task_manager.delete_task(task_id)
+        task.add_category("stale")
+        self.assertEqual(self.task_manager.get_all_categories(), [])
+    
+    def test_get_all_tasks_order(self):
+        """Test that open tasks come first, each group ordered by priority."""
+        id1 = self.task_manager.add_task("Task 1", "Description", 3)
+        id2 = self.task_manager.add_task("Task 2", "Description", 1)
+        id3 = self.task_manager.add_task("Task 3", "Description", 2)
+        id4 = self.task_manager.add_task("Task 4", "Description", 1)
+        self.task_manager.mark_task_completed(id2)
+        
+        ids = [task.id for task in self.task_manager.get_all_tasks()]
+        self.assertEqual(ids, [id4, id3, id1, id2])
+    
+    def test_pages_and_top_tasks(self):
+        """Test paging through the tasks and picking the highest priority open tasks."""
+        rng = random.Random(5)
+        for i in range(50):
+            self.task_manager.add_task(f"Task {i}", "Description", rng.randint(1, 5),
+                                       rng.choice([None, "2024-01-05", "2024-02-01"]))
+        ids = list(self.task_manager.tasks)
+        for task_id in ids[::3]:
+            self.task_manager.mark_task_completed(task_id)
+        self.task_manager.get_task(ids[1]).priority = 5
+        self.task_manager.get_task(ids[3]).completed = False
+        
+        all_tasks = self.task_manager.get_all_tasks()
+        pages = [list(self.task_manager.iter_tasks(offset=offset, limit=8))
+                 for offset in range(0, 56, 8)]
+        self.assertEqual(sum(pages, []), all_tasks)
+        self.assertEqual(list(self.task_manager.iter_tasks(offset=45)), all_tasks[45:])
+        
+        open_tasks = [task for task in all_tasks if not task.completed]
+        self.assertEqual(self.task_manager.top_tasks(5), open_tasks[:5])
+        self.assertEqual(self.task_manager.top_tasks(100), open_tasks)
+        
+        by_title = sorted(all_tasks, key=lambda task: task.title.lower())
+        self.assertEqual(list(self.task_manager.iter_tasks("title", 10, 5)), by_title[10:15])
+        with self.assertRaises(ValueError):
+            self.task_manager.iter_tasks("colour")
+        self.assertEqual(self.task_manager.check_indexes(), [])
+    
+    def test_due_date_queries(self):
+        """Test overdue, due between and next due queries."""
+        id1 = self.task_manager.add_task("Task 1", "Description", 1, "2024-01-10")
+        id2 = self.task_manager.add_task("Task 2", "Description", 1, "2024-01-05")
+        id3 = self.task_manager.add_task("Task 3", "Description", 1, "2024-01-20")
+        id4 = self.task_manager.add_task("Task 4", "Description", 1, "2024-01-05")
+        self.task_manager.add_task("Task 5", "Description", 1)  # No due date
+        
+        def ids(tasks):
+            return [task.id for task in tasks]
+        
+        now = datetime(2024, 1, 10, 12)
+        # Tasks due on the same day are ordered by ID
+        self.assertEqual(ids(self.task_manager.get_overdue_tasks(now)),
+                         sorted([id2, id4]) + [id1])
+        self.assertEqual(ids(self.task_manager.get_tasks_due_between("2024-01-06", "2024-01-20")),
+                         [id1, id3])
+        self.assertEqual(ids(self.task_manager.get_tasks_due_between(
+            datetime(2024, 1, 10), datetime(2024, 1, 19))), [id1])
+        self.assertEqual(ids(self.task_manager.next_due(1, now)), [id3])
+        self.assertEqual(ids(self.task_manager.next_due(5, datetime(2024, 1, 6))), [id1, id3])
+        
+        # Completed tasks are neither overdue nor due, and due date changes move tasks
+        self.task_manager.mark_task_completed(id2)
+        self.task_manager.get_task(id3).due_date = datetime(2024, 1, 1)
+        self.assertEqual(ids(self.task_manager.get_overdue_tasks(now)), [id3, id4, id1])
+        self.assertEqual(self.task_manager.next_due(3, now), [])
+        self.assertEqual(self.task_manager.check_indexes(), [])
+    
+    def test_render_uses_given_time(self):
+        """Test that rendering checks for overdue tasks against the given time."""
+        task = Task("Task", "Description", due_date="2024-01-10")
+        self.assertIn("OVERDUE", task.render(datetime(2024, 1, 11)))
+        self.assertNotIn("OVERDUE", task.render(datetime(2024, 1, 9)))
+        self.assertFalse(task.is_overdue(datetime(2024, 1, 10)))
+        self.assertIn("OVERDUE", str(task))
+    
+    def test_random_mutations_keep_indexes_consistent(self):
+        """Test index consistency under a random mix of mutations."""
+        rng = random.Random(42)
+        categories = ["work", "home", "urgent", "later"]
+        self.task_manager.index  # Build the indexes before mutating
+        
+        for step in range(300):
+            ids = list(self.task_manager.tasks)
+            action = rng.random()
+            if action < 0.4 or not ids:
+                self.task_manager.add_task(
+                    f"Task {step}", "Description", rng.randint(1, 5),
+                    rng.choice([None, "2024-01-01", "2024-01-02", "2024-03-01"]),
+                    categories=rng.sample(categories, rng.randint(0, 2))
+                )
+            elif action < 0.45:
+                self.task_manager.get_task(rng.choice(ids)).due_date = rng.choice(
+                    [None, datetime(2024, 1, 2), datetime(2024, 2, 1)])
+            elif action < 0.5:
+                self.task_manager.get_task(rng.choice(ids)).priority = rng.randint(1, 5)
+            elif action < 0.55:
+                self.task_manager.mark_task_completed(rng.choice(ids))
+            elif action < 0.7:
+                self.task_manager.delete_task(rng.choice(ids))
+            elif action < 0.85:
+                self.task_manager.add_category_to_task(rng.choice(ids), rng.choice(categories))
+            else:
+                self.task_manager.remove_category_from_task(rng.choice(ids), rng.choice(categories))
+            
+            if step == 150:
+                # Rolled back batches must leave the indexes untouched
+                with self.assertRaises(ValueError):
+                    with self.task_manager.batch():
+                        self.task_manager.delete_tasks(ids[:3])
+                        self.task_manager.add_task("", "Invalid")
+        
+        self.assertEqual(self.task_manager.check_indexes(), [])
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(reloaded.check_indexes(), [])
+        self.assertEqual(reloaded.get_all_categories(), self.task_manager.get_all_categories())
+
+
+class TestQuery(unittest.TestCase):
+    """Tests for composable queries and the query planner."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_query_tasks.json"
+        self.task_manager = TaskManager(self.test_file)
+        rng = random.Random(7)
+        words = ["apple", "report", "meeting", "budget"]
+        for i in range(200):
+            self.task_manager.add_task(
+                f"{rng.choice(words)} {i}", rng.choice(words), rng.randint(1, 5),
+                rng.choice([None, "2024-01-05", "2024-01-10", "2024-02-01"]),
+                categories=rng.sample(["work", "home", "rare"] if i % 20 == 0 else ["work", "home"],
+                                      rng.randint(0, 2))
+            )
+        for task_id in rng.sample(list(self.task_manager.tasks), 60):
+            self.task_manager.mark_task_completed(task_id)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_matches_brute_force(self):
+        """Test that planned queries return exactly the tasks matching the predicate."""
+        predicates = [
+            Priority(2),
+            Priority(1, 3) & Category("WORK"),
+            Category("home") | Completed(),
+            ~Completed() & Text("report"),
+            DueBetween("2024-01-05", "2024-01-10") & ~Category("work"),
+            (Priority(5) | Category("rare")) & ~(Text("apple") | Completed()),
+            Text("budget") | DueBetween(end="2024-01-05"),
+        ]
+        for search_engine in (False, True):
+            self.task_manager.use_search_engine = search_engine
+            for predicate in predicates:
+                expected = [task for task in self.task_manager.tasks.values()
+                            if predicate.matches(task)]
+                actual = self.task_manager.query(predicate).all()
+                self.assertEqual(len(actual), len(set(task.id for task in actual)))
+                self.assertEqual(set(task.id for task in actual),
+                                 set(task.id for task in expected), str(predicate))
+    
+    def test_order_limit_offset(self):
+        """Test sorting and paging of query results."""
+        query = self.task_manager.query(~Completed()).order_by("due_date")
+        tasks = [task for task in self.task_manager.tasks.values() if not task.completed]
+        expected = sorted(tasks, key=lambda task: (task.due_date is None, task.due_date or 0))
+        self.assertEqual(query.all(), expected)
+        self.assertEqual(query.offset(10).limit(5).all(), expected[10:15])
+        self.assertEqual(query.limit(3).all(), expected[:3])
+        self.assertEqual(query.count(), len(expected))
+        
+        titles = [task.title.lower() for task in
+                  self.task_manager.query().order_by("title", descending=True)]
+        self.assertEqual(titles, sorted(titles, reverse=True))
+        self.assertIsNone(self.task_manager.query(Category("none")).first())
+        with self.assertRaises(ValueError):
+            self.task_manager.query().order_by("colour")
+    
+    def test_explain_picks_most_selective_index(self):
+        """Test that the planner drives the query from the smallest index."""
+        plan = self.task_manager.query(Priority(1, 5) & Category("rare") & Text("a")).explain()
+        self.assertIn("Category index scan: category = 'rare'", plan)
+        self.assertIn("Filter: (priority between 1 and 5 AND text contains 'a')", plan)
+        
+        plan = self.task_manager.query(DueBetween(end="2024-01-10")).order_by("due_date").explain()
+        self.assertIn("Sort by due_date (provided by the index)", plan)
+        self.assertIn("Due date index range scan", plan)
+        self.assertNotIn("Filter", plan)
+        
+        plan = self.task_manager.query(Category("rare") | Text("apple")).explain()
+        self.assertIn("Full scan (est. 200 tasks)", plan)
+    
+    def test_evaluation_is_lazy(self):
+        """Test that a limited query stops testing tasks once it has enough."""
+        class Counting(Predicate):
+            calls = 0
+            
+            def matches(self, task):
+                Counting.calls += 1
+                return True
+        
+        tasks = self.task_manager.query(Counting()).limit(3).all()
+        self.assertEqual(len(tasks), 3)
+        self.assertEqual(Counting.calls, 3)
+    
+    def test_changes_while_iterating(self):
+        """Test that the tasks can be changed while iterating over a query."""
+        manager = self.task_manager
+        open_ids = [task.id for task in manager.tasks.values() if not task.completed]
+        for task in manager.query(~Completed()):
+            manager.mark_task_completed(task.id)
+        self.assertEqual(manager.query(~Completed()).count(), 0)
+        
+        self.assertGreater(manager.query(Category("work")).count(), 0)
+        for task in manager.query(Category("work")):
+            manager.remove_category_from_task(task.id, "work")
+        self.assertEqual(manager.query(Category("work")).count(), 0)
+        
+        for task_id in open_ids:
+            manager.get_task(task_id).completed = False
+        due = DueBetween("2024-01-05", "2024-02-01")
+        expected = [task.id for task in manager.query(due)]
+        self.assertTrue(expected)
+        deleted = []
+        for task in manager.query(due):
+            manager.delete_task(task.id)
+            deleted.append(task.id)
+        self.assertEqual(deleted, expected)
+        self.assertEqual(manager.query(due).count(), 0)
+
+
+class TestSearchEngine(unittest.TestCase):
+    """Tests for the inverted-index search engine."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_search_tasks.json"
+        self.task_manager = TaskManager(self.test_file, search_engine=True)
+        self.plain_manager = TaskManager(self.test_file)  # Scans every task
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def _add(self, *args, **kwargs):
+        """Add the same task to both managers."""
+        task_id = self.task_manager.add_task(*args, **kwargs)
+        self.plain_manager._insert(Task.from_dict(self.task_manager.get_task(task_id).to_dict()))
+        return task_id
+    
+    def test_matches_plain_substring_search(self):
+        """Test that the engine returns the same tasks as a full scan."""
+        rng = random.Random(7)
+        words = ["apple", "banana", "cherry", "Report", "review", "ab", "x"]
+        for i in range(200):
+            self._add(
+                " ".join(rng.sample(words, 2)), " ".join(rng.sample(words, 3)),
+                rng.randint(1, 5), categories=rng.sample(["work", "home", "fruit"], 1)
+            )
+        
+        for query in ["", "a", "ap", "app", "apple", "PPL", "e re", "rev", "work",
+                      "ome", "zzz", "x", "banana cherry"]:
+            expected = {task.id for task in self.plain_manager.search_tasks(query)}
+            actual = [task.id for task in self.task_manager.search_tasks(query)]
+            self.assertEqual(len(actual), len(set(actual)))
+            self.assertEqual(set(actual), expected, query)
+    
+    def test_ranking_and_limit(self):
+        """Test that title matches rank first and the limit is respected."""
+        desc_id = self._add("Groceries", "Buy milk")
+        title_id = self._add("Milk the cow", "Farm chores")
+        partial_id = self._add("Buttermilk pancakes", "Breakfast")
+        
+        results = [task.id for task in self.task_manager.search_tasks("milk")]
+        self.assertEqual(results, [title_id, partial_id, desc_id])
+        
+        top = self.task_manager.search_tasks("milk", limit=1)
+        self.assertEqual([task.id for task in top], [title_id])
+    
+    def test_incremental_updates(self):
+        """Test that adds, edits and deletes are reflected in searches."""
+        task_id = self._add("Write report", "Quarterly numbers")
+        self.assertEqual(len(self.task_manager.search_tasks("report")), 1)
+        
+        task = self.task_manager.get_task(task_id)
+        task.title = "Write summary"
+        self.assertEqual(self.task_manager.search_tasks("report"), [])
+        self.assertEqual(self.task_manager.search_tasks("summ"), [task])
+        
+        self.task_manager.add_category_to_task(task_id, "finance")
+        self.assertEqual(self.task_manager.search_tasks("finan"), [task])
+        
+        self.task_manager.delete_task(task_id)
+        self.assertEqual(self.task_manager.search_tasks("summ"), [])
+
+
+class TestParallelScan(unittest.TestCase):
+    """Tests for full scans on worker processes."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_parallel_tasks.json"
+        self.task_manager = TaskManager(self.test_file, parallel=3, parallel_threshold=0)
+        self.plain_manager = TaskManager(self.test_file)  # Scans serially
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.task_manager.close()
+        remove_files(self.test_file)
+    
+    def _add(self, *args, **kwargs):
+        """Add the same task to both managers."""
+        task_id = self.task_manager.add_task(*args, **kwargs)
+        self.plain_manager._insert(Task.from_dict(self.task_manager.get_task(task_id).to_dict()))
+        return task_id
+    
+    def _assert_same_results(self):
+        """Check that both managers find the same tasks in the same order."""
+        for query in ["", "a", "report", "rev", "work", "zzz"]:
+            for limit in (None, 3):
+                expected = [task.id for task in self.plain_manager.search_tasks(query, limit)]
+                actual = [task.id for task in self.task_manager.search_tasks(query, limit)]
+                self.assertEqual(actual, expected, (query, limit))
+        
+        predicate = Text("re") & ~Completed()
+        self.assertEqual([task.id for task in self.task_manager.query(predicate).limit(5)],
+                         [task.id for task in self.plain_manager.query(predicate).limit(5)])
+    
+    def test_matches_serial_scan_through_changes(self):
+        """Test that parallel results match a serial scan as tasks change."""
+        rng = random.Random(3)
+        words = ["apple", "report", "review", "banana", "plan"]
+        ids = [self._add(" ".join(rng.sample(words, 2)), rng.choice(words),
+                         categories=[rng.choice(["work", "home"])]) for _ in range(40)]
+        self._assert_same_results()
+        
+        # Changes reach the workers with the next scan
+        for manager in (self.task_manager, self.plain_manager):
+            manager.get_task(ids[0]).title = "zzz at the start"
+            manager.mark_task_completed(ids[1])
+            manager.delete_task(ids[2])
+            manager._insert(manager.get_task(ids[3]))  # Moves to the end
+        self._add("A new report", "Appended")
+        self._assert_same_results()
+        self.assertEqual(self.task_manager._scanner.workers, 3)
+    
+    def test_small_stores_scan_serially(self):
+        """Test that no workers are started below the threshold."""
+        manager = TaskManager(self.test_file, parallel=2, parallel_threshold=100)
+        manager.add_task("Write report", "Quarterly numbers")
+        self.assertEqual(len(manager.search_tasks("report")), 1)
+        self.assertIsNone(manager.parallel_scan(Text("report")))
+        self.assertIsNone(manager._scanner._executors)
+        
+        with self.assertRaises(ValueError):
+            TaskManager(storage=SQLiteStorage(":memory:"), parallel=True)
+
+
+class TestAnalytics(unittest.TestCase):
+    """Tests for the columnar analytics view."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_analytics_tasks.json"
+        self.task_manager = TaskManager(self.test_file)
+        self.now = datetime(2024, 6, 1)
+        rng = random.Random(5)
+        for i in range(60):
+            due = f"2024-{rng.randint(4, 8):02d}-{rng.randint(1, 28):02d}" if i % 3 else None
+            self.task_manager.add_task(f"Task {i}", "", rng.randint(1, 5), due,
+                                       rng.sample(["work", "home", "later"], rng.randint(0, 2)))
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def _check(self, uses_numpy):
+        """Compare the view with counts computed from the Task objects."""
+        tasks = list(self.task_manager.tasks.values())
+        open_tasks = [task for task in tasks if not task.completed]
+        overdue = [task for task in open_tasks if task.is_overdue(self.now)]
+        work = [task for task in tasks if "work" in task.categories]
+        view = self.task_manager.analytics()
+        view.uses_numpy = uses_numpy
+        self.assertEqual(view.count(), len(tasks))
+        self.assertEqual(view.group_count("priority"),
+                         dict(sorted(Counter(task.priority for task in tasks).items())))
+        self.assertEqual(view.group_count("category"), dict(sorted(Counter(
+            category for task in tasks for category in task.categories).items())))
+        self.assertEqual(view.group_count("status", where={'category': "work"}),
+                         {key: value for key, value in (
+                             ('open', sum(not task.completed for task in work)),
+                             ('completed', sum(task.completed for task in work))) if value})
+        self.assertEqual(view.count({'priority': 1, 'completed': False}),
+                         sum(task.priority == 1 for task in open_tasks))
+        self.assertEqual(view.overdue_count(now=self.now), len(overdue))
+        self.assertAlmostEqual(view.overdue_rate(now=self.now),
+                               len(overdue) / len(open_tasks))
+        
+        edges = [-30, 0, 30]
+        due_in = [(task.due_date - self.now).total_seconds() / 86400
+                  for task in tasks if task.due_date]
+        self.assertEqual(view.histogram("due_in", edges, now=self.now),
+                         [sum(bisect_right(edges, days) == bucket for days in due_in)
+                          for bucket in range(4)])
+        self.assertEqual(view.count({'category': "missing"}), 0)
+    
+    def _check_changes(self, uses_numpy):
+        """Check the view, change the tasks in every way, and check it again."""
+        self._check(uses_numpy)
+        view = self.task_manager.analytics()
+        
+        ids = list(self.task_manager.tasks)
+        self.task_manager.mark_task_completed(ids[0])
+        self.task_manager.get_task(ids[1]).priority = 5
+        self.task_manager.add_category_to_task(ids[2], "Urgent")
+        self.task_manager.remove_category_from_task(ids[3], "work")
+        self.task_manager.get_task(ids[4]).due_date = datetime(2024, 5, 1)
+        self.task_manager.delete_tasks(ids[5:10])
+        self.task_manager.add_task("New", "", 2, "2024-05-30", ["work"])
+        self._check(uses_numpy)
+        self.assertIs(self.task_manager.analytics(), view)  # Refreshed, not rebuilt
+        self.assertEqual(len(view._live), 60)  # The new task reused a free row
+    
+    def _check_histogram_and_errors(self, uses_numpy):
+        """Check age buckets and the errors for unknown columns and groups."""
+        view = analytics.ColumnarView()
+        view.uses_numpy = uses_numpy
+        self.assertEqual(view.count(), 0)
+        self.assertEqual(view.overdue_rate(), 0.0)
+        self.assertEqual(view.histogram("age", [1, 7]), [0, 0, 0])
+        
+        for task in self.task_manager.tasks.values():
+            task.created_at = self.now
+        view = analytics.ColumnarView(self.task_manager.tasks)
+        view.uses_numpy = uses_numpy
+        self.assertEqual(view.histogram("age", [1, 7], now=datetime(2024, 6, 3)), [0, 60, 0])
+        with self.assertRaises(ValueError):
+            view.histogram("title", [1])
+        with self.assertRaises(ValueError):
+            view.histogram("age", [7, 1])
+        with self.assertRaises(ValueError):
+            view.group_count("title")
+        with self.assertRaises(ValueError):
+            view.count({'title': "x"})
+    
+    def test_matches_task_loops_through_changes(self):
+        """Test that the view matches the tasks and follows every kind of change."""
+        self._check_changes(uses_numpy=False)
+    
+    @unittest.skipUnless(analytics.numpy is not None, "NumPy is not installed")
+    def test_matches_task_loops_through_changes_numpy(self):
+        """Test the NumPy backend against the tasks through every kind of change."""
+        self._check_changes(uses_numpy=True)
+    
+    def test_histogram_and_errors(self):
+        """Test age buckets and the errors for unknown columns and groups."""
+        self._check_histogram_and_errors(uses_numpy=False)
+    
+    @unittest.skipUnless(analytics.numpy is not None, "NumPy is not installed")
+    def test_histogram_and_errors_numpy(self):
+        """Test age buckets and errors with the NumPy backend."""
+        self._check_histogram_and_errors(uses_numpy=True)
+
+
+class TestLoader(unittest.TestCase):
+    """Tests for the streaming and lazy load modes."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_loader_tasks.json"
+        self.task_manager = TaskManager(self.test_file)
+        self.ids = self.task_manager.add_tasks(
+            {'title': f"Task {i}", 'description': f"Description {i}", 'priority': i % 5 + 1,
+             'due_date': "2030-01-0%d" % (i % 9 + 1), 'categories': ["work"] if i % 2 else []}
+            for i in range(50)
+        )
+        self.task_manager.save_tasks()
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_iter_json_object(self):
+        """Test that the streaming parser matches json.loads for any chunk size."""
+        data = {"a": {"x": [1, 2.5, None, True], "y": "tricky \"}, ,"},
+                "b": 12345678, "c": [], "": {"nested": {"deep": "é"}}}
+        text = json.dumps(data, indent=4)
+        
+        for chunk_size in (1, 2, 3, 7, 64, 4096):
+            parsed = dict(iter_json_object(io.StringIO(text), chunk_size))
+            self.assertEqual(parsed, data)
+        
+        self.assertEqual(dict(iter_json_object(io.StringIO(" { } "))), {})
+        for invalid in ('[1, 2]', '{"a": 1,}', '{"a" 1}', '{"a": 1'):
+            with self.assertRaises(json.JSONDecodeError):
+                dict(iter_json_object(io.StringIO(invalid), 2))
+    
+    def test_stream_mode(self):
+        """Test that streaming load gives the same tasks as an eager load."""
+        eager = TaskManager(self.test_file)
+        eager.load_tasks()
+        stream = TaskManager(self.test_file)
+        stream.load_tasks(mode="stream")
+        
+        self.assertEqual(list(stream.tasks), list(eager.tasks))
+        for task_id, task in eager.tasks.items():
+            self.assertEqual(stream.tasks[task_id].to_dict(), task.to_dict())
+    
+    def test_lazy_mode(self):
+        """Test that lazy load only creates the Task objects that are used."""
+        self.task_manager.mark_task_completed(self.ids[0])  # Journaled
+        
+        lazy = TaskManager(self.test_file)
+        lazy.load_tasks(mode="lazy")
+        self.assertIsInstance(lazy.tasks, LazyTasks)
+        self.assertFalse(lazy.tasks.loaded)
+        
+        task = lazy.get_task(self.ids[3])
+        self.assertEqual(task.title, "Task 3")
+        self.assertEqual(lazy.tasks.hydrated_count(), 2)  # Task 3 and the journaled one
+        self.assertTrue(lazy.get_task(self.ids[0]).completed)
+        self.assertEqual(len(lazy.tasks), 50)
+        
+        # Saving writes untouched entries back as they were
+        lazy.save_tasks()
+        self.assertEqual(lazy.tasks.hydrated_count(), 2)
+        with open(self.test_file) as f:
+            saved = json.load(f)
+        self.assertEqual(saved, {task_id: t.to_dict() for task_id, t in self.task_manager.tasks.items()})
+        
+        # Queries and mutations still work
+        lazy.add_category_to_task(self.ids[3], "home")
+        self.assertEqual(lazy.get_tasks_by_category("home"), [task])
+        self.assertEqual(len(lazy.get_tasks_by_category("work")), 25)
+        self.assertEqual(lazy.check_indexes(), [])
+
+
+class TestBinaryFormat(unittest.TestCase):
+    """Tests for the binary snapshot format."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.json_file = "test_binary_tasks.json"
+        self.binary_file = "test_binary_tasks.bin"
+        self.task_manager = TaskManager(self.json_file, journal=False)
+        self.task_manager.add_tasks([
+            {'title': "Task 1", 'description': "Ünïcode ✓", 'priority': 1,
+             'due_date': "2023-12-31", 'categories': ["work", "urgent"]},
+            {'title': "Task 2", 'description': "", 'categories': ["work"]},
+            {'title': "Task 3", 'description': "Description 3", 'priority': 5},
+        ])
+        self.task_manager.mark_task_completed(list(self.task_manager.tasks)[1])
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.json_file, self.binary_file, "test_binary_roundtrip.json")
+    
+    def test_round_trip_through_json(self):
+        """Test that converting JSON to binary and back gives the same file."""
+        for compress in (False, True):
+            binary_format.json_to_binary(self.json_file, self.binary_file, compress)
+            self.assertTrue(binary_format.is_binary_snapshot(self.binary_file))
+            binary_format.binary_to_json(self.binary_file, "test_binary_roundtrip.json")
+            
+            with open(self.json_file, 'rb') as original, \
+                    open("test_binary_roundtrip.json", 'rb') as converted:
+                self.assertEqual(converted.read(), original.read())
+    
+    def test_task_manager_binary_storage(self):
+        """Test saving, journaling and loading with the binary format."""
+        manager = TaskManager(self.binary_file, snapshot_format="binary")
+        for task in self.task_manager.tasks.values():
+            manager._insert(Task.from_dict(task.to_dict()))
+        manager.save_tasks()
+        new_id = manager.add_task("Task 4", "Journaled", categories=["home"])
+        
+        reloaded = TaskManager(self.binary_file, snapshot_format="binary")
+        reloaded.load_tasks(mode="lazy")
+        self.assertEqual(list(reloaded.tasks), list(manager.tasks))
+        for task_id, task in manager.tasks.items():
+            self.assertEqual(reloaded.get_task(task_id).to_dict(), task.to_dict())
+        self.assertEqual(reloaded.get_tasks_by_category("home"), [reloaded.get_task(new_id)])
+    
+    def test_corrupt_snapshot(self):
+        """Test that damaged snapshots raise SnapshotFormatError."""
+        data = binary_format.encode_tasks(self.task_manager.tasks.values())
+        self.assertEqual(len(binary_format.decode_tasks(data)), 3)
+        
+        for damaged in (data[:-3], b"NOTASK" + data[6:], data[:6] + b"\x09" + data[7:]):
+            with self.assertRaises(binary_format.SnapshotFormatError):
+                binary_format.decode_tasks(damaged)
+
+
+class TestMmapSnapshot(unittest.TestCase):
+    """Tests for the memory-mapped read-only snapshot."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.json_file = "test_mmap_tasks.json"
+        self.snapshot_file = "test_mmap_tasks.tmm"
+        self.task_manager = TaskManager(self.json_file)
+        self.task_manager.add_tasks([
+            {'title': "Task 1", 'description': "Ünïcode ✓", 'priority': 1,
+             'due_date': "2023-12-31", 'categories': ["work", "urgent"]},
+            {'title': "Task 2", 'description': "", 'categories': ["work"]},
+            {'title': "Task 3", 'description': "Description 3", 'priority': 5},
+        ])
+        self.task_manager.mark_task_completed(list(self.task_manager.tasks)[1])
+        self.assertEqual(mmap_snapshot.build_snapshot(self.json_file, self.snapshot_file), 3)
+        self.reader = TaskManager(storage=mmap_snapshot.MappedStorage(self.snapshot_file))
+        self.reader.load_tasks()
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.reader.close()
+        remove_files(self.json_file, self.snapshot_file, "test_mmap_junk.tmm")
+    
+    def test_reads_match_the_source(self):
+        """Test that the mapped tasks read like the tasks they were built from."""
+        self.assertTrue(mmap_snapshot.is_mapped_snapshot(self.snapshot_file))
+        self.assertFalse(mmap_snapshot.is_mapped_snapshot(self.json_file))
+        self.assertEqual(list(self.reader.tasks), list(self.task_manager.tasks))
+        for task_id, task in self.task_manager.tasks.items():
+            mapped = self.reader.get_task(task_id)
+            self.assertEqual(mapped.to_dict(), task.to_dict())
+            self.assertEqual(mapped.render(), task.render())
+        
+        self.assertIsNone(self.reader.get_task("missing"))
+        self.assertEqual([task.title for task in self.reader.get_tasks_by_category("work")],
+                         ["Task 1", "Task 2"])
+        self.assertEqual([task.title for task in self.reader.get_tasks_by_priority(5)], ["Task 3"])
+        
+        # Fields are only decoded when they are read
+        first_id = list(self.task_manager.tasks)[0]
+        mapped = self.reader.tasks[first_id]
+        self.assertEqual(mapped.title, "Task 1")
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(mapped, '_description')
+    
+    def test_read_only(self):
+        """Test that mutations are refused and that loading again sees a rebuilt snapshot."""
+        task_id = list(self.task_manager.tasks)[0]
+        with self.assertRaises(PermissionError):
+            self.reader.add_task("Task 4", "Refused")
+        with self.assertRaises(PermissionError):
+            self.reader.mark_task_completed(task_id)
+        with self.assertRaises(AttributeError):
+            self.reader.get_task(task_id).title = "Changed"
+        self.assertFalse(self.reader.get_task(task_id).completed)
+        
+        copy = self.reader.get_task(task_id).copy()
+        copy.title = "Changed"
+        self.assertEqual(self.reader.get_task(task_id).title, "Task 1")
+        
+        self.task_manager.delete_task(task_id)
+        mmap_snapshot.build_snapshot(self.json_file, self.snapshot_file)
+        self.assertEqual(len(self.reader.tasks), 3)  # Still the snapshot it opened
+        self.reader.load_tasks()
+        self.assertEqual(len(self.reader.tasks), 2)
+        self.assertNotIn(task_id, self.reader.tasks)
+        
+        with open("test_mmap_junk.tmm", 'wb') as f:
+            f.write(b"x" * 100)
+        with self.assertRaises(binary_format.SnapshotFormatError):
+            mmap_snapshot.MappedSnapshot("test_mmap_junk.tmm")
+
+
+class TestCommandLine(unittest.TestCase):
+    """Tests for the non-interactive subcommands."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_cli_tasks.json"
+        self.other_file = "test_cli_other.json"
+        self.export_file = "test_cli_export"
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file, self.other_file, self.export_file)
+    
+    def run_cli(self, *args, file=None, stdin=""):
+        """Run a subcommand and return (exit status, stdout, stderr)."""
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err), \
+                mock.patch.object(sys, 'stdin', io.StringIO(stdin)):
+            status = cli.run(["--file", file or self.test_file, *args])
+        return status, out.getvalue(), err.getvalue()
+    
+    def test_add_list_complete_delete(self):
+        """Test the basic subcommands and their machine-readable output."""
+        status, out, _ = self.run_cli("add", "Report", "-p", "1", "--due", "2024-01-31",
+                                      "-c", "Work")
+        self.assertEqual(status, 0)
+        id1 = out.strip()
+        id2 = self.run_cli("add", "Shopping", "-d", "Milk")[1].strip()
+        
+        listed = [json.loads(line) for line in self.run_cli("list")[1].splitlines()]
+        self.assertEqual([entry['id'] for entry in listed], [id1, id2])
+        self.assertEqual(listed[0]['categories'], ["work"])
+        
+        self.assertEqual(self.run_cli("complete", id1)[0], 0)
+        out = self.run_cli("list", "--completed", "--format", "csv")[1]
+        self.assertEqual(out.splitlines()[0], ",".join(cli.CSV_FIELDS))
+        self.assertEqual(len(out.splitlines()), 2)
+        self.assertIn(id1, out)
+        
+        out = self.run_cli("search", "milk", "--format", "text")[1]
+        self.assertIn(f"[{id2}]", out)
+        
+        stats = json.loads(self.run_cli("stats")[1])
+        self.assertEqual(stats['by_status'], {'open': 1, 'completed': 1})
+        self.assertEqual(stats['by_category'], {'work': 1})
+        self.assertEqual(stats['open_age_days']['<1'], 1)
+        
+        # Unknown IDs fail without changing anything
+        status, _, err = self.run_cli("delete", id2, "missing")
+        self.assertEqual(status, cli.EXIT_FAILURE)
+        self.assertIn("missing", err)
+        self.assertEqual(self.run_cli("delete", id2)[0], 0)
+        self.assertEqual(self.run_cli("list", "--format", "text")[1].count("\n"), 1)
+        
+        status, _, err = self.run_cli("add", "Bad date", "--due", "2024-13-01")
+        self.assertEqual(status, cli.EXIT_FAILURE)
+    
+    def test_export_import_round_trip(self):
+        """Test that exported tasks import into another file unchanged."""
+        manager = TaskManager(self.test_file)
+        manager.add_task("Task, with comma", 'Quote " here', 2, "2024-02-01", ["a", "b"])
+        manager.add_task("Task 2", "Line\nbreak", 5)
+        manager.mark_task_completed(list(manager.tasks)[1])
+        expected = [task.to_dict() for task in manager.tasks.values()]
+        
+        for file_format in cli.FORMATS:
+            remove_files(self.other_file)
+            self.assertEqual(self.run_cli("export", self.export_file, "--format", file_format)[0], 0)
+            status, out, _ = self.run_cli("import", self.export_file, "--format", file_format,
+                                          file=self.other_file)
+            self.assertEqual((status, out.strip()), (0, "2"))
+            
+            imported = TaskManager(self.other_file)
+            imported.load_tasks()
+            self.assertEqual([task.to_dict() for task in imported.tasks.values()], expected)
+    
+    def test_import_is_one_write(self):
+        """Test that an import is persisted in a single write and is all or nothing."""
+        lines = [json.dumps({'title': f"Task {i}", 'priority': 1 + i % 5}) for i in range(50)]
+        storage = FileStorage(self.test_file)
+        manager = TaskManager(storage=storage)
+        journal = storage.journal
+        with mock.patch.object(journal, 'append_many', wraps=journal.append_many) as append:
+            self.assertEqual(manager.import_tasks(cli.read_entries(lines, "ndjson")), 50)
+        self.assertEqual(append.call_count, 1)
+        
+        # CSV with only some columns; an invalid row rolls back the whole import
+        rows = io.StringIO("title,priority,categories\nA,1,x;y\nB,9,\n")
+        with self.assertRaises(ValueError):
+            manager.import_tasks(cli.read_entries(rows, "csv"))
+        self.assertEqual(len(manager.tasks), 50)
+        
+        status, out, _ = self.run_cli("import", "--format", "csv",
+                                      stdin="title,categories\nC,X;Y\n")
+        self.assertEqual(status, 0)
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(len(reloaded.tasks), 51)
+        self.assertEqual(reloaded.get_tasks_by_category("y")[0].title, "C")
+    
+    def test_failed_import_keeps_replaced_task(self):
+        """Test that a failed import restores a task it replaced by ID."""
+        manager = TaskManager(self.test_file)
+        task_id = manager.add_task("Original", "Description", 1, categories=["work"])
+        with self.assertRaises(ValueError):
+            manager.import_tasks([{'id': task_id, 'title': "Imported", 'priority': 5},
+                                  {'title': ""}])
+        
+        self.assertEqual(manager.get_task(task_id).title, "Original")
+        self.assertEqual([task.id for task in manager.get_tasks_by_priority(1)], [task_id])
+        self.assertEqual(manager.get_tasks_by_priority(5), [])
+        self.assertEqual(manager.search_tasks("Imported"), [])
+        self.assertEqual(len(manager.search_tasks("Original")), 1)
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(reloaded.get_task(task_id).title, "Original")
+    
+    def test_clear_screen_does_not_start_a_shell(self):
+        """Test that clearing the screen writes an escape sequence instead of running a command."""
+        out = io.StringIO()
+        out.isatty = lambda: True
+        with mock.patch.object(sys, 'stdout', out), mock.patch("os.system") as system:
+            utils.clear_screen()
+        system.assert_not_called()
+        self.assertEqual(out.getvalue(), utils.CLEAR_SCREEN)
+
+
+class TestServer(unittest.TestCase):
+    """Tests for the HTTP API server."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_server_tasks.json"
+        self.task_manager = TaskManager(self.test_file, thread_safe=True)
+        self.server = TaskServer(("127.0.0.1", 0), self.task_manager)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.start()
+        self.connection = http.client.HTTPConnection(*self.server.server_address[:2])
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        self.connection.close()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.task_manager.close()
+        remove_files(self.test_file)
+    
+    def request(self, method, path, body=None, headers=None):
+        """Send a request on the kept-alive connection; returns (status, headers, decoded body)."""
+        self.connection.request(method, path, None if body is None else json.dumps(body),
+                                headers or {})
+        response = self.connection.getresponse()
+        data = response.read()
+        return response.status, response, json.loads(data) if data else None
+    
+    def test_crud_over_one_connection(self):
+        """Test adding, reading, changing and deleting tasks over a kept-alive connection."""
+        status, _, body = self.request("POST", "/tasks", {'title': "Report", 'priority': 1,
+                                                          'categories': ["work"]})
+        self.assertEqual(status, 201)
+        task_id = body['id']
+        
+        status, _, body = self.request("POST", "/tasks", [{'title': "A"}, {'title': "B"}])
+        self.assertEqual(status, 201)
+        self.assertEqual(len(body['ids']), 2)
+        
+        self.assertEqual(self.request("GET", f"/tasks/{task_id}")[2]['title'], "Report")
+        self.assertEqual(self.request("POST", f"/tasks/{task_id}/categories",
+                                      {'category': "Urgent"})[0], 200)
+        self.assertEqual(self.request("GET", "/categories")[2], ["urgent", "work"])
+        self.assertEqual(self.request("POST", f"/tasks/{task_id}/complete")[0], 200)
+        self.assertEqual(self.request("DELETE", f"/tasks/{task_id}/categories/work")[0], 200)
+        
+        listed = self.request("GET", "/tasks?status=open&order=title")[2]
+        self.assertEqual([entry['title'] for entry in listed], ["A", "B"])
+        self.assertEqual(self.request("GET", "/search?q=rep")[2][0]['id'], task_id)
+        
+        status, _, body = self.request("POST", "/tasks/delete", {'ids': body['ids']})
+        self.assertEqual((status, body), (200, {'count': 2}))
+        self.assertEqual(self.request("DELETE", f"/tasks/{task_id}")[0], 200)
+        self.assertEqual(self.request("GET", "/tasks")[2], [])
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(len(reloaded.tasks), 0)
+    
+    def test_errors(self):
+        """Test the status codes of bad requests."""
+        self.assertEqual(self.request("GET", "/tasks/missing")[0], 404)
+        self.assertEqual(self.request("GET", "/nothing")[0], 404)
+        self.assertEqual(self.request("POST", "/tasks", {'title': ""})[0], 400)
+        self.assertEqual(self.request("POST", "/tasks", {'title': "A", 'owner': "x"})[0], 400)
+        self.assertEqual(self.request("POST", "/tasks/complete", {'ids': ["missing"]})[0], 404)
+        self.assertEqual(self.request("GET", "/tasks?limit=ten")[0], 400)
+        
+        self.connection.request("POST", "/tasks", "{not json", {})
+        response = self.connection.getresponse()
+        response.read()
+        self.assertEqual(response.status, 400)
+        
+        # The connection is still usable after errors
+        self.assertEqual(self.request("GET", "/tasks")[0], 200)
+    
+    def test_task_field_types(self):
+        """Test that added tasks are rejected unless every field has the right type."""
+        for entry in ({'title': 123}, {'title': "A", 'description': None},
+                      {'title': "A", 'priority': "1"}, {'title': "A", 'priority': True},
+                      {'title': "A", 'categories': "work"}, {'title': "A", 'categories': [1]},
+                      {'title': "A", 'due_date': "2024-13-01"}, {'title': "A", 'due_date': 20240101}):
+            self.assertEqual(self.request("POST", "/tasks", entry)[0], 400, entry)
+            self.assertEqual(self.request("POST", "/tasks", [{'title': "B"}, entry])[0], 400, entry)
+        self.assertEqual(self.request("GET", "/tasks")[2], [])
+        
+        status, _, body = self.request("POST", "/tasks", {'title': "A", 'due_date': None,
+                                                          'categories': [" Work "]})
+        self.assertEqual(status, 201)
+        self.assertEqual(self.task_manager.get_task(body['id']).categories, ["work"])
+        self.assertEqual(self.request("GET", "/search?q=a")[0], 200)
+    
+    def test_unexpected_error_is_a_500(self):
+        """Test that an unexpected error is logged and answered with a JSON 500."""
+        stderr = io.StringIO()
+        with mock.patch.object(self.task_manager.storage, 'write',
+                               side_effect=PermissionError("read-only file")), \
+                mock.patch("sys.stderr", stderr):
+            status, _, body = self.request("POST", "/tasks", {'title': "Report"})
+        self.assertEqual((status, body), (500, {'error': "Internal server error"}))
+        self.assertIn("PermissionError: read-only file", stderr.getvalue())
+        
+        # The connection is still usable
+        self.assertEqual(self.request("GET", "/tasks")[0], 200)
+    
+    def test_etag_revalidation(self):
+        """Test that unchanged lists are answered with 304 Not Modified."""
+        task_id = self.task_manager.add_task("Task", "Description", categories=["work"])
+        status, response, _ = self.request("GET", "/tasks?category=work")
+        etag = response.getheader("ETag")
+        self.assertEqual(status, 200)
+        
+        status, response, body = self.request("GET", "/tasks?category=work",
+                                              headers={'If-None-Match': etag})
+        self.assertEqual((status, body), (304, None))
+        
+        # A change elsewhere does not change this list
+        self.task_manager.add_task("Other", "Description", categories=["home"])
+        status, _, _ = self.request("GET", "/tasks?category=work", headers={'If-None-Match': etag})
+        self.assertEqual(status, 304)
+        
+        self.task_manager.mark_task_completed(task_id)
+        status, response, body = self.request("GET", "/tasks?category=work",
+                                              headers={'If-None-Match': etag})
+        self.assertEqual(status, 200)
+        self.assertTrue(body[0]['completed'])
+        self.assertNotEqual(response.getheader("ETag"), etag)
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Tests for the opt-in call counters, latency histograms and byte counts."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_metrics_tasks.json"
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_calls_errors_and_bytes(self):
+        """Test that calls, failures and the bytes read and written are recorded."""
+        manager = TaskManager(self.test_file, instrument=True)
+        manager.load_tasks()
+        for n in range(5):
+            manager.add_task(f"Task {n}", "Description", categories=["work"])
+        with self.assertRaises(ValueError):
+            manager.add_task("", "No title")
+        manager.save_tasks()
+        
+        operations = manager.metrics.operations
+        self.assertEqual(operations['TaskManager.add_task'].calls, 6)
+        self.assertEqual(operations['TaskManager.add_task'].errors, 1)
+        self.assertEqual(sum(operations['TaskManager.add_task'].bucket_counts), 6)
+        self.assertEqual(operations['FileStorage.encode'].calls, 1)
+        
+        # Nested calls count for the caller too
+        size = os.path.getsize(self.test_file)
+        self.assertEqual(operations['FileStorage.save'].bytes_written, size)
+        self.assertEqual(operations['TaskManager.save_tasks'].bytes_written, size)
+        journal_bytes = operations['TaskJournal.append_many'].bytes_written
+        self.assertGreater(journal_bytes, 0)
+        self.assertEqual(manager.metrics.bytes_written, size + journal_bytes)
+        
+        instrumentation.uninstrument(manager)
+        self.assertIsNone(manager.metrics)
+        self.assertNotIn('add_task', vars(manager))
+        self.assertNotIn('save', vars(manager.storage))
+        manager.add_task("Untimed", "Description")
+        self.assertEqual(operations['TaskManager.add_task'].calls, 6)
+        
+        reloaded = TaskManager(self.test_file)
+        metrics = instrumentation.instrument(reloaded)
+        reloaded.load_tasks()
+        self.assertGreaterEqual(metrics.operations['TaskManager.load_tasks'].bytes_read, size)
+        self.assertEqual(len(reloaded.tasks), 6)
+        
+        # Managers without instrumentation run the class methods
+        self.assertNotIn('add_task', vars(TaskManager(self.test_file)))
+    
+    def test_export_formats(self):
+        """Test the Prometheus and JSON output, also from the command line."""
+        metrics = instrumentation.Metrics(buckets=(0.001, 1.0))
+        stats = metrics.stats("TaskManager.get_task")
+        stats.observe(0.0005, False)
+        stats.observe(0.5, False)
+        stats.observe(2.0, True)
+        
+        text = metrics.to_prometheus()
+        self.assertIn('taskmanager_calls_total{operation="TaskManager.get_task"} 3', text)
+        self.assertIn('taskmanager_errors_total{operation="TaskManager.get_task"} 1', text)
+        self.assertIn('taskmanager_operation_duration_seconds_bucket'
+                      '{operation="TaskManager.get_task",le="1.0"} 2', text)
+        self.assertIn('taskmanager_operation_duration_seconds_bucket'
+                      '{operation="TaskManager.get_task",le="+Inf"} 3', text)
+        self.assertEqual(metrics.to_dict()['operations']['TaskManager.get_task']['histogram'],
+                         {'0.001': 1, '1.0': 1, '+Inf': 1})
+        self.assertAlmostEqual(stats.quantile(0.5), 0.5005)
+        
+        err = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(err):
+            status = cli.run(["--file", self.test_file, "--metrics", "json", "--trace-memory",
+                              "add", "Report"])
+        self.assertEqual(status, 0)
+        data = json.loads(err.getvalue())
+        self.assertEqual(data['operations']['TaskManager.add_task']['calls'], 1)
+        self.assertGreater(data['bytes_written'], 0)
+        self.assertGreater(data['memory']['peak_bytes'], 0)
+
+
+class TestCrashSafety(unittest.TestCase):
+    """Fault-injection tests for atomic saves and backup recovery."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_crash_tasks.json"
+        self.task_manager = TaskManager(self.test_file)
+        for i in range(5):
+            self.task_manager.add_task(f"Task {i}", f"Description {i}", i % 5 + 1,
+                                       categories=["work"])
+        self.task_manager.save_tasks()
+        self.task_manager.add_task("Journaled", "Only in the journal")
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def assertRecovers(self, snapshot_format="json", modes=("eager", "stream", "lazy")):
+        """Check that a fresh manager loads exactly the tasks of self.task_manager."""
+        expected = {task_id: task.to_dict() for task_id, task in self.task_manager.tasks.items()}
+        for mode in modes:
+            manager = TaskManager(self.test_file, snapshot_format=snapshot_format)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager.load_tasks(mode=mode)
+                loaded = {task_id: task.to_dict() for task_id, task in manager.tasks.items()}
+            self.assertEqual(loaded, expected, mode)
+    
+    def temp_files(self):
+        """List leftover temporary snapshot files."""
+        return glob.glob(glob.escape(self.test_file) + ".*.tmp")
+    
+    def test_save_is_atomic(self):
+        """Test that saving replaces the snapshot and keeps the old one as a backup."""
+        with open(self.test_file, 'rb') as f:
+            old_snapshot = f.read()
+        
+        self.task_manager.save_tasks()
+        
+        with open(self.test_file + ".bak1", 'rb') as f:
+            self.assertEqual(f.read(), old_snapshot)
+        self.assertTrue(os.path.exists(self.test_file + ".journal.bak1"))
+        self.assertFalse(os.path.exists(self.test_file + ".journal"))
+        self.assertEqual(self.temp_files(), [])
+        self.assertRecovers()
+    
+    def test_interrupted_write_keeps_old_snapshot(self):
+        """Test that a save interrupted halfway through writing changes nothing."""
+        with open(self.test_file, 'rb') as f:
+            old_snapshot = f.read()
+        real_fdopen = os.fdopen
+        
+        class TornFile(io.BufferedWriter):
+            def write(self, data):
+                super().write(data[:len(data) // 2])
+                raise KeyboardInterrupt
+        
+        def torn_fdopen(fd, mode='r', *args, **kwargs):
+            return TornFile(real_fdopen(fd, 'wb', buffering=0))
+        
+        with mock.patch("os.fdopen", torn_fdopen):
+            with self.assertRaises(KeyboardInterrupt):
+                self.task_manager.save_tasks()
+        
+        with open(self.test_file, 'rb') as f:
+            self.assertEqual(f.read(), old_snapshot)
+        self.assertEqual(self.temp_files(), [])
+        self.assertRecovers()
+    
+    def test_failure_at_every_step(self):
+        """Test that a save failing at any file operation loses no tasks."""
+        real_replace = os.replace
+        
+        for failing_call in range(1, 4):
+            calls = []
+            
+            def flaky_replace(source, destination):
+                calls.append(source)
+                if len(calls) == failing_call:
+                    raise OSError("Disk unplugged")
+                real_replace(source, destination)
+            
+            self.task_manager.add_task(f"Before failure {failing_call}", "")
+            with mock.patch("os.replace", flaky_replace):
+                with self.assertRaises(OSError):
+                    self.task_manager.save_tasks()
+            self.assertEqual(len(calls), failing_call)
+            self.assertEqual(self.temp_files(), [])
+            self.assertRecovers()
+            
+            # Later mutations are still journaled and recovered
+            self.task_manager.add_task(f"After failure {failing_call}", "")
+            self.assertRecovers()
+            self.task_manager.save_tasks()
+        
+        with mock.patch("os.fsync", side_effect=OSError("I/O error")):
+            with self.assertRaises(OSError):
+                self.task_manager.save_tasks()
+        self.assertEqual(self.temp_files(), [])
+        self.assertRecovers()
+    
+    def test_failure_without_backups(self):
+        """Test that without backups the journal outlives a save failing at either end."""
+        self.task_manager.storage.backups = 0
+        for target, error in (("os.replace", OSError("Disk unplugged")),
+                              ("os.remove", OSError("Killed"))):
+            self.task_manager.add_task(f"Before {target}", "")
+            with mock.patch(target, side_effect=error):
+                with self.assertRaises(OSError):
+                    self.task_manager.save_tasks()
+            self.assertTrue(os.path.exists(self.test_file + ".journal"))
+            self.assertRecovers()
+        
+        self.task_manager.save_tasks()
+        self.assertFalse(os.path.exists(self.test_file + ".journal"))
+        self.assertFalse(os.path.exists(self.test_file + ".bak1"))
+        self.assertRecovers()
+    
+    def test_recover_from_corrupt_snapshot(self):
+        """Test that a damaged snapshot is recovered from the backup and journals."""
+        self.task_manager.save_tasks()
+        task_id = self.task_manager.add_task("After save", "In the new journal")
+        self.task_manager.mark_task_completed(task_id)
+        
+        with open(self.test_file, 'r+') as f:
+            f.truncate(os.path.getsize(self.test_file) // 2)
+        
+        self.assertRecovers()
+    
+    def test_recover_binary_snapshot(self):
+        """Test backup recovery with the binary snapshot format."""
+        manager = TaskManager(self.test_file, snapshot_format="binary")
+        for task in self.task_manager.tasks.values():
+            manager._insert(Task.from_dict(task.to_dict()))
+        manager.save_tasks()
+        manager.save_tasks()
+        manager.add_task("After save", "In the new journal")
+        self.task_manager = manager
+        
+        with open(self.test_file, 'r+b') as f:
+            f.truncate(20)
+        
+        self.assertRecovers("binary", modes=("eager",))
+    
+    def test_backup_generations(self):
+        """Test that older generations are rotated out."""
+        storage = self.task_manager.storage
+        storage.backups = 3
+        for _ in range(5):
+            self.task_manager.save_tasks()
+        
+        for generation in (1, 2, 3):
+            self.assertTrue(os.path.exists(storage.backup_path(generation)))
+        self.assertFalse(os.path.exists(storage.backup_path(4)))
+        
+        # With the two newest snapshots damaged, the third one still recovers
+        for path in (self.test_file, storage.backup_path(1)):
+            with open(path, 'w') as f:
+                f.write("{")
+        manager = TaskManager(self.test_file)
+        manager.storage.backups = 3
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.load_tasks()
+        self.assertEqual(list(manager.tasks), list(self.task_manager.tasks))
+    
+    @unittest.skipUnless(hasattr(signal, "SIGKILL"), "requires SIGKILL")
+    def test_killed_during_save(self):
+        """Test that killing a process in the middle of saving never loses the store."""
+        script = (
+            "import sys\n"
+            "from task_manager import TaskManager\n"
+            "manager = TaskManager(sys.argv[1], journal=False)\n"
+            "manager.load_tasks()\n"
+            "print('ready', flush=True)\n"
+            "while True:\n"
+            "    manager.save_tasks()\n"
+        )
+        for i in range(2000):
+            self.task_manager.add_task(f"Bulk {i}", "x" * 100, categories=["bulk"])
+        self.task_manager.save_tasks()
+        
+        for delay in (0.01, 0.05, 0.1):
+            process = subprocess.Popen(
+                [sys.executable, "-c", script, self.test_file],
+                stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)) or None,
+            )
+            self.assertEqual(process.stdout.readline().strip(), b"ready")
+            time.sleep(delay)
+            process.send_signal(signal.SIGKILL)
+            process.wait()
+            process.stdout.close()
+            
+            self.assertRecovers(modes=("eager",))
+
+
+class TestWriteBehind(unittest.TestCase):
+    """Tests for background write-behind persistence."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_write_behind_tasks.json"
+        self.managers = []
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        for manager in self.managers:
+            manager.close()
+        remove_files(self.test_file)
+    
+    def make_manager(self, delay=60, max_pending=100, journal=True):
+        """Create a write-behind TaskManager on the test file."""
+        storage = WriteBehindStorage(FileStorage(self.test_file, journal=journal),
+                                     delay=delay, max_pending=max_pending)
+        manager = TaskManager(storage=storage)
+        self.managers.append(manager)
+        return manager
+    
+    def stored_ids(self):
+        """Load the test file with a plain manager and return its task IDs."""
+        manager = TaskManager(self.test_file)
+        manager.load_tasks()
+        return list(manager.tasks)
+    
+    def wait_for(self, condition, timeout=5):
+        """Poll until the condition holds or the timeout expires."""
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the background write")
+            time.sleep(0.005)
+    
+    def test_mutations_are_queued(self):
+        """Test that mutations do not touch the disk until flushed."""
+        manager = self.make_manager()
+        task_id = manager.add_task("Task 1", "Description 1")
+        manager.mark_task_completed(task_id)
+        
+        self.assertEqual(manager.storage.pending_count, 2)
+        self.assertFalse(os.path.exists(self.test_file + ".journal"))
+        
+        manager.flush()
+        self.assertEqual(manager.storage.pending_count, 0)
+        self.assertEqual(manager.journal.count, 2)
+        self.assertEqual(self.stored_ids(), [task_id])
+    
+    def test_flush_after_delay(self):
+        """Test that the background thread writes a burst after the delay."""
+        manager = self.make_manager(delay=0.05)
+        ids = [manager.add_task(f"Task {i}", "") for i in range(10)]
+        
+        self.wait_for(lambda: manager.storage.pending_count == 0)
+        self.assertEqual(self.stored_ids(), ids)
+    
+    def test_flush_when_too_many_pending(self):
+        """Test that reaching max_pending triggers a write before the delay."""
+        manager = self.make_manager(max_pending=5)
+        ids = [manager.add_task(f"Task {i}", "") for i in range(5)]
+        
+        self.wait_for(lambda: manager.storage.pending_count == 0)
+        self.assertEqual(self.stored_ids(), ids)
+    
+    def test_burst_is_one_snapshot(self):
+        """Test that without a journal a burst is written as a single snapshot."""
+        manager = self.make_manager(journal=False)
+        with mock.patch.object(FileStorage, "save", autospec=True,
+                               side_effect=FileStorage.save) as save:
+            ids = [manager.add_task(f"Task {i}", "") for i in range(20)]
+            manager.flush()
+        
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual(self.stored_ids(), ids)
+    
+    def test_batch_and_save(self):
+        """Test batches, rollbacks and explicit saves with write-behind."""
+        manager = self.make_manager()
+        with self.assertRaises(RuntimeError):
+            with manager.batch():
+                manager.add_task("Rolled back", "")
+                raise RuntimeError("abort")
+        self.assertEqual(manager.storage.pending_count, 0)
+        
+        task_id = manager.add_task("Task 1", "")
+        manager.save_tasks()
+        self.assertEqual(manager.storage.pending_count, 0)
+        self.assertEqual(self.stored_ids(), [task_id])
+    
+    def test_failed_write_is_retried(self):
+        """Test that records stay queued when the disk write fails."""
+        manager = self.make_manager()
+        task_id = manager.add_task("Task 1", "")
+        
+        with mock.patch.object(manager.journal, "append_many", side_effect=OSError("Disk full")):
+            with self.assertRaises(OSError):
+                manager.flush()
+        self.assertEqual(manager.storage.pending_count, 1)
+        
+        manager.flush()
+        self.assertEqual(self.stored_ids(), [task_id])
+    
+    def test_close_flushes(self):
+        """Test that closing the manager writes the queued records."""
+        manager = self.make_manager()
+        task_id = manager.add_task("Task 1", "")
+        manager.close()
+        self.assertEqual(self.stored_ids(), [task_id])
+    
+    def test_flush_on_exit(self):
+        """Test that queued records are written on sys.exit and KeyboardInterrupt."""
+        for ending in ("sys.exit(0)", "raise KeyboardInterrupt"):
+            script = (
+                "import sys\n"
+                "from storage import FileStorage, WriteBehindStorage\n"
+                "from task_manager import TaskManager\n"
+                "storage = WriteBehindStorage(FileStorage(sys.argv[1]), delay=60)\n"
+                "manager = TaskManager(storage=storage)\n"
+                "manager.add_task('Queued', 'Written at exit')\n"
+                f"{ending}\n"
+            )
+            subprocess.run([sys.executable, "-c", script, self.test_file],
+                           cwd=os.path.dirname(os.path.abspath(__file__)) or None,
+                           stderr=subprocess.DEVNULL)
+            
+            manager = TaskManager(self.test_file)
+            manager.load_tasks()
+            self.assertEqual([task.title for task in manager.tasks.values()], ["Queued"], ending)
+            remove_files(self.test_file)
+
+
+class TestSharedStorage(unittest.TestCase):
+    """Tests for several processes sharing one task file."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_shared_tasks.json"
+        self.first = TaskManager(self.test_file, shared=True, compact_threshold=50)
+        self.second = TaskManager(self.test_file, shared=True, compact_threshold=50)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def test_changes_are_picked_up(self):
+        """Test that each manager sees the journal records of the other."""
+        task_id = self.first.add_task("Task 1", "Description 1", categories=["work"])
+        
+        task = self.second.get_task(task_id)
+        self.assertEqual(task.title, "Task 1")
+        self.assertEqual(self.second.get_tasks_by_category("work"), [task])
+        
+        self.second.mark_task_completed(task_id)
+        self.assertTrue(self.first.get_task(task_id).completed)
+        self.assertEqual(self.first.refresh(), 0)
+        self.assertEqual(self.first.check_indexes(), [])
+    
+    def test_rewritten_snapshot_is_merged(self):
+        """Test that a snapshot written by another process is merged task by task."""
+        id1 = self.first.add_task("Task 1", "")
+        id2 = self.first.add_task("Task 2", "")
+        task1 = self.second.get_task(id1)
+        self.assertIsNotNone(self.second.index)
+        
+        self.first.mark_task_completed(id1)
+        self.first.delete_task(id2)
+        id3 = self.first.add_task("Task 3", "", priority=1)
+        self.first.save_tasks()
+        
+        self.assertEqual(self.second.refresh(), 3)
+        self.assertIs(self.second.get_task(id1), task1)
+        self.assertTrue(task1.completed)
+        self.assertEqual([task.id for task in self.second.get_all_tasks()], [id3, id1])
+        self.assertEqual(self.second.check_indexes(), [])
+    
+    def test_no_lost_updates(self):
+        """Test that writes from a stale manager do not overwrite other changes."""
+        id1 = self.first.add_task("Task 1", "")
+        id2 = self.second.add_task("Task 2", "")
+        self.first.save_tasks()
+        id3 = self.second.add_task("Task 3", "")
+        self.second.add_category_to_task(id1, "home")
+        self.first.add_category_to_task(id1, "work")
+        self.first.save_tasks()
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(list(reloaded.tasks), [id1, id2, id3])
+        self.assertEqual(reloaded.get_task(id1).categories, ["home", "work"])
+    
+    def test_change_to_deleted_task(self):
+        """Test that changing a task another process deleted is detected."""
+        task_id = self.first.add_task("Task 1", "")
+        self.assertIsNotNone(self.second.get_task(task_id))
+        self.first.delete_task(task_id)
+        
+        self.assertFalse(self.second.mark_task_completed(task_id))
+        self.assertFalse(self.second.add_category_to_task(task_id, "work"))
+        with self.assertRaises(KeyError):
+            self.second.complete_tasks([task_id])
+        self.assertEqual(self.second.tasks, {})
+    
+    def test_concurrent_processes(self):
+        """Stress test: several processes mutate the same file at once."""
+        workers, count = 4, 25
+        seed_id = self.first.add_task("Shared", "Every worker tags this task")
+        script = (
+            "import sys\n"
+            "from task_manager import TaskManager\n"
+            "path, worker, count, seed_id = sys.argv[1], sys.argv[2], int(sys.argv[3]), sys.argv[4]\n"
+            "manager = TaskManager(path, shared=True, compact_threshold=7)\n"
+            "manager.load_tasks()\n"
+            "ids = []\n"
+            "for i in range(count):\n"
+            "    ids.append(manager.add_task(f'{worker}-{i}', '', i % 5 + 1))\n"
+            "    if i % 2:\n"
+            "        manager.mark_task_completed(ids[-1])\n"
+            "    if i % 10 == 9:\n"
+            "        manager.save_tasks()\n"
+            "assert manager.add_category_to_task(seed_id, worker)\n"
+            "assert manager.delete_task(ids[0])\n"
+            "assert manager.check_indexes() == [], manager.check_indexes()\n"
+        )
+        processes = [
+            subprocess.Popen([sys.executable, "-c", script, self.test_file, f"w{n}",
+                              str(count), seed_id],
+                             cwd=os.path.dirname(os.path.abspath(__file__)) or None)
+            for n in range(workers)
+        ]
+        for process in processes:
+            self.assertEqual(process.wait(timeout=60), 0)
+        
+        manager = TaskManager(self.test_file)
+        manager.load_tasks()
+        for n in range(workers):
+            tasks = {task.title: task for task in manager.tasks.values()
+                     if task.title.startswith(f"w{n}-")}
+            self.assertEqual(sorted(tasks), sorted(f"w{n}-{i}" for i in range(1, count)))
+            for i in range(1, count):
+                self.assertEqual(tasks[f"w{n}-{i}"].completed, bool(i % 2))
+        self.assertEqual(sorted(manager.get_task(seed_id).categories),
+                         [f"w{n}" for n in range(workers)])
+        
+        # The in-memory copy of a manager that was idle catches up as well
+        self.assertEqual(len(self.second.get_all_tasks()), len(manager.tasks))
+        self.assertEqual(self.second.check_indexes(), [])
+
+
+class TestThreadSafety(unittest.TestCase):
+    """Tests for the reader/writer lock and the thread-safe TaskManager."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_threaded_tasks.json"
+        self.task_manager = TaskManager(self.test_file, thread_safe=True, compact_threshold=20)
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def run_threads(self, target, count):
+        """Run target(n) in several threads and re-raise the first error."""
+        errors = []
+        
+        def run(n):
+            try:
+                target(n)
+            except BaseException as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=30)
+        if errors:
+            raise errors[0]
+    
+    def test_readers_share_the_lock(self):
+        """Test that readers hold the lock together and writers wait for them."""
+        lock = RWLock()
+        barrier = threading.Barrier(3, timeout=5)
+        
+        def read(n):
+            with lock.read_locked():
+                barrier.wait()  # Only passes if all three read at the same time
+        
+        self.run_threads(read, 3)
+        
+        order = []
+        lock.acquire_read()
+        writer = threading.Thread(target=lambda: (lock.acquire_write(), order.append("write"),
+                                                  lock.release_write()))
+        writer.start()
+        time.sleep(0.05)
+        order.append("read done")
+        lock.release_read()
+        writer.join(timeout=5)
+        self.assertEqual(order, ["read done", "write"])
+    
+    def test_lock_reentrancy(self):
+        """Test nested locking and the refused read-to-write upgrade."""
+        lock = RWLock()
+        with lock.write_locked():
+            with lock.write_locked(), lock.read_locked():
+                pass
+        with lock.read_locked():
+            with lock.read_locked():
+                pass
+            with self.assertRaises(RuntimeError):
+                lock.acquire_write()
+        self.assertEqual(lock.readers, 0)
+    
+    def test_concurrent_mutations_and_reads(self):
+        """Test that many threads can add, change, list and save at once."""
+        def work(n):
+            ids = []
+            for i in range(40):
+                ids.append(self.task_manager.add_task(f"T{n}-{i}", "", i % 5 + 1,
+                                                      categories=[f"c{i % 3}"]))
+                if i % 3 == 0:
+                    self.task_manager.mark_task_completed(ids[i // 2])
+                if i % 7 == 0:
+                    self.task_manager.delete_task(ids.pop(0))
+                self.task_manager.get_all_tasks()
+                self.task_manager.get_tasks_by_category("c1")
+                self.task_manager.search_tasks(f"T{n}")
+                if i % 10 == 0:
+                    self.task_manager.save_tasks()
+        
+        self.run_threads(work, 8)
+        
+        self.assertEqual(self.task_manager.check_indexes(), [])
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual({task_id: task.to_dict() for task_id, task in reloaded.tasks.items()},
+                         {task_id: task.to_dict() for task_id, task in self.task_manager.tasks.items()})
+    
+    def test_snapshot_is_copy_on_write(self):
+        """Test that snapshots are cached, consistent and share unchanged tasks."""
+        id1 = self.task_manager.add_task("Task 1", "")
+        id2 = self.task_manager.add_task("Task 2", "")
+        
+        first = self.task_manager.snapshot()
+        self.assertIs(self.task_manager.snapshot()[id1], first[id1])
+        with self.assertRaises(TypeError):
+            first[id1] = None
+        
+        self.task_manager.mark_task_completed(id1)
+        id3 = self.task_manager.add_task("Task 3", "")
+        second = self.task_manager.snapshot()
+        
+        self.assertFalse(first[id1].completed)
+        self.assertTrue(second[id1].completed)
+        self.assertIs(second[id2], first[id2])
+        self.assertEqual(list(second), [id1, id2, id3])
+        self.assertIsNot(second[id1], self.task_manager.get_task(id1))
+    
+    def test_changes_during_save_are_kept(self):
+        """Test that mutations made while a snapshot is encoded are not lost."""
+        task_id = self.task_manager.add_task("Before save", "")
+        storage = self.task_manager.storage
+        real_encode = storage.encode
+        added = []
+        
+        def slow_encode(tasks):
+            # No lock is held here, so another thread can change the tasks
+            thread = threading.Thread(target=lambda: (
+                added.append(self.task_manager.add_task("During save", "")),
+                self.task_manager.mark_task_completed(task_id)))
+            thread.start()
+            thread.join(timeout=5)
+            return real_encode(tasks)
+        
+        with mock.patch.object(storage, "encode", slow_encode):
+            self.task_manager.save_tasks()
+        
+        reloaded = TaskManager(self.test_file)
+        reloaded.load_tasks()
+        self.assertEqual(list(reloaded.tasks), [task_id] + added)
+        self.assertTrue(reloaded.get_task(task_id).completed)
+
+
+class TestAsyncTaskManager(unittest.TestCase):
+    """Tests for the asyncio interface."""
+    
+    def setUp(self):
+        """Set up test environment."""
+        self.test_file = "test_async_tasks.json"
+    
+    def tearDown(self):
+        """Clean up after tests."""
+        remove_files(self.test_file)
+    
+    def stored_tasks(self):
+        """Load the test file with a synchronous manager."""
+        manager = TaskManager(self.test_file)
+        manager.load_tasks()
+        return manager.tasks
+    
+    def test_crud_and_queries(self):
+        """Test the awaitable CRUD, query and search methods."""
+        async def scenario():
+            manager = AsyncTaskManager(self.test_file)
+            id1 = await manager.add_task("Write report", "Quarterly", 1, "2023-12-31", ["work"])
+            id2, id3 = await manager.add_tasks([
+                {'title': "Buy milk", 'description': "", 'categories': ["home"]},
+                {'title': "Old task", 'description': ""},
+            ])
+            self.assertTrue(await manager.mark_task_completed(id1))
+            self.assertTrue(await manager.add_category_to_task(id2, "errands"))
+            self.assertTrue(await manager.remove_category_from_task(id2, "home"))
+            self.assertTrue(await manager.delete_task(id3))
+            self.assertFalse(await manager.delete_task(id3))
+            
+            self.assertEqual((await manager.get_task(id1)).title, "Write report")
+            self.assertEqual([task.id for task in await manager.get_all_tasks()], [id2, id1])
+            self.assertEqual(await manager.get_tasks_by_priority(1), [await manager.get_task(id1)])
+            self.assertEqual([task.id for task in await manager.get_tasks_by_category("ERRANDS")], [id2])
+            self.assertEqual(await manager.get_all_categories(), ["errands", "work"])
+            self.assertEqual([task.id for task in await manager.search_tasks("report")], [id1])
+            await manager.close()
+            return id1, id2
+        
+        id1, id2 = asyncio.run(scenario())
+        stored = self.stored_tasks()
+        self.assertEqual(list(stored), [id1, id2])
+        self.assertTrue(stored[id1].completed)
+        self.assertEqual(stored[id2].categories, ["errands"])
+        
+        async def reload():
+            manager = AsyncTaskManager(self.test_file)
+            await manager.load_tasks(mode="lazy")
+            tasks = await manager.get_all_tasks()
+            await manager.close()
+            return tasks
+        
+        self.assertEqual([task.id for task in asyncio.run(reload())], [id2, id1])
+    
+    def test_concurrent_writes_are_coalesced(self):
+        """Test that many concurrent coroutines share a few storage writes."""
+        async def scenario():
+            manager = AsyncTaskManager(self.test_file)
+            ids = await asyncio.gather(*(manager.add_task(f"Task {i}", "") for i in range(200)))
+            await asyncio.gather(*(manager.mark_task_completed(task_id) for task_id in ids[::2]))
+            await manager.close()
+            return manager, ids
+        
+        manager, ids = asyncio.run(scenario())
+        self.assertLessEqual(manager.write_count, 4)
+        stored = self.stored_tasks()
+        self.assertEqual(list(stored), ids)
+        self.assertEqual([task.completed for task in stored.values()], [i % 2 == 0 for i in range(200)])
+    
+    def test_save_while_mutating(self):
+        """Test that saving does not lose changes made while the snapshot is written."""
+        async def scenario():
+            manager = AsyncTaskManager(self.test_file, compact_threshold=30)
+            first = await asyncio.gather(*(manager.add_task(f"Task {i}", "") for i in range(50)))
+            results = await asyncio.gather(
+                manager.save_tasks(),
+                *(manager.add_task(f"During save {i}", "") for i in range(50)),
+            )
+            await manager.close()
+            return first + results[1:]
+        
+        ids = asyncio.run(scenario())
+        self.assertEqual(list(self.stored_tasks()), ids)
+    
+    def test_without_waiting_and_failed_writes(self):
+        """Test wait_for_writes=False and the retry of a failed write."""
+        async def scenario():
+            manager = AsyncTaskManager(self.test_file, wait_for_writes=False)
+            task_id = await manager.add_task("Task 1", "")
+            self.assertFalse(os.path.exists(self.test_file + ".journal"))
+            
+            with mock.patch.object(manager.storage, "write", side_effect=OSError("Disk full")):
+                with self.assertRaises(OSError):
+                    await manager.flush()
+            self.assertEqual(len(manager._queue.pending), 1)
+            
+            await manager.flush()
+            await manager.close()
+            return task_id
+        
+        task_id = asyncio.run(scenario())
+        self.assertEqual(list(self.stored_tasks()), [task_id])
 
 
 if __name__ == "__main__":
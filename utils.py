@@ -4,22 +4,23 @@ Utility functions for the Task Manager application.
 This module contains helper functions used throughout the application.
 """
 
-import os
-import platform
+import sys
+
+# ANSI escape sequence that moves the cursor home and clears the screen
+CLEAR_SCREEN = "\033[H\033[2J"
 
 
 def clear_screen():
     """
     Clear the terminal screen.
     
-    This function detects the operating system and uses the appropriate
-    command to clear the terminal screen.
+    This writes an ANSI escape sequence, the same kind of code used for
+    colored output, instead of starting a shell to run "clear" or "cls".
+    Nothing is written when the output is not a terminal.
     """
-    # Check the operating system
-    if platform.system() == "Windows":
-        os.system("cls")
-    else:  # For Linux and Mac
-        os.system("clear")
+    if sys.stdout.isatty():
+        sys.stdout.write(CLEAR_SCREEN)
+        sys.stdout.flush()
 
 
 def print_colored(text, color):
@@ -55,7 +56,7 @@ def get_priority_emoji(priority):
     
     Args:
         priority (int): Priority level (1-5)
-        
+    
     Returns:
         str: Emoji representation of the priority
     """